@@ -11,8 +11,9 @@ from typing import List, Optional
 from datetime import datetime
 
 from app.core.database import get_db
-from app.core.security import get_current_user, get_password_hash
+from app.core.security import get_current_user, get_password_hash, invalidate_cached_user, user_cache
 from app.models.base import User, Document
+from app.services.platform_counter_service import platform_counter_service
 
 router = APIRouter(prefix="/admin", tags=["admin"])
 
@@ -55,41 +56,20 @@ async def get_admin_stats(
     db: AsyncSession = Depends(get_db),
     current_user: User = Depends(require_admin)
 ):
-    """Get admin dashboard statistics"""
-    # Total users
-    total_users = await db.execute(select(func.count(User.id)))
-    total_users = total_users.scalar()
-    
-    # Active users
-    active_users = await db.execute(
-        select(func.count(User.id)).where(User.is_active == True)
-    )
-    active_users = active_users.scalar()
-    
-    # Superusers
-    superusers = await db.execute(
-        select(func.count(User.id)).where(User.is_superuser == True)
-    )
-    superusers = superusers.scalar()
-    
-    # Total documents
-    total_docs = await db.execute(select(func.count(Document.id)))
-    total_docs = total_docs.scalar()
-    
-    # Total clients
-    total_clients = await db.execute(
-        select(func.count(func.distinct(Document.razon_social)))
-        .where(Document.razon_social.isnot(None))
-    )
-    total_clients = total_clients.scalar()
-    
-    return AdminStats(
-        total_users=total_users,
-        active_users=active_users,
-        superusers=superusers,
-        total_documents=total_docs,
-        total_clients=total_clients
-    )
+    """Get admin dashboard statistics (platform_counters, no table scans)"""
+    counters = await platform_counter_service.read(db)
+    return AdminStats(**counters)
+
+
+@router.post("/stats/reconcile", response_model=AdminStats)
+async def reconcile_admin_stats(
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(require_admin)
+):
+    """Recount users and documents now and correct the stored counters (admin only)"""
+    counters = await platform_counter_service.reconcile(db)
+    await db.commit()
+    return AdminStats(**counters)
 
 
 @router.get("/users", response_model=List[UserListItem])
@@ -138,14 +118,18 @@ async def update_user(
             detail="Cannot deactivate your own account"
         )
     
+    was_active, was_superuser = user.is_active, user.is_superuser
+    
     if user_update.is_active is not None:
         user.is_active = user_update.is_active
     
     if user_update.is_superuser is not None:
         user.is_superuser = user_update.is_superuser
     
+    await platform_counter_service.user_changed(db, was_active, was_superuser, user)
     await db.commit()
     await db.refresh(user)
+    invalidate_cached_user(user.username)
     
     return {
         "success": True,
@@ -172,8 +156,21 @@ async def delete_user(
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
     
+    # Documents removed with the user (cascade), per client
+    owned = (await db.execute(
+        select(Document.razon_social, func.count(Document.id))
+        .where(Document.user_id == user_id)
+        .group_by(Document.razon_social)
+    )).all()
+    
     await db.delete(user)
+    await db.flush()
+    await platform_counter_service.user_removed(db, user)
+    await platform_counter_service.documents_removed(
+        db, sum(count for _, count in owned), [razon_social for razon_social, _ in owned]
+    )
     await db.commit()
+    invalidate_cached_user(user.username)
     
     return {
         "success": True,
@@ -220,4 +217,55 @@ async def cleanup_guest(
         "success": True,
         "message": "Guest cleanup completed",
         **stats
-    }
\ No newline at end of file
+    }
+
+@router.get("/parser/patterns")
+async def get_pattern_stats(
+    current_user: User = Depends(require_admin)
+):
+    """Hit rate and timing of every parser pattern since startup (admin only)"""
+    from app.services.pattern_registry import pattern_registry
+    
+    return pattern_registry.stats()
+
+
+@router.get("/auth/user-cache")
+async def get_user_cache_stats(
+    current_user: User = Depends(require_admin)
+):
+    """Authenticated-user cache size and hit rate of this process (admin only)"""
+    return user_cache.stats()
+
+
+@router.get("/auth/password-hasher")
+async def get_password_hasher_stats(
+    current_user: User = Depends(require_admin)
+):
+    """bcrypt pool load: jobs running, waiting and average duration (admin only)"""
+    from app.core.password_hasher import password_hasher
+    
+    return password_hasher.stats()
+
+
+@router.get("/reports/cache")
+async def get_report_cache_stats(
+    current_user: User = Depends(require_admin)
+):
+    """PDF report cache hits and misses since startup (admin only)"""
+    from app.services.pdf_report_service import pdf_report_service
+    
+    return pdf_report_service.stats()
+
+
+@router.post("/parser/patterns/reset")
+async def reset_pattern_stats(
+    current_user: User = Depends(require_admin)
+):
+    """Reset parser pattern counters (admin only)"""
+    from app.services.pattern_registry import pattern_registry
+    
+    pattern_registry.reset_stats()
+    return {
+        "success": True,
+        "message": "Pattern statistics reset"
+    }
@@ -20,11 +20,12 @@ from app.core.security import (
     create_password_reset_token,
     verify_password_reset_token,
     get_current_user,
-    get_password_hash,
     get_user_by_username,
     get_user_by_email,
-    verify_password
+    invalidate_cached_user
 )
+from app.core.password_hasher import password_hasher
+from app.services.platform_counter_service import platform_counter_service
 from app.models.base import User
 from app.core.guest_session import GuestSessionManager
 from app.utils.session_utils import get_session_id_from_request
@@ -274,6 +275,7 @@ async def login(
     
     user.last_login = datetime.utcnow()
     await db.commit()
+    invalidate_cached_user(user.username)
     
     guest_manager = GuestSessionManager(db)
     session_id = get_session_id_from_request(request)
@@ -346,7 +348,7 @@ async def register(
                 detail="Email already registered"
             )
         
-        hashed_password = get_password_hash(user_data.password)
+        hashed_password = await password_hasher.hash(user_data.password)
         new_user = User(
             username=user_data.username,
             email=user_data.email,
@@ -357,6 +359,7 @@ async def register(
         )
         
         db.add(new_user)
+        await platform_counter_service.user_added(db, new_user)
         await db.commit()
         await db.refresh(new_user)
         
@@ -470,6 +473,7 @@ async def google_callback(
                 created_at=datetime.utcnow()
             )
             db.add(user)
+            await platform_counter_service.user_added(db, user)
             await db.commit()
             await db.refresh(user)
             
@@ -483,6 +487,7 @@ async def google_callback(
         # Update last login
         user.last_login = datetime.utcnow()
         await db.commit()
+        invalidate_cached_user(user.username)
         
         # Create JWT token
         access_token_expires = timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
@@ -583,10 +588,11 @@ async def reset_password(
             detail="Reset token has expired"
         )
     
-    user.hashed_password = get_password_hash(reset_data.new_password)
+    user.hashed_password = await password_hasher.hash(reset_data.new_password)
     user.reset_token = None
     user.reset_token_expires = None
     await db.commit()
+    invalidate_cached_user(user.username)
     
     return {
         "success": True,
@@ -601,14 +607,15 @@ async def change_password(
     db: AsyncSession = Depends(get_db)
 ):
     """Change password for authenticated user"""
-    if not verify_password(password_data.current_password, current_user.hashed_password):
+    if not await password_hasher.verify(password_data.current_password, current_user.hashed_password):
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail="Current password is incorrect"
         )
     
-    current_user.hashed_password = get_password_hash(password_data.new_password)
+    current_user.hashed_password = await password_hasher.hash(password_data.new_password)
     await db.commit()
+    invalidate_cached_user(current_user.username)
     
     return {
         "success": True,
@@ -5,6 +5,10 @@ Clientes API Endpoints - Phase 3: User Data Isolation
 ✅ Works with NULL periodo_anio documents
 ✅ Year validation
 ✅ FIXED: Only use Form 104 fields that actually exist in the database
+✅ Yearly summary, validation and exports read the materialized client_year_aggregates rows
+✅ Summary and exports: monthly rows + year totals from one ROLLUP query, driven by one field spec
+✅ Excel exports streamed (write-only workbooks built off the event loop) + bulk export
+✅ PDF exports rendered off the event loop and cached (pdf_report_service)
 """
 
 from fastapi import APIRouter, Depends, HTTPException
@@ -13,23 +17,22 @@ from sqlalchemy import select, func, and_
 from typing import List, Dict, Optional
 from pydantic import BaseModel
 
-import requests
-from PIL import Image as PILImage
-
+from app.core.config import settings
 from app.core.database import get_db
-from app.models.base import Document, Form103Totals, Form104Data, FormTypeEnum
+from app.models.base import Document, FormTypeEnum
 from app.core.security import get_current_user
 from app.models.base import User
+from app.services.client_year_service import (
+    client_year_service, parse_excluded_months, form_values, periodo_label,
+    FORM_FIELDS
+)
+from app.services.excel_export_service import (
+    build_workbook, build_workbook_streaming, stream_file, write_yearly_workbook, write_bulk_workbook
+)
+from app.services.pdf_report_service import pdf_report_service
 
 from fastapi.responses import StreamingResponse
 from io import BytesIO
-import openpyxl
-from openpyxl.styles import Font, PatternFill, Alignment, Border, Side
-from reportlab.lib.pagesizes import letter
-from reportlab.platypus import SimpleDocTemplate, Table, Image, TableStyle, Paragraph, Spacer
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib.units import inch
-from reportlab.lib import colors
 
 router = APIRouter(prefix="/clientes", tags=["clientes"])
 
@@ -75,6 +78,11 @@ class PDFBranding(BaseModel):
     footer_text: str
 
 
+class BulkExcelExport(BaseModel):
+    razon_sociales: Optional[List[str]] = None  # None = all clients
+    years: Optional[List[str]] = None  # None = all years
+
+
 def is_valid_year(year: str) -> bool:
     """Check if year is valid (not None, 'Unknown', empty, etc.)"""
     if not year or year.upper() in ('UNKNOWN', 'N/A', ''):
@@ -196,7 +204,7 @@ async def get_client_documents(
 
 
 # ------------------------------
-# Yearly summary - ✅ FIXED with getattr()
+# Yearly summary
 # ------------------------------
 @router.get("/{razon_social}/yearly-summary/{year}")
 async def get_yearly_summary(
@@ -213,129 +221,38 @@ async def get_yearly_summary(
             detail=f"Invalid year parameter: '{year}'. Year must be a valid 4-digit year."
         )
     
-    excluded = set(int(m.strip()) for m in exclude_months.split(',')) if exclude_months else set()
+    excluded = parse_excluded_months(exclude_months)
 
-    query_103 = select(Document).where(
-        and_(
-            Document.razon_social == razon_social, 
-            Document.form_type == FormTypeEnum.FORM_103, 
-            Document.periodo_anio == year,
-            Document.user_id == current_user.id
-        )
+    # Monthly rows + year totals computed in Postgres (GROUP BY ROLLUP)
+    months, totals = await client_year_service.summarize_year(
+        db, current_user.id, razon_social, year, excluded
     )
-    if excluded:
-        query_103 = query_103.where(Document.periodo_mes_numero.notin_(excluded))
-    docs_103 = (await db.execute(query_103)).scalars().all()
 
-    query_104 = select(Document).where(
-        and_(
-            Document.razon_social == razon_social, 
-            Document.form_type == FormTypeEnum.FORM_104, 
-            Document.periodo_anio == year,
-            Document.user_id == current_user.id
-        )
-    )
-    if excluded:
-        query_104 = query_104.where(Document.periodo_mes_numero.notin_(excluded))
-    docs_104 = (await db.execute(query_104)).scalars().all()
-
-    summary_103 = {
-        'subtotal_operaciones_pais': 0.0,
-        'total_retencion': 0.0,
-        'total_impuesto_pagar': 0.0,
-        'total_pagado': 0.0,
-        'monthly_details': []
-    }
-    
-    # ✅ FIXED: Include ALL Form 104 fields that ACTUALLY exist in the database
-    summary_104 = {
-        # Basic fields
-        'total_ventas_neto': 0.0,
-        'total_impuesto_generado': 0.0,
-        'total_adquisiciones': 0.0,
-        'credito_tributario_aplicable': 0.0,
-        'total_impuesto_retenido': 0.0,
-        'total_pagado': 0.0,
-        
-        # Calculated fields that EXIST in database
-        'impuesto_causado': 0.0,
-        'retenciones_efectuadas': 0.0,
-        'subtotal_a_pagar': 0.0,
-        'total_impuesto_pagar_retencion': 0.0,
-        'total_consolidado_iva': 0.0,
-        'total_impuesto_a_pagar': 0.0,
-        'interes_mora': 0.0,
-        'multa': 0.0,
-        
-        'monthly_details': []
-    }
-
-    # --- Form 103 processing ---
-    for doc in docs_103:
-        tot = (await db.execute(select(Form103Totals).where(Form103Totals.document_id == doc.id))).scalar_one_or_none()
-        if not tot:
-            continue
-        periodo_fiscal = f"{doc.periodo_mes} {doc.periodo_anio}" if doc.periodo_mes else None
-        md = {
-            'month': doc.periodo_mes_numero,
-            'periodo_fiscal': periodo_fiscal,
-            'subtotal_operaciones_pais': tot.subtotal_operaciones_pais or 0.0,
-            'total_retencion': tot.total_retencion or 0.0,
-            'total_impuesto_pagar': tot.total_impuesto_pagar or 0.0,
-            'total_pagado': tot.total_pagado or 0.0
-        }
-        for k in ['subtotal_operaciones_pais', 'total_retencion', 'total_impuesto_pagar', 'total_pagado']:
-            summary_103[k] += md[k]
-        summary_103['monthly_details'].append(md)
-
-    # --- Form 104 processing - ✅ FIXED with getattr() for safety ---
-    for doc in docs_104:
-        data = (await db.execute(select(Form104Data).where(Form104Data.document_id == doc.id))).scalar_one_or_none()
-        
-        if not data:
-            continue
-            
-        periodo_fiscal = f"{doc.periodo_mes} {doc.periodo_anio}" if doc.periodo_mes else None
-        
-        # ✅ Use getattr() with 0 default - safe for all fields
-        md = {
-            'month': doc.periodo_mes_numero,
-            'periodo_fiscal': periodo_fiscal,
-            'total_ventas_neto': getattr(data, 'total_ventas_neto', 0) or 0.0,
-            'total_impuesto_generado': getattr(data, 'total_impuesto_generado', 0) or 0.0,
-            'total_adquisiciones': getattr(data, 'total_adquisiciones', 0) or 0.0,
-            'credito_tributario_aplicable': getattr(data, 'credito_tributario_aplicable', 0) or 0.0,
-            'total_impuesto_retenido': getattr(data, 'total_impuesto_retenido', 0) or 0.0,
-            'total_pagado': getattr(data, 'total_pagado', 0) or 0.0,
-            # Add calculated fields with getattr for safety
-            'impuesto_causado': getattr(data, 'impuesto_causado', 0) or 0.0,
-            'retenciones_efectuadas': getattr(data, 'retenciones_efectuadas', 0) or 0.0,
-            'subtotal_a_pagar': getattr(data, 'subtotal_a_pagar', 0) or 0.0,
-            'total_impuesto_pagar_retencion': getattr(data, 'total_impuesto_pagar_retencion', 0) or 0.0,
-            'total_consolidado_iva': getattr(data, 'total_consolidado_iva', 0) or 0.0,
-            'total_impuesto_a_pagar': getattr(data, 'total_impuesto_a_pagar', 0) or 0.0,
-            'interes_mora': getattr(data, 'interes_mora', 0) or 0.0,
-            'multa': getattr(data, 'multa', 0) or 0.0,
-        }
-        
-        # Sum all fields into summary
-        for key, value in md.items():
-            if key not in ['month', 'periodo_fiscal']:
-                summary_104[key] += value
-        
-        summary_104['monthly_details'].append(md)
+    summaries = {}
+    for form, fields in FORM_FIELDS.items():
+        names = [field.name for field in fields]
+        summary = form_values(totals, form, names)
+        summary['monthly_details'] = [
+            {
+                'month': row.periodo_mes_numero,
+                'periodo_fiscal': periodo_label(row),
+                **form_values(row, form, names)
+            }
+            for row in months if getattr(row, f"{form}_has_totals")
+        ]
+        summaries[form] = summary
 
     all_months = set(range(1, 13))
-    present_103 = set(d.periodo_mes_numero for d in docs_103 if d.periodo_mes_numero)
-    present_104 = set(d.periodo_mes_numero for d in docs_104 if d.periodo_mes_numero)
+    present_103 = set(row.periodo_mes_numero for row in months if row.has_form_103)
+    present_104 = set(row.periodo_mes_numero for row in months if row.has_form_104)
     missing_103 = sorted(all_months - present_103 - excluded)
     missing_104 = sorted(all_months - present_104 - excluded)
 
     return {
         'razon_social': razon_social,
         'year': year,
-        'form_103_summary': summary_103,
-        'form_104_summary': summary_104,
+        'form_103_summary': summaries['form_103'],
+        'form_104_summary': summaries['form_104'],
         'missing_months': {'form_103': missing_103, 'form_104': missing_104},
         'excluded_months': sorted(excluded)
     }
@@ -357,30 +274,10 @@ async def validate_year_completeness(
             detail=f"Invalid year parameter: '{year}'. Year must be a valid 4-digit year."
         )
     
-    docs_103 = (await db.execute(
-        select(Document).where(
-            and_(
-                Document.razon_social == razon_social,
-                Document.form_type == FormTypeEnum.FORM_103,
-                Document.periodo_anio == year,
-                Document.user_id == current_user.id
-            )
-        )
-    )).scalars().all()
-    
-    docs_104 = (await db.execute(
-        select(Document).where(
-            and_(
-                Document.razon_social == razon_social,
-                Document.form_type == FormTypeEnum.FORM_104,
-                Document.periodo_anio == year,
-                Document.user_id == current_user.id
-            )
-        )
-    )).scalars().all()
+    rows = await client_year_service.load_year(db, current_user.id, razon_social, year)
 
-    present_103 = {d.periodo_mes_numero: d for d in docs_103 if d.periodo_mes_numero}
-    present_104 = {d.periodo_mes_numero: d for d in docs_104 if d.periodo_mes_numero}
+    present_103 = {row.periodo_mes_numero: row.form_103_document_id for row in rows if row.form_103_document_id}
+    present_104 = {row.periodo_mes_numero: row.form_104_document_id for row in rows if row.form_104_document_id}
 
     month_names = ['', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio', 
                    'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
@@ -391,8 +288,8 @@ async def validate_year_completeness(
             'month_name': month_names[m],
             'has_form_103': m in present_103,
             'has_form_104': m in present_104,
-            'form_103_id': present_103[m].id if m in present_103 else None,
-            'form_104_id': present_104[m].id if m in present_104 else None,
+            'form_103_id': present_103.get(m),
+            'form_104_id': present_104.get(m),
             'is_complete': m in present_103 and m in present_104
         })
     
@@ -429,273 +326,64 @@ async def export_yearly_excel(
             detail=f"Invalid year parameter: '{year}'. Cannot export data for invalid year."
         )
     
-    excluded = set(int(m.strip()) for m in exclude_months.split(',')) if exclude_months else set()
-
-    # Fetch Form 103 documents
-    query_103 = select(Document).where(
-        and_(
-            Document.razon_social == razon_social,
-            Document.form_type == FormTypeEnum.FORM_103,
-            Document.periodo_anio == year,
-            Document.user_id == current_user.id
-        )
-    ).order_by(Document.periodo_mes_numero.asc())
-    if excluded:
-        query_103 = query_103.where(Document.periodo_mes_numero.notin_(excluded))
-    docs_103 = (await db.execute(query_103)).scalars().all()
+    excluded = parse_excluded_months(exclude_months)
 
-    # Fetch Form 104 documents
-    query_104 = select(Document).where(
-        and_(
-            Document.razon_social == razon_social,
-            Document.form_type == FormTypeEnum.FORM_104,
-            Document.periodo_anio == year,
-            Document.user_id == current_user.id
-        )
-    ).order_by(Document.periodo_mes_numero.asc())
-    if excluded:
-        query_104 = query_104.where(Document.periodo_mes_numero.notin_(excluded))
-    docs_104 = (await db.execute(query_104)).scalars().all()
+    # Monthly rows + year totals (GROUP BY ROLLUP, fields from the shared spec)
+    months, totals = await client_year_service.summarize_year(
+        db, current_user.id, razon_social, year, excluded
+    )
 
-    wb = openpyxl.Workbook()
-    
-    # Styling
-    header_fill = PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid")
-    header_font = Font(color="FFFFFF", bold=True, size=11)
-    total_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
-    border = Border(
-        left=Side(style='thin'),
-        right=Side(style='thin'),
-        top=Side(style='thin'),
-        bottom=Side(style='thin')
+    # Built in a worker thread (write-only workbook), streamed back in chunks
+    path = await build_workbook(
+        write_yearly_workbook, razon_social, year, current_user.email, months, totals
     )
-    
-    month_names = ['', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
-                   'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
-    
-    # --- Form 103 Sheet ---
-    ws_103 = wb.active
-    ws_103.title = "Form 103 - Retenciones"
-    
-    # Title
-    ws_103['A1'] = f"Resumen Anual {year} - Form 103 (Retenciones en la Fuente)"
-    ws_103['A1'].font = Font(size=14, bold=True)
-    ws_103['A2'] = razon_social
-    ws_103['A2'].font = Font(size=11, bold=True)
-    ws_103['A3'] = f"Usuario: {current_user.email}"
-    ws_103['A3'].font = Font(size=9, italic=True)
-    
-    # Column headers
-    headers_103 = ['Mes', 'Período', 'Subtotal Op. País', 'Total Retención', 'Total Impuesto', 'Total Pagado']
-    for col_num, header in enumerate(headers_103, 1):
-        cell = ws_103.cell(row=5, column=col_num)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center')
-        cell.border = border
-    
-    # Data rows
-    row_num = 6
-    total_subtotal = 0
-    total_retencion = 0
-    total_impuesto = 0
-    total_pagado = 0
-    
-    for doc in docs_103:
-        tot = (await db.execute(select(Form103Totals).where(Form103Totals.document_id == doc.id))).scalar_one_or_none()
-        if not tot:
-            continue
-        
-        periodo_fiscal = f"{doc.periodo_mes} {doc.periodo_anio}" if doc.periodo_mes else "N/A"
-        
-        ws_103.cell(row=row_num, column=1).value = month_names[doc.periodo_mes_numero] if doc.periodo_mes_numero else "N/A"
-        ws_103.cell(row=row_num, column=2).value = periodo_fiscal
-        ws_103.cell(row=row_num, column=3).value = tot.subtotal_operaciones_pais or 0.0
-        ws_103.cell(row=row_num, column=4).value = tot.total_retencion or 0.0
-        ws_103.cell(row=row_num, column=5).value = tot.total_impuesto_pagar or 0.0
-        ws_103.cell(row=row_num, column=6).value = tot.total_pagado or 0.0
-        
-        # Format and borders
-        for col in range(1, 7):
-            cell = ws_103.cell(row=row_num, column=col)
-            cell.border = border
-            if col >= 3:
-                cell.number_format = '$#,##0.00'
-                cell.alignment = Alignment(horizontal='right')
-        
-        total_subtotal += tot.subtotal_operaciones_pais or 0.0
-        total_retencion += tot.total_retencion or 0.0
-        total_impuesto += tot.total_impuesto_pagar or 0.0
-        total_pagado += tot.total_pagado or 0.0
-        
-        row_num += 1
-    
-    # Total row
-    ws_103.cell(row=row_num, column=1).value = "TOTAL ANUAL"
-    ws_103.cell(row=row_num, column=1).font = Font(bold=True, size=11)
-    ws_103.cell(row=row_num, column=3).value = total_subtotal
-    ws_103.cell(row=row_num, column=4).value = total_retencion
-    ws_103.cell(row=row_num, column=5).value = total_impuesto
-    ws_103.cell(row=row_num, column=6).value = total_pagado
-    
-    for col in range(1, 7):
-        cell = ws_103.cell(row=row_num, column=col)
-        cell.fill = total_fill
-        cell.font = Font(bold=True)
-        cell.border = border
-        if col >= 3:
-            cell.number_format = '$#,##0.00'
-            cell.alignment = Alignment(horizontal='right')
-    
-    # Column widths
-    ws_103.column_dimensions['A'].width = 12
-    ws_103.column_dimensions['B'].width = 15
-    ws_103.column_dimensions['C'].width = 18
-    ws_103.column_dimensions['D'].width = 18
-    ws_103.column_dimensions['E'].width = 18
-    ws_103.column_dimensions['F'].width = 18
-    
-    # --- Form 104 Sheet ---
-    ws_104 = wb.create_sheet("Form 104 - IVA")
-    
-    # Title
-    ws_104['A1'] = f"Resumen Anual {year} - Form 104 (IVA)"
-    ws_104['A1'].font = Font(size=14, bold=True)
-    ws_104['A2'] = razon_social
-    ws_104['A2'].font = Font(size=11, bold=True)
-    ws_104['A3'] = f"Usuario: {current_user.email}"
-    ws_104['A3'].font = Font(size=9, italic=True)
-    
-    # Monthly detail section
-    ws_104['A5'] = "DETALLE MENSUAL"
-    ws_104['A5'].font = Font(size=12, bold=True)
-    
-    # Headers
-    headers_104 = ['Mes', 'Período', 'Ventas Neto', 'Imp. Generado', 'Adquisiciones', 'Créd. Trib.', 'Imp. Retenido', 'Total Pagado']
-    for col_num, header in enumerate(headers_104, 1):
-        cell = ws_104.cell(row=6, column=col_num)
-        cell.value = header
-        cell.fill = header_fill
-        cell.font = header_font
-        cell.alignment = Alignment(horizontal='center', vertical='center', wrap_text=True)
-        cell.border = border
-    
-    # Data rows
-    row_num = 7
-    total_ventas = 0
-    total_impuesto_gen = 0
-    total_adq = 0
-    total_cred = 0
-    total_ret = 0
-    total_pag = 0
-    
-    for doc in docs_104:
-        data = (await db.execute(select(Form104Data).where(Form104Data.document_id == doc.id))).scalar_one_or_none()
-        
-        if not data:
-            continue
-        
-        periodo_fiscal = f"{doc.periodo_mes} {doc.periodo_anio}" if doc.periodo_mes else "N/A"
-        
-        ws_104.cell(row=row_num, column=1).value = month_names[doc.periodo_mes_numero] if doc.periodo_mes_numero else "N/A"
-        ws_104.cell(row=row_num, column=2).value = periodo_fiscal
-        ws_104.cell(row=row_num, column=3).value = getattr(data, 'total_ventas_neto', 0) or 0.0
-        ws_104.cell(row=row_num, column=4).value = getattr(data, 'total_impuesto_generado', 0) or 0.0
-        ws_104.cell(row=row_num, column=5).value = getattr(data, 'total_adquisiciones', 0) or 0.0
-        ws_104.cell(row=row_num, column=6).value = getattr(data, 'credito_tributario_aplicable', 0) or 0.0
-        ws_104.cell(row=row_num, column=7).value = getattr(data, 'total_impuesto_retenido', 0) or 0.0
-        ws_104.cell(row=row_num, column=8).value = getattr(data, 'total_pagado', 0) or 0.0
-        
-        # Format and borders
-        for col in range(1, 9):
-            cell = ws_104.cell(row=row_num, column=col)
-            cell.border = border
-            if col >= 3:
-                cell.number_format = '$#,##0.00'
-                cell.alignment = Alignment(horizontal='right')
-        
-        total_ventas += getattr(data, 'total_ventas_neto', 0) or 0.0
-        total_impuesto_gen += getattr(data, 'total_impuesto_generado', 0) or 0.0
-        total_adq += getattr(data, 'total_adquisiciones', 0) or 0.0
-        total_cred += getattr(data, 'credito_tributario_aplicable', 0) or 0.0
-        total_ret += getattr(data, 'total_impuesto_retenido', 0) or 0.0
-        total_pag += getattr(data, 'total_pagado', 0) or 0.0
-        
-        row_num += 1
-    
-    # Total row
-    ws_104.cell(row=row_num, column=1).value = "TOTAL ANUAL"
-    ws_104.cell(row=row_num, column=1).font = Font(bold=True, size=11)
-    ws_104.cell(row=row_num, column=3).value = total_ventas
-    ws_104.cell(row=row_num, column=4).value = total_impuesto_gen
-    ws_104.cell(row=row_num, column=5).value = total_adq
-    ws_104.cell(row=row_num, column=6).value = total_cred
-    ws_104.cell(row=row_num, column=7).value = total_ret
-    ws_104.cell(row=row_num, column=8).value = total_pag
-    
-    for col in range(1, 9):
-        cell = ws_104.cell(row=row_num, column=col)
-        cell.fill = total_fill
-        cell.font = Font(bold=True)
-        cell.border = border
-        if col >= 3:
-            cell.number_format = '$#,##0.00'
-            cell.alignment = Alignment(horizontal='right')
-    
-    # Summary section
-    row_num += 3
-    ws_104.cell(row=row_num, column=1).value = "RESUMEN ANUAL"
-    ws_104.cell(row=row_num, column=1).font = Font(size=12, bold=True)
-    
-    row_num += 1
-    summary_items = [
-        ('Total Ventas Neto', total_ventas),
-        ('Total Impuesto Generado', total_impuesto_gen),
-        ('Total Adquisiciones', total_adq),
-        ('Total Crédito Tributario', total_cred),
-        ('Total Impuesto Retenido', total_ret),
-        ('TOTAL PAGADO', total_pag)
-    ]
-    
-    for label, value in summary_items:
-        ws_104.cell(row=row_num, column=1).value = label
-        ws_104.cell(row=row_num, column=1).font = Font(bold=True)
-        ws_104.cell(row=row_num, column=1).border = border
-        ws_104.cell(row=row_num, column=2).value = value
-        ws_104.cell(row=row_num, column=2).number_format = '$#,##0.00'
-        ws_104.cell(row=row_num, column=2).border = border
-        ws_104.cell(row=row_num, column=2).alignment = Alignment(horizontal='right')
-        
-        if label == 'TOTAL PAGADO':
-            ws_104.cell(row=row_num, column=1).fill = PatternFill(start_color="4CAF50", end_color="4CAF50", fill_type="solid")
-            ws_104.cell(row=row_num, column=1).font = Font(bold=True, color="FFFFFF", size=12)
-            ws_104.cell(row=row_num, column=2).fill = PatternFill(start_color="C8E6C9", end_color="C8E6C9", fill_type="solid")
-            ws_104.cell(row=row_num, column=2).font = Font(bold=True, size=12)
-        
-        row_num += 1
-    
-    # Column widths
-    ws_104.column_dimensions['A'].width = 12
-    ws_104.column_dimensions['B'].width = 15
-    for col in ['C', 'D', 'E', 'F', 'G', 'H']:
-        ws_104.column_dimensions[col].width = 15
-    
-    # Save to bytes
-    output = BytesIO()
-    wb.save(output)
-    output.seek(0)
-    
+
     # Return as downloadable file
     filename = f"{razon_social.replace(' ', '_')}_{year}_resumen_anual.xlsx"
     
     return StreamingResponse(
-        output,
+        stream_file(path),
         media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
 
 
+# ------------------------------
+# Bulk export to Excel (many clients / years)
+# ------------------------------
+@router.post("/export-excel")
+async def export_bulk_excel(
+    request: BulkExcelExport,
+    db: AsyncSession = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    Export the monthly totals of several clients and years to one Excel file
+    ✅ Rows fetched in batches with a server-side cursor and written by a worker thread
+    ✅ Memory does not grow with the number of rows
+    ✅ User data isolation
+    """
+    invalid_years = [year for year in request.years or [] if not is_valid_year(year)]
+    if invalid_years:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid year parameter: {', '.join(invalid_years)}. Cannot export data for invalid year."
+        )
+
+    batches = client_year_service.stream_rows(
+        db, current_user.id, request.razon_sociales, request.years,
+        batch_size=settings.EXPORT_FETCH_BATCH_SIZE
+    )
+    path = await build_workbook_streaming(write_bulk_workbook, batches, current_user.email)
+
+    years = "_".join(sorted(request.years)) if request.years else "todos"
+    return StreamingResponse(
+        stream_file(path),
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        headers={"Content-Disposition": f"attachment; filename=clientes_{years}_resumen.xlsx"}
+    )
+
+
 # ------------------------------
 # Export to PDF
 # ------------------------------
@@ -719,190 +407,22 @@ async def export_yearly_pdf(
             detail=f"Invalid year parameter: '{year}'. Cannot export PDF for invalid year."
         )
 
-    excluded = set(int(m.strip()) for m in exclude_months.split(',')) if exclude_months else set()
+    excluded = parse_excluded_months(exclude_months)
 
-    # Fetch Form 103 documents
-    query_103 = select(Document).where(
-        and_(
-            Document.razon_social == razon_social,
-            Document.form_type == FormTypeEnum.FORM_103,
-            Document.periodo_anio == year,
-            Document.user_id == current_user.id
-        )
-    ).order_by(Document.periodo_mes_numero.asc())
-    if excluded:
-        query_103 = query_103.where(Document.periodo_mes_numero.notin_(excluded))
-    docs_103 = (await db.execute(query_103)).scalars().all()
-
-    # Fetch Form 104 documents
-    query_104 = select(Document).where(
-        and_(
-            Document.razon_social == razon_social,
-            Document.form_type == FormTypeEnum.FORM_104,
-            Document.periodo_anio == year,
-            Document.user_id == current_user.id
-        )
-    ).order_by(Document.periodo_mes_numero.asc())
-    if excluded:
-        query_104 = query_104.where(Document.periodo_mes_numero.notin_(excluded))
-    docs_104 = (await db.execute(query_104)).scalars().all()
-
-    # PDF setup
-    output = BytesIO()
-    pdf_doc = SimpleDocTemplate(output, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
-    elements = []
-    styles = getSampleStyleSheet()
-
-    # Custom styles
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        textColor=colors.HexColor(branding.primary_color),
-        spaceAfter=12,
-        alignment=1
+    # Monthly rows + year totals (GROUP BY ROLLUP, fields from the shared spec)
+    months, totals = await client_year_service.summarize_year(
+        db, current_user.id, razon_social, year, excluded
     )
 
-    subtitle_style = ParagraphStyle(
-        'CustomSubtitle',
-        parent=styles['Heading2'],
-        fontSize=14,
-        textColor=colors.HexColor(branding.secondary_color),
-        spaceAfter=10
+    # Served from cache when nothing changed, otherwise rendered in a worker thread
+    pdf = await pdf_report_service.yearly_report(
+        current_user.id, razon_social, year, excluded, branding.model_dump(), months, totals
     )
 
-    # Logo
-    if branding.logo_url:
-        try:
-            response = requests.get(branding.logo_url, timeout=5)
-            img = PILImage.open(BytesIO(response.content))
-            aspect = img.height / float(img.width)
-            logo = Image(BytesIO(response.content), width=2*inch, height=(2*aspect)*inch)
-            elements.append(logo)
-            elements.append(Spacer(1, 0.2*inch))
-        except:
-            pass
-
-    # Title
-    elements.append(Paragraph(branding.company_name, title_style))
-    elements.append(Paragraph(f"Resumen Anual {year}", title_style))
-    elements.append(Paragraph(razon_social, subtitle_style))
-    elements.append(Spacer(1, 0.3*inch))
-
-    month_names = ['', 'Enero', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
-
-    # --- Form 103 Summary ---
-    elements.append(Paragraph("Form 103 - Retenciones en la Fuente", subtitle_style))
-    table_data_103 = [['Mes', 'Período', 'Subtotal Op.', 'Retención', 'Impuesto', 'Total Pagado']]
-
-    total_subtotal = total_retencion = total_impuesto = total_pagado = 0
-
-    for doc in docs_103:
-        tot = (await db.execute(select(Form103Totals).where(Form103Totals.document_id == doc.id))).scalar_one_or_none()
-        if not tot:
-            continue
-        periodo = f"{doc.periodo_mes[:3]} {year}" if doc.periodo_mes else "N/A"
-        table_data_103.append([
-            month_names[doc.periodo_mes_numero] if doc.periodo_mes_numero else "N/A",
-            periodo,
-            f"${tot.subtotal_operaciones_pais or 0:,.2f}",
-            f"${tot.total_retencion or 0:,.2f}",
-            f"${tot.total_impuesto_pagar or 0:,.2f}",
-            f"${tot.total_pagado or 0:,.2f}"
-        ])
-        total_subtotal += tot.subtotal_operaciones_pais or 0.0
-        total_retencion += tot.total_retencion or 0.0
-        total_impuesto += tot.total_impuesto_pagar or 0.0
-        total_pagado += tot.total_pagado or 0.0
-
-    # Total row
-    table_data_103.append([
-        'TOTAL', '',
-        f"${total_subtotal:,.2f}",
-        f"${total_retencion:,.2f}",
-        f"${total_impuesto:,.2f}",
-        f"${total_pagado:,.2f}"
-    ])
-
-    table_103 = Table(table_data_103, colWidths=[0.8*inch, 1.2*inch, 1.2*inch, 1.2*inch, 1.2*inch, 1.2*inch])
-    table_103.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(branding.primary_color)),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(table_103)
-    elements.append(Spacer(1, 0.4*inch))
-
-    # --- Form 104 Summary ---
-    elements.append(Paragraph("Form 104 - IVA", subtitle_style))
-    table_data_104 = [['Mes', 'Ventas Neto', 'Imp. Gen.', 'Adquis.', 'Créd. Trib.', 'Total Pagado']]
-
-    total_ventas = total_imp_gen = total_adq = total_cred = total_pag_104 = 0
-
-    for doc in docs_104:
-        data = (await db.execute(select(Form104Data).where(Form104Data.document_id == doc.id))).scalar_one_or_none()
-        if not data:
-            continue
-        
-        ventas = getattr(data, 'total_ventas_neto', 0) or 0
-        imp_gen = getattr(data, 'total_impuesto_generado', 0) or 0
-        adq = getattr(data, 'total_adquisiciones', 0) or 0
-        cred = getattr(data, 'credito_tributario_aplicable', 0) or 0
-        pag = getattr(data, 'total_pagado', 0) or 0
-        
-        table_data_104.append([
-            month_names[doc.periodo_mes_numero] if doc.periodo_mes_numero else "N/A",
-            f"${ventas:,.2f}",
-            f"${imp_gen:,.2f}",
-            f"${adq:,.2f}",
-            f"${cred:,.2f}",
-            f"${pag:,.2f}"
-        ])
-        total_ventas += ventas
-        total_imp_gen += imp_gen
-        total_adq += adq
-        total_cred += cred
-        total_pag_104 += pag
-
-    # Total row
-    table_data_104.append([
-        'TOTAL',
-        f"${total_ventas:,.2f}",
-        f"${total_imp_gen:,.2f}",
-        f"${total_adq:,.2f}",
-        f"${total_cred:,.2f}",
-        f"${total_pag_104:,.2f}"
-    ])
-
-    table_104 = Table(table_data_104, colWidths=[0.8*inch, 1.3*inch, 1.3*inch, 1.3*inch, 1.3*inch, 1.3*inch])
-    table_104.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(branding.secondary_color)),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 10),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
-        ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black)
-    ]))
-    elements.append(table_104)
-    elements.append(Spacer(1, 0.4*inch))
-
-    # Build the PDF
-    pdf_doc.build(elements)
-    output.seek(0)
-
     # Return as downloadable file
     filename = f"{razon_social.replace(' ', '_')}_{year}_resumen_anual.pdf"
     return StreamingResponse(
-        output,
+        BytesIO(pdf),
         media_type="application/pdf",
         headers={"Content-Disposition": f"attachment; filename={filename}"}
     )
\ No newline at end of file
@@ -7,13 +7,18 @@ Documents API Endpoints - CORRECTED: Dual Access
 from typing import List, Optional
 from fastapi import APIRouter, Depends, HTTPException, Query
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select, func, desc, and_
+from sqlalchemy import select, func, and_, tuple_
+from sqlalchemy.orm import undefer
 from pydantic import BaseModel
 from datetime import datetime
 
 from app.core.database import get_db
 from app.core.security import get_current_user_optional  # ← CHANGED: Optional auth
 from app.models.base import Document, ProcessingStatusEnum, User
+from app.services.client_year_service import client_year_service, aggregate_key
+from app.services.document_stats_service import document_stats_service
+from app.services.platform_counter_service import platform_counter_service
+from app.utils.pagination import encode_cursor, decode_cursor, InvalidCursorError
 
 router = APIRouter()
 
@@ -32,10 +37,24 @@ class DocumentListItem(BaseModel):
 
 class DocumentListResponse(BaseModel):
     """Response model for document list"""
-    total: int
+    total: Optional[int]  # None when count=none
     page: int
     page_size: int
     documents: List[DocumentListItem]
+    next_cursor: Optional[str] = None  # Pass as ?cursor= for the next page (None on the last page)
+
+
+# Columns read by the document list (large TEXT / JSON columns are never selected)
+LIST_COLUMNS = (
+    Document.id,
+    Document.original_filename,
+    Document.file_size,
+    Document.total_pages,
+    Document.total_characters,
+    Document.processing_status,
+    Document.uploaded_at,
+    Document.processed_at,
+)
 
 
 class DocumentDetail(BaseModel):
@@ -55,9 +74,11 @@ class DocumentDetail(BaseModel):
 
 @router.get("/", response_model=DocumentListResponse)
 async def list_documents(
-    page: int = Query(1, ge=1, description="Page number"),
+    page: int = Query(1, ge=1, description="Page number (ignored when cursor is given)"),
     page_size: int = Query(20, ge=1, le=100, description="Items per page"),
     status: Optional[str] = Query(None, description="Filter by processing status"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page (keyset pagination)"),
+    count: str = Query("exact", pattern="^(exact|estimate|none)$", description="Total: exact count, cached estimate or none"),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)  # ← CHANGED: Optional
 ):
@@ -65,6 +86,8 @@ async def list_documents(
     List documents with pagination and filters
     ✅ CORRECTED: If user is logged in, show their documents only
     ✅ If guest, show empty list (guests don't save to DB)
+    ✅ Keyset pagination on (uploaded_at, id): follow next_cursor, deep pages cost the same as the first
+    ✅ Only the listed columns are read (never extracted_text / parsed_data)
     """
     
     # If not logged in, return empty list (guests don't save documents)
@@ -76,51 +99,63 @@ async def list_documents(
             documents=[]
         )
     
-    # Build query with user_id filter for logged-in users
-    query = select(Document).where(Document.user_id == current_user.id)
+    filters = [Document.user_id == current_user.id]
     
     # Apply filters
+    status_enum = None
     if status:
         try:
             status_enum = ProcessingStatusEnum(status)
-            query = query.where(Document.processing_status == status_enum)
+            filters.append(Document.processing_status == status_enum)
         except ValueError:
             raise HTTPException(status_code=400, detail="Invalid status")
     
-    # Get total count for user
-    count_query = select(func.count()).select_from(
-        select(Document).where(Document.user_id == current_user.id).subquery()
+    query = (
+        select(*LIST_COLUMNS)
+        .where(*filters)
+        .order_by(Document.uploaded_at.desc(), Document.id.desc())
+        .limit(page_size + 1)  # One extra row tells whether there is a next page
     )
-    total_result = await db.execute(count_query)
-    total = total_result.scalar()
-    
-    # Add pagination and ordering
-    query = query.order_by(desc(Document.uploaded_at))
-    query = query.offset((page - 1) * page_size).limit(page_size)
+    if cursor:
+        try:
+            after_uploaded_at, after_id = decode_cursor(cursor)
+        except InvalidCursorError:
+            raise HTTPException(status_code=400, detail="Invalid cursor")
+        query = query.where(tuple_(Document.uploaded_at, Document.id) < tuple_(after_uploaded_at, after_id))
+    else:
+        query = query.offset((page - 1) * page_size)
     
-    # Execute query
-    result = await db.execute(query)
-    documents = result.scalars().all()
+    rows = (await db.execute(query)).all()
+    has_more = len(rows) > page_size
+    rows = rows[:page_size]
     
-    # Build response
-    document_items = []
-    for doc in documents:
-        document_items.append(DocumentListItem(
-            id=doc.id,
-            filename=doc.original_filename,
-            file_size=doc.file_size,
-            total_pages=doc.total_pages,
-            total_characters=doc.total_characters,
-            processing_status=doc.processing_status.value,
-            uploaded_at=doc.uploaded_at.isoformat() if doc.uploaded_at else None,
-            processed_at=doc.processed_at.isoformat() if doc.processed_at else None
-        ))
+    # Total for the user (and status filter)
+    total = None
+    if count == "exact":
+        total = (await db.execute(select(func.count()).select_from(Document).where(*filters))).scalar()
+    elif count == "estimate":
+        # Cached per-user counters (may lag a few seconds behind)
+        stats = await document_stats_service.user_stats(db, current_user.id)
+        total = stats["by_status"][status_enum.value] if status_enum else stats["total_documents"]
     
     return DocumentListResponse(
         total=total,
         page=page,
         page_size=page_size,
-        documents=document_items
+        documents=[
+            DocumentListItem(
+                id=row.id,
+                filename=row.original_filename,
+                file_size=row.file_size,
+                total_pages=row.total_pages,
+                total_characters=row.total_characters,
+                processing_status=row.processing_status.value,
+                uploaded_at=row.uploaded_at.isoformat() if row.uploaded_at else None,
+                processed_at=row.processed_at.isoformat() if row.processed_at else None
+            )
+            for row in rows
+        ],
+        next_cursor=encode_cursor(rows[-1].uploaded_at, rows[-1].id) if has_more and rows[-1].uploaded_at else None
     )
 
 
@@ -144,12 +179,14 @@ async def get_document_detail(
     
     # Get document with ownership check
     result = await db.execute(
-        select(Document).where(
+        select(Document)
+        .where(
             and_(
                 Document.id == document_id,
                 Document.user_id == current_user.id
             )
         )
+        .options(undefer(Document.extracted_text))
     )
     document = result.scalar_one_or_none()
     
@@ -215,8 +252,13 @@ async def delete_document(
         os.remove(document.file_path)
     
     # Delete from database
+    key = aggregate_key(document)
     await db.delete(document)
+    await db.flush()
+    await client_year_service.refresh_keys(db, [key])
+    await platform_counter_service.documents_removed(db, 1, [document.razon_social])
     await db.commit()
+    document_stats_service.invalidate([current_user.id])
     
     return {"success": True, "message": "Document deleted successfully"}
 
@@ -245,73 +287,11 @@ async def get_documents_stats(
             "total_characters_extracted": 0
         }
     
-    # Total documents for user
-    total_result = await db.execute(
-        select(func.count(Document.id)).where(Document.user_id == current_user.id)
-    )
-    total_documents = total_result.scalar()
-    
-    # By status for user
-    completed_result = await db.execute(
-        select(func.count(Document.id)).where(
-            and_(
-                Document.processing_status == ProcessingStatusEnum.COMPLETED,
-                Document.user_id == current_user.id
-            )
-        )
-    )
-    completed_count = completed_result.scalar()
-    
-    processing_result = await db.execute(
-        select(func.count(Document.id)).where(
-            and_(
-                Document.processing_status == ProcessingStatusEnum.PROCESSING,
-                Document.user_id == current_user.id
-            )
-        )
-    )
-    processing_count = processing_result.scalar()
-    
-    failed_result = await db.execute(
-        select(func.count(Document.id)).where(
-            and_(
-                Document.processing_status == ProcessingStatusEnum.FAILED,
-                Document.user_id == current_user.id
-            )
-        )
-    )
-    failed_count = failed_result.scalar()
-    
-    # Total characters extracted for user
-    total_chars_result = await db.execute(
-        select(func.sum(Document.total_characters)).where(
-            and_(
-                Document.total_characters.isnot(None),
-                Document.user_id == current_user.id
-            )
-        )
-    )
-    total_characters = total_chars_result.scalar() or 0
-    
-    # Total pages for user
-    total_pages_result = await db.execute(
-        select(func.sum(Document.total_pages)).where(
-            and_(
-                Document.total_pages.isnot(None),
-                Document.user_id == current_user.id
-            )
-        )
-    )
-    total_pages = total_pages_result.scalar() or 0
+    stats = await document_stats_service.user_stats(db, current_user.id)
     
     return {
-        "total_documents": total_documents,
-        "by_status": {
-            "completed": completed_count,
-            "processing": processing_count,
-            "failed": failed_count,
-            "pending": total_documents - processing_count - completed_count - failed_count
-        },
-        "total_pages_extracted": total_pages,
-        "total_characters_extracted": total_characters
+        "total_documents": stats["total_documents"],
+        "by_status": stats["by_status"],
+        "total_pages_extracted": stats["total_pages_extracted"],
+        "total_characters_extracted": stats["total_characters_extracted"]
     }
\ No newline at end of file
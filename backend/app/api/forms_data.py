@@ -8,6 +8,7 @@ Updated Forms Data API Endpoints
 from fastapi import APIRouter, Depends, HTTPException, Request
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, and_, or_
+from sqlalchemy.orm import undefer
 from typing import Optional
 
 from app.core.database import get_db
@@ -114,7 +115,7 @@ async def get_form_104_data(
     doc_query = select(Document).where(
         Document.id == document_id, 
         Document.form_type == FormTypeEnum.FORM_104
-    )
+    ).options(undefer(Document.parsed_data))
     doc_result = await db.execute(doc_query)
     document = doc_result.scalar_one_or_none()
     
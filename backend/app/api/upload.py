@@ -3,22 +3,28 @@ Upload API Endpoints - BULLETPROOF GUEST LIMIT ENFORCEMENT
 ✅ Counts ACTUAL documents from database (not session counter)
 ✅ Prevents race conditions
 ✅ Cannot be bypassed
+✅ Uploads are queued for the ingestion workers (pass ?wait=true to process inline)
 """
 
+import asyncio
 import os
 import uuid
-from typing import List, Optional
-from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Response
+from typing import List, Optional, Tuple
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException, Request, Response, Query
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, func
+from sqlalchemy.exc import IntegrityError
 
 from app.core.security import get_current_user_optional 
-from app.core.database import get_db
+from app.core.database import get_db, AsyncSessionLocal
 from app.core.config import settings
-from app.models.base import User, Document
+from app.models.base import User, Document, UploadJob, ProcessingStatusEnum
 from app.utils.session_utils import get_session_id_from_request, get_client_ip, get_user_agent
+from app.utils.upload_writer import stream_upload_to_disk, UploadTooLargeError
 from app.core.guest_session import GuestSessionManager
 from app.services.enhanced_form_processing_service import enhanced_form_processing_service
+from app.services.ingestion_queue import ingestion_queue, job_to_dict
+from app.services.document_stats_service import document_stats_service
 from pydantic import BaseModel
 
 router = APIRouter()
@@ -36,6 +42,7 @@ class UploadResponse(BaseModel):
     form_type: str
     processing_status: str
     is_duplicate: Optional[bool] = False
+    job_id: Optional[int] = None
 
 
 class BulkUploadResponse(BaseModel):
@@ -45,6 +52,7 @@ class BulkUploadResponse(BaseModel):
     uploaded: List[UploadResponse]
     failed: List[dict]
     summary: Optional[dict] = None
+    batch_id: Optional[str] = None
 
 
 async def get_or_create_guest_session(
@@ -124,17 +132,281 @@ async def check_guest_can_upload(
     return (True, remaining, "OK")
 
 
+async def save_upload_file(file: UploadFile) -> Tuple[str, int, str]:
+    """
+    Stream an uploaded file to UPLOAD_DIR under a unique name (MAX_UPLOAD_SIZE enforced)
+    Returns: (file_path, file_size, sha256 hex digest)
+    """
+    return await stream_upload_to_disk(
+        file,
+        directory=settings.UPLOAD_DIR,
+        max_size=settings.MAX_UPLOAD_SIZE,
+        chunk_size=settings.UPLOAD_CHUNK_SIZE
+    )
+
+
+def duplicate_response(document: Document, original_filename: str) -> UploadResponse:
+    """Response for an upload that matched an existing document"""
+    return UploadResponse(
+        success=True,
+        message="Duplicate document",
+        document_id=document.id,
+        filename=original_filename,
+        form_type=document.form_type.value if document.form_type else "unknown",
+        processing_status=document.processing_status.value,
+        is_duplicate=True
+    )
+
+
+async def queued_response(document: Document, original_filename: str, db: AsyncSession) -> UploadResponse:
+    """Response for an upload whose bytes are already waiting in the ingestion queue"""
+    job_id = (await db.execute(
+        select(UploadJob.id).where(UploadJob.document_id == document.id).order_by(UploadJob.id.desc()).limit(1)
+    )).scalar_one_or_none()
+    return UploadResponse(
+        success=True,
+        message="File already queued for processing",
+        document_id=document.id,
+        filename=original_filename,
+        form_type=document.form_type.value if document.form_type else "unknown",
+        processing_status=document.processing_status.value,
+        job_id=job_id
+    )
+
+
+async def answer_from_existing(
+    file_path: str,
+    original_filename: str,
+    db: AsyncSession,
+    user_id: Optional[int],
+    session_id: Optional[str],
+    content_hash: str
+) -> Optional[Tuple[UploadResponse, Optional[bool]]]:
+    """
+    Answer an upload from the owner's earlier copy of the same bytes
+    Only a COMPLETED copy is a duplicate; a queued copy is reported as queued; a FAILED copy
+    is removed so the new file is ingested (None is returned)
+    """
+    existing = await enhanced_form_processing_service.reusable_document_by_hash(
+        content_hash, user_id, session_id, db
+    )
+    if existing is None:
+        await db.commit()  # A failed copy may have been removed
+        return None
+    
+    os.remove(file_path)
+    if existing.processing_status == ProcessingStatusEnum.COMPLETED:
+        return duplicate_response(existing, original_filename), True
+    return await queued_response(existing, original_filename, db), None
+
+
+async def ingest_file(
+    file_path: str,
+    original_filename: str,
+    file_size: int,
+    db: AsyncSession,
+    user_id: Optional[int],
+    session_id: Optional[str],
+    wait: bool,
+    batch_id: str,
+    content_hash: Optional[str] = None
+) -> Tuple[UploadResponse, Optional[bool]]:
+    """
+    Process a saved file inline (wait=True) or queue it for the ingestion workers
+    ✅ Same bytes already processed for this owner: answered from the database, the PDF is never opened
+    Returns: (response, is_duplicate) - is_duplicate is None while the job is queued
+    """
+    if content_hash:
+        answered = await answer_from_existing(
+            file_path, original_filename, db, user_id, session_id, content_hash
+        )
+        if answered:
+            return answered
+    
+    if wait:
+        try:
+            document, is_duplicate = await enhanced_form_processing_service.process_uploaded_document(
+                file_path=file_path,
+                original_filename=original_filename,
+                file_size=file_size,
+                db=db,
+                user_id=user_id,
+                session_id=session_id,
+                allow_duplicates=False,
+                content_hash=content_hash
+            )
+        finally:
+            # Stored, failed or duplicate: the user's counters may have moved
+            document_stats_service.invalidate([user_id])
+        
+        return UploadResponse(
+            success=True,
+            message="Duplicate document" if is_duplicate else "File uploaded successfully",
+            document_id=document.id,
+            filename=original_filename,
+            form_type=document.form_type.value,
+            processing_status=document.processing_status.value,
+            is_duplicate=is_duplicate
+        ), is_duplicate
+    
+    for attempt in range(2):
+        try:
+            document, job = await ingestion_queue.enqueue_upload(
+                file_path=file_path,
+                original_filename=original_filename,
+                file_size=file_size,
+                batch_id=batch_id,
+                db=db,
+                user_id=user_id,
+                session_id=session_id,
+                content_hash=content_hash
+            )
+            await db.commit()
+            document_stats_service.invalidate([user_id])
+            break
+        except IntegrityError:
+            # The same file was queued concurrently for this owner
+            await db.rollback()
+            if not content_hash:
+                raise
+            answered = await answer_from_existing(
+                file_path, original_filename, db, user_id, session_id, content_hash
+            )
+            if answered:
+                return answered
+            if attempt:
+                raise
+            # The concurrent copy had failed and was removed: enqueue again
+    
+    return UploadResponse(
+        success=True,
+        message="File queued for processing",
+        document_id=document.id,
+        filename=original_filename,
+        form_type=document.form_type.value,
+        processing_status=document.processing_status.value,
+        job_id=job.id
+    ), None
+
+
+async def process_bulk_file(
+    file: UploadFile,
+    user_id: Optional[int],
+    session_id: Optional[str],
+    wait: bool,
+    batch_id: str,
+    semaphore: asyncio.Semaphore
+) -> Tuple[Optional[UploadResponse], Optional[dict], Optional[bool]]:
+    """
+    Validate, save and ingest one file of a bulk upload
+    ✅ Own DB session: files of the same upload run concurrently
+    Returns: (response, failure, is_duplicate)
+    """
+    if not file.filename.lower().endswith('.pdf'):
+        return None, {"filename": file.filename, "error": "Not a PDF file"}, None
+    
+    if file.size and file.size > settings.MAX_UPLOAD_SIZE:
+        return None, {"filename": file.filename, "error": "File size exceeds maximum"}, None
+    
+    async with semaphore:
+        async with AsyncSessionLocal() as db:
+            file_path = None
+            try:
+                file_path, file_size, content_hash = await save_upload_file(file)
+                
+                result, is_duplicate = await ingest_file(
+                    file_path=file_path,
+                    original_filename=file.filename,
+                    file_size=file_size,
+                    db=db,
+                    user_id=user_id,
+                    session_id=session_id,
+                    wait=wait,
+                    batch_id=batch_id,
+                    content_hash=content_hash
+                )
+                
+                if session_id:
+                    guest_manager = GuestSessionManager(db)
+                    
+                    # Track file (identical re-uploads were already discarded)
+                    if os.path.exists(file_path):
+                        await guest_manager.track_temporary_file(
+                            session_id=session_id,
+                            file_path=file_path,
+                            file_size=file_size
+                        )
+                    
+                    await guest_manager.log_event(
+                        event_type="guest_upload",
+                        session_id=session_id,
+                        metadata={
+                            "document_id": result.document_id,
+                            "filename": file.filename,
+                            "is_duplicate": bool(is_duplicate),
+                            "queued": is_duplicate is None
+                        }
+                    )
+                
+                print(f"  {'📥 Queued' if is_duplicate is None else '⚠️ Duplicate' if is_duplicate else '✅ New'}: {file.filename}")
+                return result, None, is_duplicate
+                
+            except UploadTooLargeError:
+                return None, {"filename": file.filename, "error": "File size exceeds maximum"}, None
+            except Exception as e:
+                print(f"  ❌ Error: {str(e)}")
+                await db.rollback()
+                if file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+                return None, {"filename": file.filename, "error": str(e)}, None
+
+
+async def run_bulk_upload(
+    files: List[UploadFile],
+    user_id: Optional[int],
+    session_id: Optional[str],
+    wait: bool,
+    batch_id: str
+) -> Tuple[List[UploadResponse], List[dict], dict]:
+    """
+    Fan the files out over at most BULK_UPLOAD_CONCURRENCY concurrent workers
+    Returns: (uploaded, failed, summary) - in the order the files were sent
+    """
+    semaphore = asyncio.Semaphore(max(1, settings.BULK_UPLOAD_CONCURRENCY))
+    outcomes = await asyncio.gather(*(
+        process_bulk_file(file, user_id, session_id, wait, batch_id, semaphore)
+        for file in files
+    ))
+    
+    uploaded = [result for result, _, _ in outcomes if result is not None]
+    failed = [failure for _, failure, _ in outcomes if failure is not None]
+    summary = {
+        "new": sum(1 for result, _, dup in outcomes if result is not None and dup is False),
+        "duplicates": sum(1 for result, _, dup in outcomes if result is not None and dup is True),
+        "queued": sum(1 for result, _, dup in outcomes if result is not None and dup is None),
+        "errors": len(failed)
+    }
+    
+    if summary["queued"]:
+        ingestion_queue.notify()
+    
+    return uploaded, failed, summary
+
+
 @router.post("/bulk")
 async def upload_multiple_pdfs(
     request: Request,
     response: Response,
     files: List[UploadFile] = File(...),
+    wait: bool = Query(False, description="Process inline and return parsed results"),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
     Upload multiple PDF files
     ✅ BULLETPROOF: Counts actual documents from database
+    ✅ Returns immediately with PENDING documents; poll /batches/{batch_id} for progress
+    ✅ Files are handled concurrently (BULK_UPLOAD_CONCURRENCY), results keep input order
     """
     
     if not files:
@@ -143,7 +415,7 @@ async def upload_multiple_pdfs(
     if len(files) > 20:
         raise HTTPException(status_code=400, detail="Maximum 20 files allowed per bulk upload")
     
-    guest_manager = GuestSessionManager(db)
+    batch_id = uuid.uuid4().hex
     
     # ============================================
     # ✅ AUTHENTICATED USER FLOW
@@ -151,79 +423,21 @@ async def upload_multiple_pdfs(
     if current_user:
         print(f"✅ Authenticated user upload: {current_user.username} (ID: {current_user.id})")
         
-        uploaded = []
-        failed = []
-        new_count = 0
-        duplicate_count = 0
-        error_count = 0
-        
-        for file in files:
-            try:
-                if not file.filename.lower().endswith('.pdf'):
-                    failed.append({"filename": file.filename, "error": "Not a PDF file"})
-                    error_count += 1
-                    continue
-                
-                if file.size and file.size > settings.MAX_UPLOAD_SIZE:
-                    failed.append({
-                        "filename": file.filename,
-                        "error": f"File size exceeds maximum"
-                    })
-                    error_count += 1
-                    continue
-                
-                file_extension = os.path.splitext(file.filename)[1]
-                unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-                file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-                
-                with open(file_path, "wb") as buffer:
-                    content = await file.read()
-                    buffer.write(content)
-                
-                file_size = len(content)
-                
-                document, is_duplicate = await enhanced_form_processing_service.process_uploaded_document(
-                    file_path=file_path,
-                    original_filename=file.filename,
-                    file_size=file_size,
-                    db=db,
-                    user_id=current_user.id,
-                    session_id=None,
-                    allow_duplicates=False
-                )
-                
-                if is_duplicate:
-                    duplicate_count += 1
-                else:
-                    new_count += 1
-                
-                uploaded.append(UploadResponse(
-                    success=True,
-                    message="Duplicate document" if is_duplicate else "File uploaded successfully",
-                    document_id=document.id,
-                    filename=file.filename,
-                    form_type=document.form_type.value,
-                    processing_status=document.processing_status.value,
-                    is_duplicate=is_duplicate
-                ))
-                
-            except Exception as e:
-                error_count += 1
-                print(f"  ❌ Error: {str(e)}")
-                if 'file_path' in locals() and os.path.exists(file_path):
-                    os.remove(file_path)
-                failed.append({"filename": file.filename, "error": str(e)})
+        uploaded, failed, summary = await run_bulk_upload(
+            files=files,
+            user_id=current_user.id,
+            session_id=None,
+            wait=wait,
+            batch_id=batch_id
+        )
         
         return BulkUploadResponse(
             success=len(uploaded) > 0,
             total_files=len(files),
             uploaded=uploaded,
             failed=failed,
-            summary={
-                "new": new_count,
-                "duplicates": duplicate_count,
-                "errors": error_count
-            }
+            summary=summary,
+            batch_id=batch_id if summary["queued"] else None
         )
     
     # ============================================
@@ -252,80 +466,13 @@ async def upload_multiple_pdfs(
         
         print(f"  ✅ Upload allowed: {remaining} slots remaining")
         
-        uploaded = []
-        failed = []
-        new_count = 0
-        duplicate_count = 0
-        error_count = 0
-        
-        for file in files:
-            try:
-                if not file.filename.lower().endswith('.pdf'):
-                    failed.append({"filename": file.filename, "error": "Not a PDF file"})
-                    error_count += 1
-                    continue
-                
-                file_extension = os.path.splitext(file.filename)[1]
-                unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-                file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-                
-                with open(file_path, "wb") as buffer:
-                    content = await file.read()
-                    buffer.write(content)
-                
-                file_size = len(content)
-                
-                # ✅ Process with session_id
-                document, is_duplicate = await enhanced_form_processing_service.process_uploaded_document(
-                    file_path=file_path,
-                    original_filename=file.filename,
-                    file_size=file_size,
-                    db=db,
-                    user_id=None,
-                    session_id=session_id,
-                    allow_duplicates=False
-                )
-                
-                # Track file
-                await guest_manager.track_temporary_file(
-                    session_id=session_id,
-                    file_path=file_path,
-                    file_size=file_size
-                )
-                
-                if is_duplicate:
-                    duplicate_count += 1
-                else:
-                    new_count += 1
-                
-                await guest_manager.log_event(
-                    event_type="guest_upload",
-                    session_id=session_id,
-                    metadata={
-                        "document_id": document.id,
-                        "filename": file.filename,
-                        "is_duplicate": is_duplicate
-                    }
-                )
-                
-                uploaded.append(UploadResponse(
-                    success=True,
-                    message="Duplicate document" if is_duplicate else "File uploaded successfully",
-                    document_id=document.id,
-                    filename=file.filename,
-                    form_type=document.form_type.value,
-                    processing_status=document.processing_status.value,
-                    is_duplicate=is_duplicate
-                ))
-                
-                print(f"  {'⚠️ Duplicate' if is_duplicate else '✅ New'}: {file.filename}")
-                
-            except Exception as e:
-                error_count += 1
-                print(f"  ❌ Error: {str(e)}")
-                if 'file_path' in locals() and os.path.exists(file_path):
-                    os.remove(file_path)
-                failed.append({"filename": file.filename, "error": str(e)})
+        uploaded, failed, summary = await run_bulk_upload(
+            files=files,
+            user_id=None,
+            session_id=session_id,
+            wait=wait,
+            batch_id=batch_id
+        )
         
         # ✅ Get updated count from database
         final_count = await get_guest_document_count(session_id, db)
@@ -333,21 +480,19 @@ async def upload_multiple_pdfs(
         
         print(f"  📊 Final guest document count: {final_count}/{GUEST_DOCUMENT_LIMIT}")
         
+        summary["session_info"] = {
+            "document_count": final_count,
+            "documents_remaining": final_remaining,
+            "limit": GUEST_DOCUMENT_LIMIT
+        }
+        
         return BulkUploadResponse(
             success=len(uploaded) > 0,
             total_files=len(files),
             uploaded=uploaded,
             failed=failed,
-            summary={
-                "new": new_count,
-                "duplicates": duplicate_count,
-                "errors": error_count,
-                "session_info": {
-                    "document_count": final_count,
-                    "documents_remaining": final_remaining,
-                    "limit": GUEST_DOCUMENT_LIMIT
-                }
-            }
+            summary=summary,
+            batch_id=batch_id if summary["queued"] else None
         )
 
 
@@ -356,12 +501,14 @@ async def upload_single_pdf(
     request: Request,
     response: Response,
     file: UploadFile = File(...),
+    wait: bool = Query(False, description="Process inline and return parsed results"),
     db: AsyncSession = Depends(get_db),
     current_user: Optional[User] = Depends(get_current_user_optional)
 ):
     """
     Upload a single PDF file
     ✅ BULLETPROOF: Counts actual documents from database
+    ✅ Returns immediately with a PENDING document; poll /jobs/{job_id} for progress
     """
     
     if not file.filename.lower().endswith('.pdf'):
@@ -394,43 +541,108 @@ async def upload_single_pdf(
             print(f"  ❌ Upload blocked: {message}")
             raise HTTPException(status_code=403, detail=message)
     
+    file_path = None
     try:
-        file_extension = os.path.splitext(file.filename)[1]
-        unique_filename = f"{uuid.uuid4().hex}{file_extension}"
-        file_path = os.path.join(settings.UPLOAD_DIR, unique_filename)
-        
-        with open(file_path, "wb") as buffer:
-            content = await file.read()
-            buffer.write(content)
+        file_path, file_size, content_hash = await save_upload_file(file)
         
-        file_size = len(content)
-        
-        document, is_duplicate = await enhanced_form_processing_service.process_uploaded_document(
+        result, is_duplicate = await ingest_file(
             file_path=file_path,
             original_filename=file.filename,
             file_size=file_size,
             db=db,
             user_id=user_id,
             session_id=session_id,
-            allow_duplicates=False
+            wait=wait,
+            batch_id=uuid.uuid4().hex,
+            content_hash=content_hash
         )
         
-        return UploadResponse(
-            success=True,
-            message="Duplicate document" if is_duplicate else "File uploaded successfully",
-            document_id=document.id,
-            filename=file.filename,
-            form_type=document.form_type.value,
-            processing_status=document.processing_status.value,
-            is_duplicate=is_duplicate
-        )
+        if is_duplicate is None:
+            ingestion_queue.notify()
+        
+        return result
         
+    except UploadTooLargeError:
+        raise HTTPException(status_code=400, detail="File size exceeds maximum")
     except Exception as e:
-        if 'file_path' in locals() and os.path.exists(file_path):
+        if file_path and os.path.exists(file_path):
             os.remove(file_path)
         raise HTTPException(status_code=500, detail=f"Error processing file: {str(e)}")
 
 
+def _job_owner_filter(request: Request, current_user: Optional[User]):
+    """Jobs are visible to the user (or guest session) that uploaded them"""
+    if current_user:
+        return UploadJob.user_id == current_user.id
+    
+    session_id = get_session_id_from_request(request)
+    if not session_id:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return UploadJob.session_id == session_id
+
+
+@router.get("/jobs/{job_id}")
+async def get_upload_job(
+    job_id: int,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Get the processing status of one queued upload"""
+    result = await db.execute(
+        select(UploadJob, Document)
+        .outerjoin(Document, Document.id == UploadJob.document_id)
+        .where(UploadJob.id == job_id, _job_owner_filter(request, current_user))
+    )
+    row = result.first()
+    
+    if not row:
+        raise HTTPException(status_code=404, detail="Job not found")
+    
+    job, document = row
+    return job_to_dict(job, document)
+
+
+@router.get("/batches/{batch_id}")
+async def get_upload_batch(
+    batch_id: str,
+    request: Request,
+    db: AsyncSession = Depends(get_db),
+    current_user: Optional[User] = Depends(get_current_user_optional)
+):
+    """Get progress of a bulk upload"""
+    result = await db.execute(
+        select(UploadJob, Document)
+        .outerjoin(Document, Document.id == UploadJob.document_id)
+        .where(UploadJob.batch_id == batch_id, _job_owner_filter(request, current_user))
+        .order_by(UploadJob.id)
+    )
+    rows = result.all()
+    
+    if not rows:
+        raise HTTPException(status_code=404, detail="Batch not found")
+    
+    jobs = [job_to_dict(job, document) for job, document in rows]
+    counts = {status: 0 for status in ("pending", "processing", "completed", "failed")}
+    for job in jobs:
+        counts[job["status"]] += 1
+    
+    completed = [job for job in jobs if job["status"] == "completed"]
+    
+    return {
+        "batch_id": batch_id,
+        "total": len(jobs),
+        "done": counts["pending"] == 0 and counts["processing"] == 0,
+        **counts,
+        "summary": {
+            "new": sum(1 for job in completed if not job["is_duplicate"]),
+            "duplicates": sum(1 for job in completed if job["is_duplicate"]),
+            "errors": counts["failed"]
+        },
+        "jobs": jobs
+    }
+
+
 @router.get("/guest/info")
 async def get_guest_info(
     request: Request,
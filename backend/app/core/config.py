@@ -21,8 +21,52 @@ class Settings(BaseSettings):
     # Upload Configuration
     UPLOAD_DIR: str = "./uploads"
     MAX_UPLOAD_SIZE: int = 52428800  # 50MB
+    UPLOAD_CHUNK_SIZE: int = 1048576  # 1MB read/write chunks when streaming uploads to disk
     ALLOWED_EXTENSIONS: str = ".pdf"
-    
+
+    # PDF Extraction Executor
+    EXTRACTION_EXECUTOR_MODE: str = "process"  # "process" or "thread"
+    EXTRACTION_MAX_WORKERS: int = 0  # 0 = one worker per CPU core
+    EXTRACTION_MAX_PENDING: int = 32  # Jobs allowed in flight before callers wait
+    EXTRACTION_TIMEOUT_SECONDS: float = 60.0
+    EXTRACTION_CACHE_DIR: str = "./cache/extraction"  # Raw page text / word boxes, keyed by content hash
+    EXTRACTION_CACHE_MAX_BYTES: int = 536870912  # 512MB, least recently used pages evicted; 0 = disabled
+
+    # Box extraction per form type: "regex" (flattened text) or "layout" (word coordinates)
+    FORM_103_EXTRACTION_MODE: str = "regex"
+    FORM_104_EXTRACTION_MODE: str = "regex"
+
+    # Pages extracted per form type after page 1 was classified (0 = every page; unknown forms: page 1 only)
+    FORM_103_MAX_PAGES: int = 0
+    FORM_104_MAX_PAGES: int = 0
+
+    # Upload Ingestion Queue
+    INGESTION_WORKERS: int = 2  # Worker tasks per API process, 0 = enqueue only
+    INGESTION_POLL_INTERVAL: float = 2.0  # Seconds between polls when the queue is empty
+    INGESTION_MAX_ATTEMPTS: int = 3
+    INGESTION_STALE_AFTER_SECONDS: int = 600  # PROCESSING jobs older than this are re-queued
+    BULK_UPLOAD_CONCURRENCY: int = 4  # Files of one bulk upload handled at the same time
+
+    # Exports
+    EXPORT_CHUNK_SIZE: int = 65536  # Bytes per chunk when streaming a finished export
+    EXPORT_FETCH_BATCH_SIZE: int = 500  # Aggregate rows fetched per batch by bulk exports
+
+    # Dashboard / documents overview counters
+    DOCUMENT_STATS_CACHE_TTL_SECONDS: float = 30.0  # Upper bound on staleness across processes
+    DOCUMENT_STATS_CACHE_SIZE: int = 1024  # 0 = disabled
+    PLATFORM_COUNTERS_RECONCILE_SECONDS: int = 3600  # Admin counters recounted (drift corrected) this often
+
+    # PDF report cache (rendered reports + branding logos)
+    PDF_CACHE_DIR: str = "./cache/pdf"
+    PDF_CACHE_TTL_SECONDS: int = 86400  # 24 hours
+    PDF_CACHE_MAX_BYTES: int = 104857600  # 100MB of rendered reports on disk
+    LOGO_CACHE_TTL_SECONDS: int = 3600  # Logo URLs are fetched again after 1 hour
+    LOGO_CACHE_MAX_BYTES: int = 20971520  # 20MB of logos on disk
+    LOGO_CACHE_MEMORY_BYTES: int = 5242880  # 5MB of logos in memory
+    LOGO_CACHE_MAX_URLS: int = 1024  # Logo URLs remembered in memory (LRU)
+    LOGO_FETCH_TIMEOUT_SECONDS: float = 5.0
+    LOGO_MAX_SIZE: int = 2097152  # 2MB, larger logos are ignored
+
     # CORS Configuration
     CORS_ORIGINS: List[str] = ["https://tax.capbraco.com", "https://api.capbraco.com"]
     
@@ -35,6 +79,11 @@ class Settings(BaseSettings):
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 60 * 24  # 24 hours
     SESSION_COOKIE_NAME: str = "tax_app_session"
+    USER_CACHE_TTL_SECONDS: float = 60.0  # Authenticated users cached per process for this long
+    USER_CACHE_SIZE: int = 1024  # 0 = disabled
+    BCRYPT_ROUNDS: int = 12  # Cost factor; existing hashes are upgraded on the next login
+    PASSWORD_HASH_WORKERS: int = 2  # bcrypt jobs running at the same time
+    PASSWORD_HASH_MAX_PENDING: int = 32  # Running + queued jobs before new logins wait
     
     # ✅ Google OAuth Settings
     GOOGLE_CLIENT_ID: str = ""
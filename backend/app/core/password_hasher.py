@@ -0,0 +1,133 @@
+"""
+Password Hasher
+Runs bcrypt on a dedicated bounded thread pool so logins never hold the event loop
+✅ bcrypt releases the GIL: hashing runs in parallel with request handling
+✅ Concurrency cap (pool size) + bounded number of queued jobs (backpressure)
+✅ Queue metrics (in flight, waiting, average duration)
+✅ needs_rehash(): stored hashes are upgraded when BCRYPT_ROUNDS changes
+"""
+
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional
+
+import bcrypt
+
+from app.core.config import settings
+
+
+def hash_password_sync(password: str, rounds: int) -> str:
+    """bcrypt hash with the given cost factor (blocking)"""
+    return bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt(rounds=rounds)).decode('utf-8')
+
+
+def verify_password_sync(plain_password: str, hashed_password: str) -> bool:
+    """bcrypt check (blocking); False for empty or malformed hashes (e.g. Google-only accounts)"""
+    if not hashed_password:
+        return False
+    try:
+        return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
+    except ValueError:
+        return False
+
+
+def hash_rounds(hashed_password: str) -> Optional[int]:
+    """Cost factor of a bcrypt hash ("$2b$12$..." -> 12), None if not a bcrypt hash"""
+    parts = (hashed_password or "").split('$')
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+class PasswordHasher:
+    """Async bcrypt hashing and verification on a bounded executor"""
+
+    def __init__(self, rounds: int = 12, max_workers: int = 2, max_pending: int = 32):
+        """
+        rounds: bcrypt cost factor for new hashes
+        max_workers: bcrypt jobs running at the same time
+        max_pending: Jobs allowed in flight (running + queued) before new callers wait
+        """
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._completed = 0
+        self._total_seconds = 0.0
+        self._rehashed = 0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="bcrypt")
+        return self._executor
+
+    async def _run(self, func, *args):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        start = time.perf_counter()
+        try:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._get_executor(), func, *args)
+        finally:
+            self._in_flight -= 1
+            self._completed += 1
+            self._total_seconds += time.perf_counter() - start
+            self._semaphore.release()
+
+    async def hash(self, password: str) -> str:
+        """Hash a password with the configured cost factor"""
+        return await self._run(hash_password_sync, password, self.rounds)
+
+    async def verify(self, plain_password: str, hashed_password: str) -> bool:
+        """Check a password against its stored hash"""
+        if not hashed_password:
+            return False  # Nothing to check, skip the pool
+        return await self._run(verify_password_sync, plain_password, hashed_password)
+
+    def needs_rehash(self, hashed_password: str) -> bool:
+        """True when the hash was made with a different cost factor than the configured one"""
+        rounds = hash_rounds(hashed_password)
+        return rounds is not None and rounds != self.rounds
+
+    def record_rehash(self):
+        self._rehashed += 1
+
+    def stats(self) -> dict:
+        """Current load of the hashing pool"""
+        return {
+            "rounds": self.rounds,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "completed": self._completed,
+            "avg_ms": round(self._total_seconds / self._completed * 1000, 1) if self._completed else 0.0,
+            "rehashed": self._rehashed
+        }
+
+    def shutdown(self):
+        """Stop the pool (called on application shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+
+
+# Singleton instance
+password_hasher = PasswordHasher(
+    rounds=settings.BCRYPT_ROUNDS,
+    max_workers=settings.PASSWORD_HASH_WORKERS,
+    max_pending=settings.PASSWORD_HASH_MAX_PENDING
+)
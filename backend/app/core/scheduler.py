@@ -6,8 +6,10 @@ import asyncio
 from datetime import datetime
 import logging
 
+from app.core.config import settings
 from app.core.database import AsyncSessionLocal
 from app.services.document_cleanup_service import document_cleanup_service
+from app.services.platform_counter_service import platform_counter_service
 
 logger = logging.getLogger(__name__)
 
@@ -43,7 +45,22 @@ async def run_daily_cleanup():
             await asyncio.sleep(3600)  # Wait 1 hour before retry
 
 
+async def run_counter_reconciliation():
+    """Recount the platform counters periodically and correct any drift"""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                # Every API process runs this loop: only one recounts at a time
+                await platform_counter_service.reconcile(db, wait=False)
+                await db.commit()
+        except Exception as e:
+            logger.error(f"❌ Counter reconciliation error: {str(e)}")
+        
+        await asyncio.sleep(settings.PLATFORM_COUNTERS_RECONCILE_SECONDS)
+
+
 async def start_scheduler():
     """Start background scheduler"""
     logger.info("🚀 Starting background scheduler...")
-    asyncio.create_task(run_daily_cleanup())
\ No newline at end of file
+    asyncio.create_task(run_daily_cleanup())
+    asyncio.create_task(run_counter_reconciliation())
\ No newline at end of file
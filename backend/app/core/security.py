@@ -1,10 +1,11 @@
 """
 Security utilities for authentication and password hashing
+✅ Authenticated users cached per token subject (short TTL) - no user query on repeat requests
+✅ bcrypt runs on the password_hasher pool; hashes are upgraded on login when BCRYPT_ROUNDS changes
 """
 
 from datetime import datetime, timedelta
 from typing import Optional
-import bcrypt
 from jose import JWTError, jwt
 from fastapi import HTTPException, status, Depends, Cookie, Request
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
@@ -14,25 +15,31 @@ import secrets
 
 from app.core.config import settings
 from app.core.database import get_db
+from app.core.password_hasher import password_hasher, hash_password_sync, verify_password_sync
+from app.core.ttl_cache import TTLCache
 from app.models.base import User
 
 # HTTP Bearer for optional token auth
 security = HTTPBearer(auto_error=False)
 
+# Detached User objects keyed by token subject (username)
+user_cache = TTLCache(maxsize=settings.USER_CACHE_SIZE, ttl=settings.USER_CACHE_TTL_SECONDS)
+
+
+def invalidate_cached_user(username: Optional[str]):
+    """Drop a user from the principal cache (call after updating, deactivating or deleting it)"""
+    if username:
+        user_cache.pop(username)
+
 
 def verify_password(plain_password: str, hashed_password: str) -> bool:
-    """Verify a password against its hash"""
-    return bcrypt.checkpw(
-        plain_password.encode('utf-8'), 
-        hashed_password.encode('utf-8')
-    )
+    """Verify a password against its hash (blocking - use password_hasher.verify in async code)"""
+    return verify_password_sync(plain_password, hashed_password)
 
 
 def get_password_hash(password: str) -> str:
-    """Hash a password using bcrypt"""
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
+    """Hash a password using bcrypt (blocking - use password_hasher.hash in async code)"""
+    return hash_password_sync(password, settings.BCRYPT_ROUNDS)
 
 
 def create_access_token(data: dict, expires_delta: Optional[timedelta] = None):
@@ -83,13 +90,35 @@ async def get_user_by_email(db: AsyncSession, email: str) -> Optional[User]:
     return result.scalar_one_or_none()
 
 
+async def get_user_for_request(db: AsyncSession, username: str) -> Optional[User]:
+    """
+    User for an authenticated request, served from user_cache when possible
+    The cached object stays detached; each request gets its own copy attached to its session
+    (merge without load: no query), so changes made by the endpoint are saved normally
+    """
+    cached = user_cache.get(username)
+    if cached is None:
+        cached = await get_user_by_username(db, username)
+        if cached is None:
+            return None
+        db.expunge(cached)
+        user_cache.set(username, cached)
+    return await db.merge(cached, load=False)
+
+
 async def authenticate_user(db: AsyncSession, username: str, password: str) -> Optional[User]:
-    """Authenticate a user"""
+    """
+    Authenticate a user
+    If the stored hash uses another cost factor it is replaced (caller commits)
+    """
     user = await get_user_by_username(db, username)
     if not user:
         return None
-    if not verify_password(password, user.hashed_password):
+    if not await password_hasher.verify(password, user.hashed_password):
         return None
+    if password_hasher.needs_rehash(user.hashed_password):
+        user.hashed_password = await password_hasher.hash(password)
+        password_hasher.record_rehash()
     return user
 
 
@@ -124,7 +153,7 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    user = await get_user_by_username(db, username)
+    user = await get_user_for_request(db, username)
     if user is None:
         raise credentials_exception
     
@@ -162,7 +191,7 @@ async def get_current_user_optional(
     except JWTError:
         return None  # Invalid token, treat as guest
     
-    user = await get_user_by_username(db, username)
+    user = await get_user_for_request(db, username)
     
     if user and not user.is_active:
         return None  # Inactive user, treat as guest
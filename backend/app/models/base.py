@@ -3,8 +3,8 @@ Enhanced Database Models - FULLY FIXED
 All relationships corrected - ready to use
 """
 
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, JSON, Enum, Boolean, BigInteger
-from sqlalchemy.orm import relationship
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, ForeignKey, JSON, Enum, Boolean, BigInteger, Index
+from sqlalchemy.orm import relationship, deferred
 from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.sql import func
 from app.core.database import Base
@@ -42,12 +42,14 @@ class Document(Base):
     form_type = Column(Enum(FormTypeEnum), default=FormTypeEnum.UNKNOWN, index=True)
     
     # Extracted text
-    extracted_text = Column(Text, nullable=True)
+    # ✅ Deferred: select(Document) never reads it; load it with options(undefer(Document.extracted_text))
+    #    (raiseload: a forgotten undefer fails loudly instead of issuing a hidden query)
+    extracted_text = deferred(Column(Text, nullable=True), raiseload=True)
     total_pages = Column(Integer, nullable=True)
     total_characters = Column(Integer, nullable=True)
     
-    # Structured data (JSON)
-    parsed_data = Column(JSON, nullable=True)
+    # Structured data (whole parser output, JSONB - deferred like extracted_text)
+    parsed_data = deferred(Column(JSONB, nullable=True), raiseload=True)
     
     # Form header data (ORIGINAL FIELDS - keep these names!)
     codigo_verificador = Column(String(100), nullable=True, index=True)
@@ -75,11 +77,48 @@ class Document(Base):
     user = relationship("User", back_populates="documents")
     session_id = Column(String, nullable=True, index=True)
     
+    # ✅ SHA-256 of the uploaded bytes (identical re-uploads skip extraction)
+    content_hash = Column(String(64), nullable=True, index=True)
+    
     # Relationships to forms
     form_103_items = relationship("Form103LineItem", back_populates="document", cascade="all, delete-orphan")
     form_104_data = relationship("Form104Data", back_populates="document", cascade="all, delete-orphan", uselist=False)
     form_103_totals = relationship("Form103Totals", back_populates="document", cascade="all, delete-orphan", uselist=False)
     
+    # One copy of a file per owner
+    __table_args__ = (
+        Index(
+            "uq_documents_user_content_hash", "user_id", "content_hash", unique=True,
+            postgresql_where=user_id.isnot(None) & content_hash.isnot(None)
+        ),
+        Index(
+            "uq_documents_session_content_hash", "session_id", "content_hash", unique=True,
+            postgresql_where=user_id.is_(None) & session_id.isnot(None) & content_hash.isnot(None)
+        ),
+        # Keyset pagination of a user's documents, newest first
+        Index("idx_documents_user_uploaded_at", "user_id", uploaded_at.desc(), id.desc()),
+        # Clientes / yearly aggregates access path: user -> client -> year -> month -> form
+        Index(
+            "idx_documents_user_client_period",
+            "user_id", "razon_social", "periodo_anio", "periodo_mes_numero", "form_type",
+            postgresql_include=["processing_status", "periodo_mes"]
+        ),
+        # One document per owner / client / period / form (also serves the duplicate check)
+        Index(
+            "uq_documents_user_period_form",
+            "user_id", "razon_social", "periodo_fiscal_completo", "form_type", unique=True,
+            postgresql_where=user_id.isnot(None) & razon_social.isnot(None) & periodo_fiscal_completo.isnot(None)
+        ),
+        Index(
+            "uq_documents_session_period_form",
+            "session_id", "razon_social", "periodo_fiscal_completo", "form_type", unique=True,
+            postgresql_where=(
+                user_id.is_(None) & session_id.isnot(None)
+                & razon_social.isnot(None) & periodo_fiscal_completo.isnot(None)
+            )
+        ),
+    )
+    
     def __repr__(self):
         return f"<Document {self.form_type}: {self.original_filename}>"
 
@@ -387,4 +426,114 @@ class UsageAnalytics(Base):
     created_at = Column(DateTime(timezone=True), server_default=func.now(), index=True)
 
     # Relationship
-    user = relationship("User", back_populates="analytics")
\ No newline at end of file
+    user = relationship("User", back_populates="analytics")
+
+# ===================================
+# Upload Job Model (ingestion queue)
+# ===================================
+
+class UploadJob(Base):
+    """
+    Queued upload waiting to be processed by an ingestion worker
+    ✅ Claimed with SELECT ... FOR UPDATE SKIP LOCKED so several replicas can share the work
+    """
+    __tablename__ = "upload_jobs"
+
+    id = Column(Integer, primary_key=True, index=True)
+    batch_id = Column(String(64), nullable=False, index=True)
+
+    # Document being processed (points to the existing one when the upload was a duplicate)
+    document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True, index=True)
+    original_filename = Column(String(255), nullable=False)
+
+    # Owner
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=True, index=True)
+    session_id = Column(String(255), nullable=True, index=True)
+
+    # Queue state
+    status = Column(Enum(ProcessingStatusEnum), default=ProcessingStatusEnum.PENDING, nullable=False, index=True)
+    attempts = Column(Integer, nullable=False, default=0)
+    worker_id = Column(String(100), nullable=True)
+    is_duplicate = Column(Boolean, default=False)
+    error = Column(Text, nullable=True)
+
+    # Timestamps
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    started_at = Column(DateTime(timezone=True), nullable=True)
+    finished_at = Column(DateTime(timezone=True), nullable=True)
+
+    def __repr__(self):
+        return f"<UploadJob {self.id}: {self.status} - {self.original_filename}>"
+
+
+class ClientYearAggregate(Base):
+    """
+    Per-client monthly totals used by the yearly summary, validation and exports
+    ✅ One row per user / client / year / month, refreshed whenever a document of that month changes
+    ✅ A yearly summary is a single indexed lookup of at most 12 rows
+    """
+    __tablename__ = "client_year_aggregates"
+
+    id = Column(Integer, primary_key=True, index=True)
+
+    # Key
+    user_id = Column(Integer, ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    razon_social = Column(String(500), nullable=False)
+    periodo_anio = Column(String(10), nullable=False)
+    periodo_mes_numero = Column(Integer, nullable=False)
+    periodo_mes = Column(String(20), nullable=True)
+
+    # Form 103 (documents present, latest one, whether totals exist)
+    form_103_document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    form_103_has_totals = Column(Boolean, nullable=False, default=False)
+    form_103_subtotal_operaciones_pais = Column(Float, nullable=False, default=0.0)
+    form_103_total_retencion = Column(Float, nullable=False, default=0.0)
+    form_103_total_impuesto_pagar = Column(Float, nullable=False, default=0.0)
+    form_103_total_pagado = Column(Float, nullable=False, default=0.0)
+
+    # Form 104
+    form_104_document_id = Column(Integer, ForeignKey("documents.id", ondelete="SET NULL"), nullable=True)
+    form_104_has_totals = Column(Boolean, nullable=False, default=False)
+    form_104_total_ventas_neto = Column(Float, nullable=False, default=0.0)
+    form_104_total_impuesto_generado = Column(Float, nullable=False, default=0.0)
+    form_104_total_adquisiciones = Column(Float, nullable=False, default=0.0)
+    form_104_credito_tributario_aplicable = Column(Float, nullable=False, default=0.0)
+    form_104_total_impuesto_retenido = Column(Float, nullable=False, default=0.0)
+    form_104_total_pagado = Column(Float, nullable=False, default=0.0)
+    form_104_impuesto_causado = Column(Float, nullable=False, default=0.0)
+    form_104_retenciones_efectuadas = Column(Float, nullable=False, default=0.0)
+    form_104_subtotal_a_pagar = Column(Float, nullable=False, default=0.0)
+    form_104_total_impuesto_pagar_retencion = Column(Float, nullable=False, default=0.0)
+    form_104_total_consolidado_iva = Column(Float, nullable=False, default=0.0)
+    form_104_total_impuesto_a_pagar = Column(Float, nullable=False, default=0.0)
+    form_104_interes_mora = Column(Float, nullable=False, default=0.0)
+    form_104_multa = Column(Float, nullable=False, default=0.0)
+
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    __table_args__ = (
+        Index(
+            "uq_client_year_aggregates_key",
+            "user_id", "razon_social", "periodo_anio", "periodo_mes_numero",
+            unique=True
+        ),
+    )
+
+    def __repr__(self):
+        return f"<ClientYearAggregate {self.razon_social} {self.periodo_anio}-{self.periodo_mes_numero}>"
+
+
+class PlatformCounter(Base):
+    """
+    Platform-wide counters behind the admin dashboard (total_users, total_documents, ...)
+    ✅ Adjusted in the same transaction as the change they count - read in O(1)
+    ✅ Periodically reconciled against the real tables to correct any drift
+    """
+    __tablename__ = "platform_counters"
+
+    name = Column(String(50), primary_key=True)
+    value = Column(BigInteger, nullable=False, default=0)
+    updated_at = Column(DateTime(timezone=True), server_default=func.now(), onupdate=func.now())
+
+    def __repr__(self):
+        return f"<PlatformCounter {self.name}={self.value}>"
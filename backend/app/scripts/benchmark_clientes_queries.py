@@ -0,0 +1,86 @@
+"""
+Query count benchmark for the client yearly summary and exports
+Calls the endpoints for every client/year of a user and counts SQL statements per request
+Run: python backend/app/scripts/benchmark_clientes_queries.py user@example.com [--year 2025]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from sqlalchemy import event, select, func
+
+from app.core.database import AsyncSessionLocal, engine
+from app.models.base import Document, User
+from app.api.clientes import (
+    PDFBranding, get_yearly_summary, export_yearly_excel, export_yearly_pdf
+)
+
+
+class QueryCounter:
+    """Counts statements sent through the engine"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+async def run(email: str, year: str = None):
+    counter = QueryCounter()
+    event.listen(engine.sync_engine, "before_cursor_execute", counter)
+
+    branding = PDFBranding(company_name="Benchmark", footer_text="Benchmark")
+    endpoints = [
+        ("yearly-summary", lambda db, user, client, y: get_yearly_summary(client, y, None, db, user)),
+        ("export-excel", lambda db, user, client, y: export_yearly_excel(client, y, None, db, user)),
+        ("export-pdf", lambda db, user, client, y: export_yearly_pdf(client, y, branding, None, db, user)),
+    ]
+
+    async with AsyncSessionLocal() as db:
+        user = (await db.execute(select(User).where(User.email == email))).scalar_one_or_none()
+        if user is None:
+            print(f"❌ User not found: {email}")
+            return
+
+        query = (
+            select(Document.razon_social, Document.periodo_anio, func.count(Document.id))
+            .where(Document.user_id == user.id, Document.razon_social.isnot(None), Document.periodo_anio.isnot(None))
+            .group_by(Document.razon_social, Document.periodo_anio)
+            .order_by(func.count(Document.id).desc())
+        )
+        if year:
+            query = query.where(Document.periodo_anio == year)
+        client_years = (await db.execute(query)).all()
+
+        print(f"{'client':<40}{'year':>6}{'docs':>6}  " + "".join(f"{name:>22}" for name, _ in endpoints))
+        for razon_social, periodo_anio, document_count in client_years:
+            cells = []
+            for _, call in endpoints:
+                counter.count = 0
+                start = time.perf_counter()
+                await call(db, user, razon_social, periodo_anio)
+                elapsed_ms = (time.perf_counter() - start) * 1000
+                cells.append(f"{counter.count} q / {elapsed_ms:.0f} ms")
+            print(f"{razon_social[:38]:<40}{periodo_anio:>6}{document_count:>6}  " + "".join(f"{cell:>22}" for cell in cells))
+
+    event.remove(engine.sync_engine, "before_cursor_execute", counter)
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Count SQL queries per clientes request")
+    parser.add_argument("email", help="User whose clients are benchmarked")
+    parser.add_argument("--year", help="Only this fiscal year")
+    args = parser.parse_args()
+    asyncio.run(run(args.email, args.year))
+
+
+if __name__ == "__main__":
+    main()
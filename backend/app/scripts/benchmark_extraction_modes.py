@@ -0,0 +1,156 @@
+"""
+Benchmark regex vs layout extraction on real PDFs
+Times both paths (extraction + parsing) and reports per-field agreement
+Run: python backend/app/scripts/benchmark_extraction_modes.py [pdf_dir] [--limit N] [--show N]
+"""
+
+import argparse
+import glob
+import os
+import sys
+import time
+from collections import Counter
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+# Measure PDF decoding, not the on-disk extraction cache
+os.environ["EXTRACTION_CACHE_MAX_BYTES"] = "0"
+
+from app.core.config import settings
+from app.models.base import FormTypeEnum
+from app.services.enhanced_form_processing_service import enhanced_form_processing_service
+from app.services.extraction_executor import extract_text_with_metadata
+from app.services.form_103_parser import form_103_parser
+from app.services.form_104_parser import form_104_parser_complete
+
+
+PARSERS = {
+    FormTypeEnum.FORM_103: form_103_parser,
+    FormTypeEnum.FORM_104: form_104_parser_complete,
+}
+
+# Bookkeeping keys that differ by design
+IGNORED_KEYS = {"extraction_mode", "pattern_version"}
+
+
+def comparable(parsed: dict) -> dict:
+    """
+    Form 103 line items keyed by base code (the two paths may find a different set of rows);
+    concept labels are left out, the layout path keeps the full label text
+    """
+    if "line_items" not in parsed:
+        return parsed
+    data = dict(parsed)
+    data["line_items"] = {
+        item["codigo_base"]: {
+            "base_imponible": item["base_imponible"],
+            "codigo_retencion": item["codigo_retencion"],
+            "valor_retenido": item["valor_retenido"]
+        }
+        for item in parsed["line_items"]
+    }
+    return data
+
+
+def flatten(data, prefix: str = "") -> dict:
+    """{"a": {"b": 1}} -> {"a.b": 1} (lists indexed by position)"""
+    if isinstance(data, dict):
+        items = data.items()
+    elif isinstance(data, list):
+        items = enumerate(data)
+    else:
+        return {prefix: data}
+
+    flat = {}
+    for key, value in items:
+        if key in IGNORED_KEYS:
+            continue
+        flat.update(flatten(value, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+
+def run_mode(path: str, layout_forms: tuple) -> tuple:
+    """Extract + classify + parse one PDF; returns (form_type, parsed, extract_s, parse_s)"""
+    start = time.perf_counter()
+    text, _, _, layout = extract_text_with_metadata(path, layout_forms)
+    extracted = time.perf_counter()
+
+    form_type = enhanced_form_processing_service._classify_form_type(text)
+    parser = PARSERS.get(form_type)
+    parsed = parser.parse(text, layout.get(form_type.value)) if parser else None
+    return form_type, parsed, extracted - start, time.perf_counter() - extracted
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare regex and layout extraction")
+    parser.add_argument("pdf_dir", nargs="?", default=settings.UPLOAD_DIR)
+    parser.add_argument("--limit", type=int, default=0, help="Only the first N PDFs")
+    parser.add_argument("--show", type=int, default=10, help="Disagreements to print")
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(args.pdf_dir, "*.pdf")))
+    if args.limit:
+        paths = paths[:args.limit]
+    if not paths:
+        print(f"❌ No PDFs found in {args.pdf_dir}")
+        return
+
+    all_forms = tuple(form_type.value for form_type in PARSERS)
+    timings = {mode: {"extract": 0.0, "parse": 0.0} for mode in ("regex", "layout")}
+    fields = Counter()
+    agreed = Counter()
+    disagreements = []
+    docs = Counter()
+
+    print(f"📊 Benchmarking {len(paths)} PDFs from {args.pdf_dir}")
+
+    for path in paths:
+        form_type, regex_data, regex_extract, regex_parse = run_mode(path, ())
+        _, layout_data, layout_extract, layout_parse = run_mode(path, all_forms)
+
+        if regex_data is None:
+            continue
+
+        docs[form_type.value] += 1
+        timings["regex"]["extract"] += regex_extract
+        timings["regex"]["parse"] += regex_parse
+        timings["layout"]["extract"] += layout_extract
+        timings["layout"]["parse"] += layout_parse
+
+        regex_flat = flatten(comparable(regex_data))
+        layout_flat = flatten(comparable(layout_data))
+        for key in regex_flat.keys() | layout_flat.keys():
+            fields[form_type.value] += 1
+            if regex_flat.get(key) == layout_flat.get(key):
+                agreed[form_type.value] += 1
+            else:
+                disagreements.append(
+                    (os.path.basename(path), key, regex_flat.get(key), layout_flat.get(key))
+                )
+
+    total = sum(docs.values())
+    if not total:
+        print("❌ No Form 103 / 104 documents found")
+        return
+
+    print(f"\n📄 Documents: {dict(docs)}")
+    print("\n⏱️  Average per document (ms)")
+    print(f"{'mode':<8}{'extract':>10}{'parse':>10}{'total':>10}")
+    for mode, timing in timings.items():
+        extract_ms = timing["extract"] / total * 1000
+        parse_ms = timing["parse"] / total * 1000
+        print(f"{mode:<8}{extract_ms:>10.2f}{parse_ms:>10.3f}{extract_ms + parse_ms:>10.2f}")
+
+    print("\n🎯 Field agreement")
+    for form, count in fields.items():
+        print(f"  {form}: {agreed[form]}/{count} ({agreed[form] / count:.2%})")
+
+    if disagreements:
+        print(f"\n⚠️  {len(disagreements)} disagreements (regex -> layout), first {args.show}:")
+        for filename, key, regex_value, layout_value in disagreements[:args.show]:
+            print(f"  {filename} {key}: {regex_value!r} -> {layout_value!r}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,137 @@
+"""
+Benchmark of the Form 103 / Form 104 persistence path
+Writes synthetic parser output for one document and for a reprocessing batch,
+counting SQL statements and time per phase. Everything runs in one transaction that is rolled back.
+Run: python backend/app/scripts/benchmark_form_persistence.py [--documents 1000] [--line-items 20]
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from sqlalchemy import event
+
+from app.core.database import AsyncSessionLocal, engine
+from app.models.base import Document, FormTypeEnum, ProcessingStatusEnum
+from app.services.enhanced_form_processing_service import enhanced_form_processing_service, FORM_103_TOTALS_FIELDS
+
+
+class QueryCounter:
+    """Counts statements sent through the engine"""
+
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, conn, cursor, statement, parameters, context, executemany):
+        self.count += 1
+
+
+def form_103_output(line_items: int) -> dict:
+    return {
+        "totals": {field: 100.0 + index for index, field in enumerate(FORM_103_TOTALS_FIELDS)},
+        "line_items": [
+            {
+                "concepto": f"Concepto {index}",
+                "codigo_base": str(300 + index),
+                "base_imponible": 1000.0 + index,
+                "codigo_retencion": str(350 + index),
+                "valor_retenido": 10.0 + index,
+            }
+            for index in range(line_items)
+        ],
+    }
+
+
+def form_104_output() -> dict:
+    return {
+        "ventas": {"ventas_tarifa_diferente_cero_bruto": 5000.0, "ventas_tarifa_0_neto": 1200.0},
+        "compras": {"adquisiciones_tarifa_diferente_cero_bruto": 3000.0},
+        "totals": {"total_impuesto_generado": 600.0, "total_pagado": 240.0},
+        "retenciones_iva": [{"porcentaje": 30, "valor": 12.5}],
+    }
+
+
+async def new_documents(db, count: int, form_type: FormTypeEnum) -> list:
+    documents = [
+        Document(
+            filename=f"benchmark_{form_type.value}_{index}.pdf",
+            original_filename=f"benchmark_{form_type.value}_{index}.pdf",
+            file_path=f"/tmp/benchmark_{form_type.value}_{index}.pdf",
+            file_size=0,
+            form_type=form_type,
+            processing_status=ProcessingStatusEnum.PROCESSING,
+            session_id="benchmark-form-persistence"
+        )
+        for index in range(count)
+    ]
+    db.add_all(documents)
+    await db.flush()
+    return documents
+
+
+async def timed(counter: QueryCounter, label: str, documents: list, write):
+    """Run write(document) for every document; prints statements and time"""
+    counter.count = 0
+    start = time.perf_counter()
+    for document in documents:
+        await write(document)
+    elapsed_ms = (time.perf_counter() - start) * 1000
+    per_doc = elapsed_ms / len(documents)
+    print(f"{label:<36}{len(documents):>7}{counter.count:>12}{elapsed_ms:>12.0f}{per_doc:>12.2f}")
+
+
+async def run(document_count: int, line_items: int):
+    counter = QueryCounter()
+    service = enhanced_form_processing_service
+    output_103 = form_103_output(line_items)
+    output_104 = form_104_output()
+
+    async def write_103(document):
+        await service._process_form_103(document, "", db, None, output_103)
+
+    async def write_104(document):
+        await service._process_form_104(document, "", db, None, output_104)
+
+    async with AsyncSessionLocal() as db:
+        try:
+            docs_103 = await new_documents(db, document_count, FormTypeEnum.FORM_103)
+            docs_104 = await new_documents(db, document_count, FormTypeEnum.FORM_104)
+
+            event.listen(engine.sync_engine, "before_cursor_execute", counter)
+            print(f"Form 103 documents carry {line_items} line items\n")
+            print(f"{'phase':<36}{'docs':>7}{'statements':>12}{'total ms':>12}{'ms / doc':>12}")
+            for label, docs, write in (
+                ("Form 103 - one document (new)", docs_103[:1], write_103),
+                ("Form 103 - one document (again)", docs_103[:1], write_103),
+                ("Form 104 - one document (new)", docs_104[:1], write_104),
+                ("Form 104 - one document (again)", docs_104[:1], write_104),
+                ("Form 103 - batch (new)", docs_103[1:], write_103),
+                ("Form 103 - batch (reprocess)", docs_103, write_103),
+                ("Form 104 - batch (new)", docs_104[1:], write_104),
+                ("Form 104 - batch (reprocess)", docs_104, write_104),
+            ):
+                if docs:
+                    await timed(counter, label, docs, write)
+                    await db.flush()
+        finally:
+            event.remove(engine.sync_engine, "before_cursor_execute", counter)
+            await db.rollback()
+
+    await engine.dispose()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time Form 103 / Form 104 persistence (rolled back)")
+    parser.add_argument("--documents", type=int, default=1000, help="Documents per form in the batch phase")
+    parser.add_argument("--line-items", type=int, default=20, help="Line items per Form 103")
+    args = parser.parse_args()
+    asyncio.run(run(args.documents, args.line_items))
+
+
+if __name__ == "__main__":
+    main()
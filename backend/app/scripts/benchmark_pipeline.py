@@ -0,0 +1,370 @@
+"""
+Benchmark of the ingestion pipeline on synthetic SRI forms
+Generates Form 103 / Form 104 PDFs with reportlab (fixed seed) and times every stage:
+text extraction, classification, parsing and the full process_uploaded_document
+Reports per-stage latency, throughput and peak RSS; compares against a stored baseline
+The pipeline stage runs against DATABASE_URL inside a transaction that is rolled back (skip with --no-db)
+Run: python backend/app/scripts/benchmark_pipeline.py [--documents 20] [--save-baseline] [--tolerance 0.25]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import statistics
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+# Measure PDF decoding, not the on-disk extraction cache (also in spawned extraction workers)
+os.environ["EXTRACTION_CACHE_MAX_BYTES"] = "0"
+
+import pdfplumber
+from reportlab.lib.pagesizes import A4
+from reportlab.pdfgen import canvas
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.database import engine
+from app.services.enhanced_form_processing_service import enhanced_form_processing_service
+from app.services.extraction_executor import extract_text_with_metadata, extraction_executor
+from app.services.form_103_parser import form_103_parser
+from app.services.form_104_parser import form_104_parser_complete
+from app.services.pdf_service import pdf_service
+
+DEFAULT_BASELINE = "./cache/benchmark_baseline.json"
+
+MONTHS = [
+    'ENERO', 'FEBRERO', 'MARZO', 'ABRIL', 'MAYO', 'JUNIO',
+    'JULIO', 'AGOSTO', 'SEPTIEMBRE', 'OCTUBRE', 'NOVIEMBRE', 'DICIEMBRE'
+]
+
+# (concept, base code, withheld code) rows of the Form 103 detail
+FORM_103_ROWS = [
+    ("En relación de dependencia que supera o no la base desgravada", "302", "352"),
+    ("Honorarios profesionales", "303", "353"),
+    ("Servicios profesionales prestados por sociedades residentes", "3030", "3530"),
+    ("Predomina el intelecto", "304", "354"),
+    ("Predomina la mano de obra", "307", "357"),
+    ("Utilización o aprovechamiento de la imagen o renombre", "308", "358"),
+    ("Publicidad y comunicación", "309", "359"),
+    ("Transporte privado de pasajeros o servicio público o privado de carga", "310", "360"),
+    ("A través de liquidaciones de compra (nivel cultural o rusticidad)", "311", "361"),
+    ("Transferencia de bienes muebles de naturaleza corporal", "312", "362"),
+    ("Seguros y reaseguros (primas y cesiones)", "322", "372"),
+    ("COMPRAS AL PRODUCTOR: de bienes de origen agrícola, avícola, pecuario", "3120", "3620"),
+    ("COMPRAS AL COMERCIALIZADOR: de bienes de origen agrícola, avícola, pecuario", "3121", "3621"),
+    ("Actividades de construcción de obra material inmueble, urbanización", "3430", "3450"),
+    ("Pagos aplicables el 1% (Energía Eléctrica y régimen RIMPE - Emprendedores)", "343", "393"),
+    ("Pagos aplicables el 2% (incluye Pago local tarjeta de crédito /débito)", "344", "394"),
+    ("Por regalías, derechos de autor, marcas, patentes y similares", "314", "364"),
+    ("Comisiones pagadas a sociedades, nacionales o extranjeras residentes", "3140", "3640"),
+    ("Mercantil", "319", "369"),
+    ("Bienes inmuebles", "320", "370"),
+    ("Rendimientos financieros", "323", "373"),
+    ("Rendimientos financieros entre instituciones del sistema financiero", "324", "374"),
+    ("Ganancia en la enajenación de derechos representativos de capital", "333", "383"),
+    ("Contraprestación en la enajenación de derechos representativos de capital", "334", "384"),
+    ("Loterías, rifas, apuestas, pronósticos deportivos y similares", "335", "385"),
+    ("A comercializadoras", "336", "386"),
+    ("A distribuidores", "337", "387"),
+    ("Retención a cargo del propio sujeto pasivo por productos forestales", "3370", "3870"),
+    ("Otras autorretenciones (inciso 1 y 2 Art.92.1 RLRTI)", "350", "400"),
+    ("Aplicables el 2,75%", "3440", "3940"),
+    ("Aplicables a otros porcentajes ( Por Donaciones en dinero )", "346", "396"),
+]
+
+# (concept, codes) rows of the Form 104
+FORM_104_ROWS = [
+    ("Ventas locales (excluye activos fijos) gravadas tarifa diferente de cero", ("401", "411", "421")),
+    ("Ventas locales (excluye activos fijos) gravadas tarifa 0% sin derecho a crédito", ("403", "413")),
+    ("Ventas locales (excluye activos fijos) gravadas tarifa 0% con derecho a crédito", ("405", "415")),
+    ("TOTAL VENTAS Y OTRAS OPERACIONES", ("409", "419", "429")),
+    ("Transferencias de bienes y prestación de servicios no objeto o exentos de IVA", ("431", "441")),
+    ("Total impuesto generado (trasládese campo 429)", ("482",)),
+    ("Impuesto a liquidar del mes anterior", ("483",)),
+    ("Impuesto a liquidar en este mes", ("484",)),
+    ("TOTAL IMPUESTO A LIQUIDAR EN ESTE MES 483+484", ("499",)),
+    ("Adquisiciones y pagos (excluye activos fijos) gravados tarifa diferente de cero", ("500", "510", "520")),
+    ("Otras adquisiciones y pagos gravados tarifa diferente de cero", ("502", "512", "522")),
+    ("Adquisiciones y pagos (incluye activos fijos) gravados tarifa 0%", ("507", "517")),
+    ("Adquisiciones realizadas a contribuyentes RISE, NEGOCIOS POPULARES", ("508", "518")),
+    ("TOTAL ADQUISICIONES Y PAGOS", ("509", "519", "529")),
+    ("Adquisiciones exentas del pago de IVA", ("532", "542")),
+    ("Crédito tributario aplicable en este período", ("564",)),
+    ("Impuesto causado (si la diferencia de los campos 499-564 es mayor que cero)", ("601",)),
+    ("Crédito tributario aplicable en este período (diferencia menor que cero)", ("602",)),
+    ("(-) Retenciones en la fuente de IVA que le han sido efectuadas en este período", ("609",)),
+    ("SUBTOTAL A PAGAR", ("620",)),
+    ("TOTAL IMPUESTO A PAGAR POR PERCEPCIÓN Y RETENCIONES EFECTUADAS EN VENTAS", ("699",)),
+    ("Retención del 10%", ("721",)),
+    ("Retención del 20%", ("723",)),
+    ("Retención del 30%", ("725",)),
+    ("Retención del 50%", ("727",)),
+    ("Retención del 70%", ("729",)),
+    ("Retención del 100%", ("731",)),
+    ("TOTAL IMPUESTO RETENIDO 721+723+725+727+729+731", ("799",)),
+    ("TOTAL IMPUESTO A PAGAR POR RETENCIÓN (799-800-802)", ("801",)),
+    ("TOTAL CONSOLIDADO DE IMPUESTO AL VALOR AGREGADO (699+801)", ("859",)),
+]
+
+LINES_PER_PAGE = 18
+
+
+def amount(rng: random.Random) -> str:
+    return f"{rng.uniform(0, 25000):.2f}" if rng.random() < 0.4 else "0.00"
+
+
+def client_name(index: int) -> str:
+    """Letters only, like real company names (0 -> A, 26 -> BA)"""
+    letters = ""
+    while True:
+        index, rest = divmod(index, 26)
+        letters = chr(65 + rest) + letters
+        if not index:
+            return f"BENCHMARK CLIENTE {letters} S.A."
+
+
+def form_lines(form: str, index: int, rng: random.Random) -> tuple:
+    """(header lines, body lines) of one synthetic declaration"""
+    month = MONTHS[index % 12]
+    year = 2020 + index // 12
+    title = (
+        "Obligación Tributaria: 1031 - DECLARACIÓN DE RETENCIONES EN LA FUENTE"
+        if form == "form_103" else "Obligación Tributaria: 2011 DECLARACION DE IVA"
+    )
+    header = [
+        title,
+        f"Identificación: {1790000000001 + index * 1000} Razón Social: {client_name(index)}",
+        f"Período Fiscal: {month} {year} Tipo Declaración: ORIGINAL",
+        "Formulario Sustituye:",
+    ]
+    if form == "form_103":
+        body = [f"{concept} {base} {amount(rng)} {withheld} {amount(rng)}" for concept, base, withheld in FORM_103_ROWS]
+        total = amount(rng)
+        body += [
+            f"SUBTOTAL OPERACIONES EFECTUADAS EN EL PAÍS 349 {amount(rng)} 399 {total}",
+            f"TOTAL DE RETENCIÓN DE IMPUESTO A LA RENTA 399 + 498 499 {total}",
+            f"TOTAL IMPUESTO A PAGAR 902 {total}",
+            "Interés por mora 903 0.00",
+            "Multa 904 0.00",
+            f"TOTAL PAGADO 999 {total}",
+        ]
+    else:
+        body = [
+            f"{concept} " + " ".join(f"{code} {amount(rng)}" for code in codes)
+            for concept, codes in FORM_104_ROWS
+        ]
+        total = amount(rng)
+        body += [
+            f"TOTAL IMPUESTO A PAGAR (859-898) 902 {total}",
+            "Interés por mora 903 0.00",
+            "Multa 904 0.00",
+            f"TOTAL PAGADO 999 {total}",
+        ]
+    return header, body
+
+
+def write_pdf(path: str, header: list, body: list, serial: int):
+    """Multi-page form: header on page 1, SRI footer on every page"""
+    pdf = canvas.Canvas(path, pagesize=A4)
+    width, height = A4
+    pages = [body[start:start + LINES_PER_PAGE] for start in range(0, len(body), LINES_PER_PAGE)]
+    for number, lines in enumerate(pages, 1):
+        pdf.setFont("Helvetica", 7)
+        y = height - 40
+        for line in (header if number == 1 else []) + lines:
+            pdf.drawString(30, y, line)
+            y -= 12
+        pdf.drawString(30, 60, "La información reposa en la base de datos del SRI, conforme la declaración realizada por el contribuyente")
+        pdf.drawString(30, 48, "NÚMERO SERIAL FECHA RECAUDACIÓN PÁGINA")
+        pdf.drawString(30, 36, f"{serial} 11-11-2025 {number}")
+        pdf.showPage()
+    pdf.save()
+
+
+def generate_pdfs(directory: str, documents: int, seed: int) -> list:
+    """Returns [(form, path)] - the same files for the same documents / seed"""
+    rng = random.Random(seed)
+    files = []
+    for form in ("form_103", "form_104"):
+        for index in range(documents):
+            path = os.path.join(directory, f"{form}_{index}.pdf")
+            header, body = form_lines(form, index, rng)
+            write_pdf(path, header, body, 870000000000 + index)
+            files.append((form, path))
+    return files
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process and its finished children (Linux: KB)"""
+    own = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    children = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    return max(own, children) / 1024
+
+
+class StageTimer:
+    """Latency samples per stage (accumulated over repeated rounds)"""
+
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.rss = {}
+
+    async def run(self, name: str, items: list, call):
+        """Time call(item) for every item (awaited when it returns a coroutine)"""
+        for item in items:
+            start = time.perf_counter()
+            result = call(item)
+            if asyncio.iscoroutine(result):
+                await result
+            self.samples[name].append((time.perf_counter() - start) * 1000)
+        self.rss[name] = peak_rss_mb()
+
+    @property
+    def stages(self) -> dict:
+        stages = {}
+        for name, samples in self.samples.items():
+            ordered = sorted(samples)
+            stages[name] = {
+                "count": len(samples),
+                "mean_ms": statistics.mean(samples),
+                "p50_ms": statistics.median(samples),
+                "p95_ms": ordered[max(0, int(len(ordered) * 0.95) - 1)],
+                "max_ms": ordered[-1],
+                "docs_per_sec": len(samples) / (sum(samples) / 1000),
+                "peak_rss_mb": self.rss[name],
+            }
+        return stages
+
+    def report(self):
+        print(f"{'stage':<30}{'docs':>6}{'mean ms':>10}{'p50 ms':>10}{'p95 ms':>10}{'max ms':>10}{'docs/s':>10}{'RSS MB':>9}")
+        for name, stage in self.stages.items():
+            print(
+                f"{name:<30}{stage['count']:>6}{stage['mean_ms']:>10.2f}{stage['p50_ms']:>10.2f}"
+                f"{stage['p95_ms']:>10.2f}{stage['max_ms']:>10.2f}{stage['docs_per_sec']:>10.1f}{stage['peak_rss_mb']:>9.0f}"
+            )
+
+
+async def run_pipeline(timer: StageTimer, files: list):
+    """Full process_uploaded_document per file; every commit lands in a savepoint that is rolled back"""
+    async with engine.connect() as connection:
+        transaction = await connection.begin()
+        db = AsyncSession(bind=connection, join_transaction_mode="create_savepoint", expire_on_commit=False)
+        try:
+            async def process(item):
+                _, path = item
+                await enhanced_form_processing_service.process_uploaded_document(
+                    file_path=path,
+                    original_filename=os.path.basename(path),
+                    file_size=os.path.getsize(path),
+                    db=db,
+                    session_id="benchmark-pipeline"
+                )
+            await timer.run("process_uploaded_document", files, process)
+        finally:
+            await db.close()
+            await transaction.rollback()
+
+
+def compare(stages: dict, baseline: dict, tolerance: float, min_delta_ms: float) -> list:
+    """Stages whose mean latency grew more than tolerance (and min_delta_ms) over the baseline"""
+    regressions = []
+    print(f"\n{'stage':<30}{'baseline ms':>13}{'now ms':>10}{'change':>9}")
+    for name, stage in stages.items():
+        before = baseline.get("stages", {}).get(name)
+        if not before:
+            continue
+        change = stage["mean_ms"] / before["mean_ms"] - 1
+        # Sub-millisecond stages are noisy: a regression must also be slower in absolute terms
+        slower = change > tolerance and stage["mean_ms"] - before["mean_ms"] > min_delta_ms
+        print(f"{name:<30}{before['mean_ms']:>13.2f}{stage['mean_ms']:>10.2f}{change:>+8.0%} {'❌' if slower else '✅'}")
+        if slower:
+            regressions.append(name)
+    return regressions
+
+
+async def run(args) -> int:
+    timer = StageTimer()
+    with tempfile.TemporaryDirectory(prefix="benchmark_pipeline_") as directory:
+        files = generate_pdfs(directory, args.documents, args.seed)
+        extracted = {path: extract_text_with_metadata(path) for _, path in files}
+        texts = {path: text for path, (text, _, _, _) in extracted.items()}
+        form_103 = [texts[path] for form, path in files if form == "form_103"]
+        form_104 = [texts[path] for form, path in files if form == "form_104"]
+        pages = {form: extracted[path][1] for form, path in files}
+        print(f"📄 {len(files)} synthetic PDFs ({args.documents} per form, seed {args.seed}, pages per form: {pages})\n")
+
+        for _ in range(args.repeat):
+            await timer.run("pdf_service.extract_all_text", [path for _, path in files], pdf_service.extract_all_text)
+            await timer.run("extract_text_with_metadata", [path for _, path in files], extract_text_with_metadata)
+            await timer.run("_classify_form_type", list(texts.values()), enhanced_form_processing_service._classify_form_type)
+            await timer.run("Form103Parser.parse", form_103, form_103_parser.parse)
+            await timer.run("Form104ParserComplete.parse", form_104, form_104_parser_complete.parse)
+
+        if args.no_db:
+            print("⏭️ process_uploaded_document skipped (--no-db)\n")
+        else:
+            try:
+                await run_pipeline(timer, files)
+            except OSError as e:
+                print(f"⏭️ process_uploaded_document skipped: database unreachable ({e})\n")
+            finally:
+                extraction_executor.shutdown()
+                await engine.dispose()
+
+    timer.report()
+
+    result = {
+        "meta": {
+            "documents": args.documents,
+            "seed": args.seed,
+            "python": platform.python_version(),
+            "pdfplumber": pdfplumber.__version__,
+            "machine": platform.machine(),
+        },
+        "stages": timer.stages,
+    }
+    if args.save_baseline:
+        os.makedirs(os.path.dirname(os.path.abspath(args.baseline)), exist_ok=True)
+        with open(args.baseline, "w") as f:
+            json.dump(result, f, indent=2)
+        print(f"\n💾 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"\nℹ️ No baseline at {args.baseline} (create one with --save-baseline)")
+        return 0
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    if baseline.get("meta", {}).get("documents") != args.documents:
+        print("\n⚠️ Baseline was recorded with a different --documents")
+    regressions = compare(timer.stages, baseline, args.tolerance, args.min_delta_ms)
+    if regressions:
+        print(f"\n❌ Slower than baseline by more than {args.tolerance:.0%}: {', '.join(regressions)}")
+        return 1
+    print("\n✅ No regression against the baseline")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the ingestion pipeline on synthetic Form 103 / 104 PDFs")
+    parser.add_argument("--documents", type=int, default=20, help="Synthetic PDFs per form type")
+    parser.add_argument("--repeat", type=int, default=3, help="Rounds of the extraction / parsing stages")
+    parser.add_argument("--seed", type=int, default=103104, help="Seed of the synthetic amounts")
+    parser.add_argument("--no-db", action="store_true", help="Skip the process_uploaded_document stage")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON to compare against / save to")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="Allowed mean latency growth per stage")
+    parser.add_argument("--min-delta-ms", type=float, default=0.1, help="Ignore slowdowns smaller than this")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""
+Query plan regression check for the hot document / client queries
+Runs EXPLAIN on each query with sequential scans disabled: a plan that still contains a
+Seq Scan means no index can serve that access path (missing or unusable index)
+Exits with status 1 when any query falls back to a sequential scan
+Run: python backend/app/scripts/check_query_plans.py [--verbose]
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
+
+from sqlalchemy import select, func, text, tuple_
+from sqlalchemy.dialects import postgresql
+
+from app.core.database import AsyncSessionLocal, engine
+from app.models.base import (
+    ClientYearAggregate, Document, Form103LineItem, FormTypeEnum, ProcessingStatusEnum
+)
+
+
+def hot_queries(sample) -> dict:
+    """
+    The access paths the indexes are meant for (same filters as the application queries)
+    sample: one real document row (user, client, period) or None for placeholder values
+    """
+    user_id = sample.user_id if sample else 1
+    razon_social = sample.razon_social if sample else "CLIENTE"
+    periodo_anio = sample.periodo_anio if sample else "2025"
+    periodo_mes_numero = sample.periodo_mes_numero if sample else 1
+    periodo = sample.periodo_fiscal_completo if sample else "ENERO 2025"
+
+    return {
+        # clientes.list_clientes
+        "clientes list": select(
+            Document.razon_social, func.count(Document.id), func.min(Document.periodo_anio)
+        ).where(
+            Document.razon_social.isnot(None), Document.user_id == user_id
+        ).group_by(Document.razon_social),
+        # clientes.get_client_documents
+        "client documents": select(Document.id).where(
+            Document.razon_social == razon_social, Document.user_id == user_id
+        ).order_by(Document.periodo_anio.desc()),
+        # client_year_service.refresh_month
+        "aggregate month refresh": select(Document.id, Document.form_type, Document.periodo_mes).where(
+            Document.user_id == user_id,
+            Document.razon_social == razon_social,
+            Document.periodo_anio == periodo_anio,
+            Document.periodo_mes_numero == periodo_mes_numero,
+            Document.processing_status == ProcessingStatusEnum.COMPLETED,
+            Document.form_type.in_([FormTypeEnum.FORM_103, FormTypeEnum.FORM_104])
+        ),
+        # client_year_service.summarize_year / load_year
+        "yearly summary": select(ClientYearAggregate.periodo_mes_numero).where(
+            ClientYearAggregate.user_id == user_id,
+            ClientYearAggregate.razon_social == razon_social,
+            ClientYearAggregate.periodo_anio == periodo_anio
+        ),
+        # enhanced_form_processing_service.check_duplicate_document (registered user)
+        "duplicate check (user)": select(Document.id).where(
+            Document.razon_social == razon_social,
+            Document.periodo_fiscal_completo == periodo,
+            Document.form_type == FormTypeEnum.FORM_103,
+            Document.user_id == user_id
+        ).limit(1),
+        # enhanced_form_processing_service.check_duplicate_document (guest)
+        "duplicate check (guest)": select(Document.id).where(
+            Document.razon_social == razon_social,
+            Document.periodo_fiscal_completo == periodo,
+            Document.form_type == FormTypeEnum.FORM_103,
+            Document.user_id.is_(None),
+            Document.session_id == "guest-session"
+        ).limit(1),
+        # enhanced_form_processing_service.find_document_by_hash
+        "content hash lookup": select(Document.id).where(
+            Document.content_hash == "0" * 64, Document.user_id == user_id
+        ).limit(1),
+        # documents.list_documents (keyset page)
+        "document list page": select(Document.id).where(
+            Document.user_id == user_id,
+            tuple_(Document.uploaded_at, Document.id) < tuple_(func.now(), 2 ** 31 - 1)
+        ).order_by(Document.uploaded_at.desc(), Document.id.desc()).limit(20),
+        # form_103.get_form_103_complete
+        "form 103 line items": select(Form103LineItem.id).where(
+            Form103LineItem.document_id == 1
+        ).order_by(Form103LineItem.order_index),
+    }
+
+
+def seq_scans(plan: dict) -> list:
+    """Relations read with a Seq Scan anywhere in the plan tree"""
+    found = [plan.get("Relation Name")] if plan.get("Node Type") == "Seq Scan" else []
+    for child in plan.get("Plans", []):
+        found.extend(seq_scans(child))
+    return found
+
+
+def index_names(plan: dict) -> list:
+    found = [plan["Index Name"]] if "Index Name" in plan else []
+    for child in plan.get("Plans", []):
+        found.extend(index_names(child))
+    return found
+
+
+async def run(verbose: bool = False) -> int:
+    failures = 0
+    async with AsyncSessionLocal() as db:
+        sample = (await db.execute(
+            select(
+                Document.user_id, Document.razon_social, Document.periodo_anio,
+                Document.periodo_mes_numero, Document.periodo_fiscal_completo
+            ).where(
+                Document.user_id.isnot(None),
+                Document.razon_social.isnot(None),
+                Document.periodo_fiscal_completo.isnot(None)
+            ).limit(1)
+        )).first()
+
+        # Only for this transaction: any remaining Seq Scan has no index alternative
+        await db.execute(text("SET LOCAL enable_seqscan = off"))
+
+        for name, query in hot_queries(sample).items():
+            sql = str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+            raw = (await db.execute(text(f"EXPLAIN (FORMAT JSON) {sql}"))).scalar()
+            plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+            scans = seq_scans(plan)
+            if scans:
+                failures += 1
+                print(f"❌ {name}: Seq Scan on {', '.join(sorted(set(scans)))}")
+            else:
+                print(f"✅ {name}: {', '.join(dict.fromkeys(index_names(plan))) or plan['Node Type']}")
+            if verbose:
+                print(json.dumps(plan, indent=2))
+
+        await db.rollback()
+
+    await engine.dispose()
+    print(f"\n{'❌' if failures else '✅'} {failures} of {len(hot_queries(None))} queries fall back to a sequential scan")
+    return 1 if failures else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Fail when a hot query plan contains a Seq Scan")
+    parser.add_argument("--verbose", action="store_true", help="Print every plan")
+    args = parser.parse_args()
+    sys.exit(asyncio.run(run(args.verbose)))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,199 +1,286 @@
 """
-Reprocess Existing Documents - ASYNC Compatible
-Extracts razon_social, periodo data from existing PDFs
-Run after migration: python backend/app/scripts/reprocess_documents.py
+Reprocess Existing Documents - parallel and resumable
+Re-runs the upload pipeline's header extraction and form parsers over stored documents
+✅ Documents streamed in id-ordered (keyset) batches, parsed in a process pool
+✅ Results written back with bulk updates / upserts, one transaction per batch
+✅ Progress checkpointed after every batch: an interrupted run resumes where it stopped
+✅ Text comes from the database or the extraction cache, so PDFs are rarely decoded again
+Run: python backend/app/scripts/reprocess_documents.py [--since 2025-01-01] [--form-type form_103] [--user 7]
 """
 
+import argparse
 import asyncio
-import sys
+import json
+import multiprocessing
 import os
-import re
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
 
 # Add parent directory to path
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '../..')))
 
-from sqlalchemy import select
-from app.core.database import AsyncSessionLocal
-from app.models.base import Document, Form103Totals, FormTypeEnum
+from sqlalchemy import select, update
+from sqlalchemy.exc import IntegrityError
+
+from app.core.database import AsyncSessionLocal, engine
+from app.models.base import Document, FormTypeEnum, ProcessingStatusEnum
+from app.services.client_year_service import client_year_service
+from app.services.enhanced_form_processing_service import enhanced_form_processing_service, LAYOUT_FORMS
+from app.services.extraction_executor import extract_text_with_metadata
+from app.services.form_103_parser import form_103_parser
+from app.services.form_104_parser import form_104_parser_complete
+from app.services.platform_counter_service import platform_counter_service
 
+# Document columns set by the header extraction of the upload pipeline
+HEADER_FIELDS = (
+    "identificacion_ruc",
+    "razon_social",
+    "periodo_fiscal_completo",
+    "periodo_mes",
+    "periodo_anio",
+    "periodo_mes_numero",
+    "fecha_recaudacion",
+)
 
-# Spanish month mapping
-MONTH_MAP = {
-    'ENERO': 1, 'FEBRERO': 2, 'MARZO': 3, 'ABRIL': 4,
-    'MAYO': 5, 'JUNIO': 6, 'JULIO': 7, 'AGOSTO': 8,
-    'SEPTIEMBRE': 9, 'OCTUBRE': 10, 'NOVIEMBRE': 11, 'DICIEMBRE': 12
-}
+DEFAULT_CHECKPOINT = "./cache/reprocess_checkpoint.json"
 
 
-def extract_periodo_info(text: str) -> tuple:
+def parse_document(job: dict) -> dict:
     """
-    Extract periodo fiscal from text
-    Returns: (periodo_fiscal_completo, periodo_mes_numero)
+    Header and form data of one document (runs in a worker process)
+    Uses the stored text; the PDF is read (through the extraction cache) only when the text is
+    missing or the form is extracted by layout
     """
-    if not text:
-        return None, None
-    
-    # Look for patterns like "Período Fiscal: ABRIL 2025" or "PERIODO FISCAL ABRIL 2025"
-    patterns = [
-        r'Período\s+Fiscal[:\s]*([A-Z]+)\s+(\d{4})',
-        r'PERIODO\s+FISCAL[:\s]*([A-Z]+)\s+(\d{4})',
-        r'Periodo[:\s]*([A-Z]+)\s+(\d{4})',
-    ]
-    
-    for pattern in patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            month_str = match.group(1).strip().upper()
-            year = match.group(2)
-            
-            # Get month number
-            month_num = MONTH_MAP.get(month_str)
-            
-            if month_num:
-                periodo_completo = f"{month_str} {year}"
-                return periodo_completo, month_num
-    
-    return None, None
-
-
-def extract_form_103_totals(text: str) -> dict:
-    """Extract Form 103 totals from text"""
-    totals = {
-        'subtotal_operaciones_pais': 0.0,
-        'total_retencion': 0.0,
-        'total_impuesto_pagar': 0.0,
-        'total_pagado': 0.0
-    }
-    
-    if not text:
-        return totals
-    
-    patterns = {
-        'subtotal_operaciones_pais': r'Subtotal\s+Operaciones\s+País\s*[\$:]?\s*([\d,]+\.?\d*)',
-        'total_retencion': r'Total\s+Retención\s*[\$:]?\s*([\d,]+\.?\d*)',
-        'total_impuesto_pagar': r'Total\s+Impuesto\s+a\s+Pagar\s*[\$:]?\s*([\d,]+\.?\d*)',
-        'total_pagado': r'Total\s+Pagado\s*[\$:]?\s*([\d,]+\.?\d*)'
-    }
-    
-    for key, pattern in patterns.items():
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            value_str = match.group(1).replace(',', '')
-            try:
-                totals[key] = float(value_str)
-            except ValueError:
-                totals[key] = 0.0
-    
-    return totals
-
-
-async def reprocess_documents():
-    """Reprocess all existing documents to extract new fields"""
-    
-    print("🔄 Starting document reprocessing...\n")
-    
-    async with AsyncSessionLocal() as db:
+    result = {"id": job["id"]}
+    try:
+        form = job["form_type"]
+        text = job["text"]
+        layout = None
+        if form in LAYOUT_FORMS or not text:
+            layout_forms = (form,) if form in LAYOUT_FORMS else ()
+            text, total_pages, total_chars, layouts = extract_text_with_metadata(
+                job["file_path"], layout_forms, content_hash=job["content_hash"]
+            )
+            layout = layouts.get(form)
+            if not job["text"]:
+                result["extracted"] = {"extracted_text": text, "total_pages": total_pages, "total_characters": total_chars}
+
+        header = Document()
+        enhanced_form_processing_service._extract_header_info(header, text)
+        result["header"] = {
+            field: getattr(header, field) for field in HEADER_FIELDS if getattr(header, field) is not None
+        }
+
+        if form == FormTypeEnum.FORM_103.value:
+            result["parsed_data"] = form_103_parser.parse(text, layout)
+        elif form == FormTypeEnum.FORM_104.value:
+            result["parsed_data"] = form_104_parser_complete.parse(text, layout)
+    except Exception as e:
+        result["error"] = str(e)
+    return result
+
+
+class Checkpoint:
+    """Last committed document id of a run, stored as JSON (atomic rewrite)"""
+
+    def __init__(self, path: str, filters: dict):
+        self.path = path
+        self.filters = filters
+        self.last_id = 0
+        self.processed = 0
+
+    def load(self) -> bool:
+        """Resume state of a previous run with the same filters; False if there is none"""
         try:
-            # Get all documents
-            result = await db.execute(select(Document))
-            documents = result.scalars().all()
-            
-            print(f"📄 Found {len(documents)} documents to process\n")
-            
-            processed_count = 0
-            updated_count = 0
-            error_count = 0
-            
-            for doc in documents:
+            with open(self.path) as f:
+                state = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return False
+        if state.get("filters") != self.filters:
+            print(f"⚠️ Checkpoint {self.path} belongs to other filters, starting over")
+            return False
+        self.last_id = state["last_id"]
+        self.processed = state["processed"]
+        return True
+
+    def save(self):
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+        with os.fdopen(fd, "w") as f:
+            json.dump({
+                "filters": self.filters,
+                "last_id": self.last_id,
+                "processed": self.processed,
+                "saved_at": datetime.utcnow().isoformat()
+            }, f)
+        os.replace(tmp_path, self.path)
+
+    def clear(self):
+        if os.path.exists(self.path):
+            os.remove(self.path)
+
+
+def batch_query(args, last_id: int):
+    """Next keyset batch of completed documents matching the filters"""
+    query = select(
+        Document.id,
+        Document.user_id,
+        Document.form_type,
+        Document.file_path,
+        Document.content_hash,
+        Document.extracted_text,
+        Document.razon_social,
+        Document.periodo_anio,
+        Document.periodo_mes_numero
+    ).where(
+        Document.id > last_id,
+        Document.processing_status == ProcessingStatusEnum.COMPLETED
+    )
+    if args.since:
+        query = query.where(Document.uploaded_at >= args.since)
+    if args.form_type:
+        query = query.where(Document.form_type == FormTypeEnum(args.form_type))
+    if args.user is not None:
+        query = query.where(Document.user_id == args.user)
+    return query.order_by(Document.id).limit(args.batch_size)
+
+
+def aggregate_keys(user_id, razon_social, periodo_anio, periodo_mes_numero):
+    if user_id and razon_social and periodo_anio and periodo_mes_numero:
+        return [(user_id, razon_social, periodo_anio, periodo_mes_numero)]
+    return []
+
+
+async def write_batch(db, rows: list, results: list) -> int:
+    """
+    Bulk write one batch and refresh the client months it touches (caller commits)
+    Returns: number of documents written
+    """
+    by_id = {row.id: row for row in rows}
+    updates = []
+    form_data = []
+    keys = []
+    for result in results:
+        row = by_id[result["id"]]
+        values = {"id": row.id, **result["header"], **result.get("extracted", {})}
+        if "parsed_data" in result:
+            values["parsed_data"] = result["parsed_data"]
+            form_data.append((row.id, row.user_id, row.form_type, result["parsed_data"]))
+        if len(values) > 1:
+            updates.append(values)
+
+        # Old and new period: both months must be recomputed
+        keys += aggregate_keys(row.user_id, row.razon_social, row.periodo_anio, row.periodo_mes_numero)
+        keys += aggregate_keys(
+            row.user_id,
+            values.get("razon_social", row.razon_social),
+            values.get("periodo_anio", row.periodo_anio),
+            values.get("periodo_mes_numero", row.periodo_mes_numero)
+        )
+
+    if updates:
+        await db.execute(update(Document), updates)
+    await enhanced_form_processing_service.write_parsed_batch(db, form_data)
+    await db.flush()
+    await client_year_service.refresh_keys(db, keys)
+    return len(results)
+
+
+async def reprocess_documents(args):
+    """Reprocess the documents matching the filters"""
+    filters = {"since": args.since.isoformat() if args.since else None, "form_type": args.form_type, "user": args.user}
+    checkpoint = Checkpoint(args.checkpoint, filters)
+    if not args.restart and checkpoint.load():
+        print(f"⏯️ Resuming after document {checkpoint.last_id} ({checkpoint.processed} already processed)")
+
+    workers = args.workers or os.cpu_count() or 1
+    print(f"🔄 Reprocessing with {workers} workers, batches of {args.batch_size} (filters: {filters})\n")
+
+    pool = ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+    loop = asyncio.get_running_loop()
+    started = time.perf_counter()
+    processed = 0
+    errors = 0
+
+    try:
+        async with AsyncSessionLocal() as db:
+            while True:
+                rows = (await db.execute(batch_query(args, checkpoint.last_id))).all()
+                if not rows:
+                    break
+
+                results = await asyncio.gather(*(
+                    loop.run_in_executor(pool, parse_document, {
+                        "id": row.id,
+                        "form_type": row.form_type.value,
+                        "text": row.extracted_text,
+                        "file_path": row.file_path,
+                        "content_hash": row.content_hash
+                    })
+                    for row in rows
+                ))
+                for result in results:
+                    if "error" in result:
+                        print(f"   ❌ Document {result['id']}: {result['error']}")
+                good = [result for result in results if "error" not in result]
+                errors += len(results) - len(good)
+
                 try:
-                    print(f"📝 Processing: {doc.original_filename} (ID: {doc.id})")
-                    
-                    updated = False
-                    
-                    # Extract periodo fiscal info if extracted_text exists
-                    if doc.extracted_text:
-                        periodo_completo, mes_numero = extract_periodo_info(doc.extracted_text)
-                        
-                        if periodo_completo:
-                            doc.periodo_fiscal_completo = periodo_completo
-                            doc.periodo_mes_numero = mes_numero
-                            updated = True
-                            print(f"   ✓ Período: {periodo_completo} (Mes #{mes_numero})")
-                        
-                        # Extract Form 103 totals if it's a Form 103
-                        if doc.form_type == FormTypeEnum.FORM_103:
-                            totals_data = extract_form_103_totals(doc.extracted_text)
-                            
-                            # Check if Form103Totals already exists
-                            result = await db.execute(
-                                select(Form103Totals).where(Form103Totals.document_id == doc.id)
-                            )
-                            existing_totals = result.scalar_one_or_none()
-                            
-                            if existing_totals:
-                                # Update existing
-                                existing_totals.subtotal_operaciones_pais = totals_data['subtotal_operaciones_pais']
-                                existing_totals.total_retencion = totals_data['total_retencion']
-                                existing_totals.total_impuesto_pagar = totals_data['total_impuesto_pagar']
-                                existing_totals.total_pagado = totals_data['total_pagado']
-                                print(f"   ✓ Updated Form 103 totals (Total: ${totals_data['total_pagado']:.2f})")
-                            else:
-                                # Create new
-                                form_103_totals = Form103Totals(
-                                    document_id=doc.id,
-                                    subtotal_operaciones_pais=totals_data['subtotal_operaciones_pais'],
-                                    total_retencion=totals_data['total_retencion'],
-                                    total_impuesto_pagar=totals_data['total_impuesto_pagar'],
-                                    total_pagado=totals_data['total_pagado']
-                                )
-                                db.add(form_103_totals)
-                                print(f"   ✓ Created Form 103 totals (Total: ${totals_data['total_pagado']:.2f})")
-                            
-                            updated = True
-                    
-                    if updated:
-                        updated_count += 1
-                        print(f"   ✅ Successfully updated\n")
-                    else:
-                        print(f"   ⏭️  No updates needed\n")
-                    
-                    processed_count += 1
-                    
-                except Exception as e:
-                    print(f"   ❌ Error: {e}\n")
-                    error_count += 1
-                    continue
-            
-            # Commit all changes
+                    written = await write_batch(db, rows, good)
+                    await db.commit()
+                except IntegrityError:
+                    # A new period collides with another document of the owner: write one by one
+                    await db.rollback()
+                    written = 0
+                    for result in good:
+                        try:
+                            async with db.begin_nested():
+                                written += await write_batch(db, rows, [result])
+                        except IntegrityError:
+                            errors += 1
+                            print(f"   ❌ Document {result['id']}: same client / period / form as another document")
+                    await db.commit()
+
+                processed += written
+                checkpoint.last_id = rows[-1].id
+                checkpoint.processed += written
+                checkpoint.save()
+
+                elapsed = time.perf_counter() - started
+                print(f"📄 {processed} documents (up to id {checkpoint.last_id}) - {processed / elapsed:.1f} docs/sec")
+
+            # Client names may have changed: recount the admin dashboard counters
+            await platform_counter_service.reconcile(db)
             await db.commit()
-            
-            print(f"\n📊 Reprocessing Summary:")
-            print(f"   📝 Processed: {processed_count}")
-            print(f"   ✅ Updated: {updated_count}")
-            print(f"   ❌ Errors: {error_count}")
-            print(f"   📄 Total: {len(documents)}")
-            
-            # Show unique clients found
-            result = await db.execute(
-                select(Document.razon_social).where(Document.razon_social.isnot(None)).distinct()
-            )
-            unique_clients = result.scalars().all()
-            
-            print(f"\n👥 Found {len(unique_clients)} unique clients:")
-            for client in unique_clients:
-                if client:
-                    print(f"   - {client}")
-            
-            print("\n✨ Reprocessing completed!")
-            print("\n📋 Next steps:")
-            print("1. Check the Clientes section in your frontend")
-            print("2. Verify client organization is working")
-            print("3. Test yearly summaries")
-            
-        except Exception as e:
-            print(f"\n❌ Fatal error: {e}")
-            await db.rollback()
+    finally:
+        pool.shutdown(cancel_futures=True)
+        await engine.dispose()
+
+    elapsed = time.perf_counter() - started
+    checkpoint.clear()
+    print(f"\n📊 Reprocessing Summary:")
+    print(f"   ✅ Updated: {processed}")
+    print(f"   ❌ Errors: {errors}")
+    print(f"   ⏱️ {elapsed:.1f}s ({processed / elapsed if elapsed else 0:.1f} docs/sec)")
+    print("\n✨ Reprocessing completed!")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Re-run header extraction and form parsers over stored documents")
+    parser.add_argument("--since", type=datetime.fromisoformat, help="Only documents uploaded on or after this date (YYYY-MM-DD)")
+    parser.add_argument("--form-type", choices=[form_type.value for form_type in FormTypeEnum], help="Only this form type")
+    parser.add_argument("--user", type=int, help="Only documents of this user id")
+    parser.add_argument("--batch-size", type=int, default=200, help="Documents per batch / transaction")
+    parser.add_argument("--workers", type=int, default=0, help="Parser processes, 0 = one per CPU core")
+    parser.add_argument("--checkpoint", default=DEFAULT_CHECKPOINT, help="Progress file used to resume")
+    parser.add_argument("--restart", action="store_true", help="Ignore the checkpoint and start from the first document")
+    args = parser.parse_args()
+    asyncio.run(reprocess_documents(args))
 
 
 if __name__ == "__main__":
-    asyncio.run(reprocess_documents())
+    main()
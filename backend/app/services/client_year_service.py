@@ -0,0 +1,311 @@
+"""
+Client Year Service - data access for the per-client yearly summary, validation and exports
+✅ Reads the materialized client_year_aggregates table (one indexed lookup, at most 12 rows)
+✅ Rows are refreshed from the source documents whenever a document is processed,
+   reprocessed or deleted (refresh_keys)
+"""
+
+from dataclasses import dataclass
+from typing import AsyncIterator, Iterable, List, Optional, Tuple
+
+from sqlalchemy import select, delete, func
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.models.base import (
+    ClientYearAggregate, Document, Form103Totals, Form104Data, FormTypeEnum, ProcessingStatusEnum
+)
+
+
+@dataclass(frozen=True)
+class SummaryField:
+    """
+    One summed total of the yearly summary
+    name: form table column, summary JSON key (client_year_aggregates column = "<form>_<name>")
+    excel / pdf: column header in that export (None = not exported)
+    resumen: label in the Excel "RESUMEN ANUAL" block
+    """
+    name: str
+    excel: Optional[str] = None
+    pdf: Optional[str] = None
+    resumen: Optional[str] = None
+
+
+# ✅ Single spec for the summary JSON, the Excel export and the PDF export (order = column order)
+FORM_103_FIELDS = [
+    SummaryField('subtotal_operaciones_pais', excel='Subtotal Op. País', pdf='Subtotal Op.'),
+    SummaryField('total_retencion', excel='Total Retención', pdf='Retención'),
+    SummaryField('total_impuesto_pagar', excel='Total Impuesto', pdf='Impuesto'),
+    SummaryField('total_pagado', excel='Total Pagado', pdf='Total Pagado'),
+]
+
+FORM_104_FIELDS = [
+    # Basic fields
+    SummaryField('total_ventas_neto', excel='Ventas Neto', pdf='Ventas Neto', resumen='Total Ventas Neto'),
+    SummaryField('total_impuesto_generado', excel='Imp. Generado', pdf='Imp. Gen.', resumen='Total Impuesto Generado'),
+    SummaryField('total_adquisiciones', excel='Adquisiciones', pdf='Adquis.', resumen='Total Adquisiciones'),
+    SummaryField('credito_tributario_aplicable', excel='Créd. Trib.', pdf='Créd. Trib.', resumen='Total Crédito Tributario'),
+    SummaryField('total_impuesto_retenido', excel='Imp. Retenido', resumen='Total Impuesto Retenido'),
+    SummaryField('total_pagado', excel='Total Pagado', pdf='Total Pagado', resumen='TOTAL PAGADO'),
+    # Calculated fields
+    SummaryField('impuesto_causado'),
+    SummaryField('retenciones_efectuadas'),
+    SummaryField('subtotal_a_pagar'),
+    SummaryField('total_impuesto_pagar_retencion'),
+    SummaryField('total_consolidado_iva'),
+    SummaryField('total_impuesto_a_pagar'),
+    SummaryField('interes_mora'),
+    SummaryField('multa'),
+]
+
+FORM_103_SUMMARY_FIELDS = [field.name for field in FORM_103_FIELDS]
+FORM_104_SUMMARY_FIELDS = [field.name for field in FORM_104_FIELDS]
+
+FORM_FIELDS = {
+    'form_103': FORM_103_FIELDS,
+    'form_104': FORM_104_FIELDS,
+}
+
+AggregateKey = Tuple[int, str, str, int]
+
+
+def parse_excluded_months(exclude_months: Optional[str]) -> set:
+    """'1,2,12' -> {1, 2, 12}"""
+    return set(int(m.strip()) for m in exclude_months.split(',')) if exclude_months else set()
+
+
+def aggregate_key(document: Document) -> Optional[AggregateKey]:
+    """(user, client, year, month) row a document counts towards (None for guests / unknown period)"""
+    if not (document.user_id and document.razon_social and document.periodo_anio and document.periodo_mes_numero):
+        return None
+    return (document.user_id, document.razon_social, document.periodo_anio, document.periodo_mes_numero)
+
+
+def form_values(row, form: str, fields: List[str]) -> dict:
+    """{field: value} of one form from an aggregate (or summarize_year) row"""
+    return {field: getattr(row, f"{form}_{field}") or 0.0 for field in fields}
+
+
+def periodo_label(row) -> Optional[str]:
+    """'ENERO 2025' (None when the month name is unknown)"""
+    return f"{row.periodo_mes} {row.periodo_anio}" if row.periodo_mes else None
+
+
+class ClientYearService:
+    """Reads and maintains client_year_aggregates"""
+
+    async def load_year(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        razon_social: str,
+        year: str,
+        excluded: Optional[Iterable[int]] = None
+    ) -> List[ClientYearAggregate]:
+        """Monthly rows of one client/year ordered by month (excluded months left out)"""
+        query = (
+            select(ClientYearAggregate)
+            .where(
+                ClientYearAggregate.user_id == user_id,
+                ClientYearAggregate.razon_social == razon_social,
+                ClientYearAggregate.periodo_anio == year
+            )
+            .order_by(ClientYearAggregate.periodo_mes_numero.asc())
+        )
+        if excluded:
+            query = query.where(ClientYearAggregate.periodo_mes_numero.notin_(excluded))
+
+        return list((await db.execute(query)).scalars().all())
+
+    async def summarize_year(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        razon_social: str,
+        year: str,
+        excluded: Optional[Iterable[int]] = None
+    ) -> Tuple[list, object]:
+        """
+        Monthly rows and year totals in one GROUP BY ROLLUP query over the spec columns
+        Each form's totals only count the months where that form has totals
+
+        Returns: (monthly rows ordered by month, totals row)
+        Row attributes: periodo_mes_numero, periodo_mes, periodo_anio, month_count, updated_at,
+        has_form_10x, form_10x_has_totals and form_10x_<field> for every spec field
+        """
+        month = ClientYearAggregate.periodo_mes_numero
+        columns = [
+            month,
+            func.grouping(month).label("is_total"),
+            func.max(ClientYearAggregate.periodo_mes).label("periodo_mes"),
+            func.max(ClientYearAggregate.periodo_anio).label("periodo_anio"),
+            # Data version: changes whenever a month is refreshed or removed
+            func.count().label("month_count"),
+            func.max(ClientYearAggregate.updated_at).label("updated_at"),
+        ]
+        for form, fields in FORM_FIELDS.items():
+            has_totals = getattr(ClientYearAggregate, f"{form}_has_totals")
+            columns.append(func.coalesce(
+                func.bool_or(getattr(ClientYearAggregate, f"{form}_document_id").isnot(None)), False
+            ).label(f"has_{form}"))
+            columns.append(func.coalesce(func.bool_or(has_totals), False).label(f"{form}_has_totals"))
+            columns.extend(
+                func.coalesce(
+                    func.sum(getattr(ClientYearAggregate, f"{form}_{field.name}")).filter(has_totals), 0.0
+                ).label(f"{form}_{field.name}")
+                for field in fields
+            )
+
+        query = (
+            select(*columns)
+            .where(
+                ClientYearAggregate.user_id == user_id,
+                ClientYearAggregate.razon_social == razon_social,
+                ClientYearAggregate.periodo_anio == year
+            )
+            .group_by(func.rollup(month))
+            .order_by(month.asc().nulls_last())
+        )
+        if excluded:
+            query = query.where(month.notin_(excluded))
+
+        rows = (await db.execute(query)).all()
+        # ROLLUP always returns the grand total row, even for an empty year
+        totals = next(row for row in rows if row.is_total)
+        return [row for row in rows if not row.is_total], totals
+
+    async def stream_rows(
+        self,
+        db: AsyncSession,
+        user_id: int,
+        razon_sociales: Optional[List[str]] = None,
+        years: Optional[List[str]] = None,
+        batch_size: int = 500
+    ) -> AsyncIterator[list]:
+        """
+        Monthly rows of many clients/years ordered by client, year and month, in batches
+        Server-side cursor: only one batch is held in memory at a time
+        """
+        query = (
+            select(*ClientYearAggregate.__table__.columns)
+            .where(ClientYearAggregate.user_id == user_id)
+            .order_by(
+                ClientYearAggregate.razon_social,
+                ClientYearAggregate.periodo_anio,
+                ClientYearAggregate.periodo_mes_numero
+            )
+            .execution_options(yield_per=batch_size)
+        )
+        if razon_sociales:
+            query = query.where(ClientYearAggregate.razon_social.in_(razon_sociales))
+        if years:
+            query = query.where(ClientYearAggregate.periodo_anio.in_(years))
+
+        result = await db.stream(query)
+        async for batch in result.partitions(batch_size):
+            yield batch
+
+    async def refresh_month(self, db: AsyncSession, key: AggregateKey):
+        """
+        Recompute one row from the completed documents of that month
+        Serialized per key with a transaction-level advisory lock, so two workers storing
+        the 103 and the 104 of the same month cannot overwrite each other's totals
+        """
+        user_id, razon_social, year, month = key
+        await db.execute(select(func.pg_advisory_xact_lock(
+            func.hashtext(f"client_year_aggregates:{user_id}:{razon_social}:{year}:{month}")
+        )))
+
+        result = await db.execute(
+            select(Document.id, Document.form_type, Document.periodo_mes, Form103Totals, Form104Data)
+            .outerjoin(Form103Totals, Form103Totals.document_id == Document.id)
+            .outerjoin(Form104Data, Form104Data.document_id == Document.id)
+            .where(
+                Document.user_id == user_id,
+                Document.razon_social == razon_social,
+                Document.periodo_anio == year,
+                Document.periodo_mes_numero == month,
+                Document.processing_status == ProcessingStatusEnum.COMPLETED,
+                Document.form_type.in_([FormTypeEnum.FORM_103, FormTypeEnum.FORM_104])
+            )
+            .order_by(Document.id)
+            # Form rows are written with bulk upserts: never trust copies already in the session
+            .execution_options(populate_existing=True)
+        )
+        rows = result.all()
+
+        key_filter = (
+            ClientYearAggregate.user_id == user_id,
+            ClientYearAggregate.razon_social == razon_social,
+            ClientYearAggregate.periodo_anio == year,
+            ClientYearAggregate.periodo_mes_numero == month
+        )
+
+        if not rows:
+            await db.execute(delete(ClientYearAggregate).where(*key_filter))
+            return
+
+        values = {
+            "periodo_mes": next((row.periodo_mes for row in rows if row.periodo_mes), None),
+            "form_103_document_id": None,
+            "form_103_has_totals": False,
+            "form_104_document_id": None,
+            "form_104_has_totals": False,
+            **{f"form_103_{field}": 0.0 for field in FORM_103_SUMMARY_FIELDS},
+            **{f"form_104_{field}": 0.0 for field in FORM_104_SUMMARY_FIELDS},
+        }
+
+        for document_id, form_type, _, totals_103, data_104 in rows:
+            if form_type == FormTypeEnum.FORM_103:
+                form, data, fields = "form_103", totals_103, FORM_103_SUMMARY_FIELDS
+            else:
+                form, data, fields = "form_104", data_104, FORM_104_SUMMARY_FIELDS
+
+            values[f"{form}_document_id"] = document_id  # Latest document of the month
+            if data is None:
+                continue
+            values[f"{form}_has_totals"] = True
+            for field in fields:
+                values[f"{form}_{field}"] += getattr(data, field, 0) or 0.0
+
+        statement = insert(ClientYearAggregate).values(
+            user_id=user_id,
+            razon_social=razon_social,
+            periodo_anio=year,
+            periodo_mes_numero=month,
+            **values
+        )
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["user_id", "razon_social", "periodo_anio", "periodo_mes_numero"],
+            set_={**values, "updated_at": func.now()}
+        ))
+
+    async def refresh_keys(self, db: AsyncSession, keys: Iterable[Optional[AggregateKey]]):
+        """Refresh every affected month (pending changes must be flushed first; caller commits)"""
+        # Sorted: concurrent refreshes take the advisory locks in the same order
+        for key in sorted(set(key for key in keys if key)):
+            await self.refresh_month(db, key)
+
+    async def rebuild(self, db: AsyncSession, user_id: Optional[int] = None) -> int:
+        """Recompute all rows (or one user's) from the documents; returns the number of months"""
+        query = select(
+            Document.user_id, Document.razon_social, Document.periodo_anio, Document.periodo_mes_numero
+        ).where(
+            Document.user_id.isnot(None),
+            Document.razon_social.isnot(None),
+            Document.periodo_anio.isnot(None),
+            Document.periodo_mes_numero.isnot(None)
+        ).distinct()
+        stale = delete(ClientYearAggregate)
+        if user_id is not None:
+            query = query.where(Document.user_id == user_id)
+            stale = stale.where(ClientYearAggregate.user_id == user_id)
+
+        keys = [tuple(row) for row in (await db.execute(query)).all()]
+        await db.execute(stale)
+        await self.refresh_keys(db, keys)
+        return len(keys)
+
+
+# Singleton instance
+client_year_service = ClientYearService()
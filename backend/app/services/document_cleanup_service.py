@@ -10,6 +10,9 @@ from sqlalchemy import select, delete
 import logging
 
 from app.models.base import Document
+from app.services.client_year_service import client_year_service, aggregate_key
+from app.services.document_stats_service import document_stats_service
+from app.services.platform_counter_service import platform_counter_service
 from app.core.config import settings
 
 logger = logging.getLogger(__name__)
@@ -56,6 +59,7 @@ class DocumentCleanupService:
         deleted_files = 0
         deleted_records = 0
         errors = []
+        affected_months = []
         
         for doc in old_documents:
             try:
@@ -71,6 +75,7 @@ class DocumentCleanupService:
                 # form_104_data will be CASCADE deleted if you have foreign keys set up
                 # OR preserved if you remove CASCADE
                 if not dry_run:
+                    affected_months.append(aggregate_key(doc))
                     await db.delete(doc)
                     deleted_records += 1
                     
@@ -79,7 +84,13 @@ class DocumentCleanupService:
                 logger.error(f"❌ Error deleting document {doc.id}: {str(e)}")
         
         if not dry_run:
+            await db.flush()
+            await client_year_service.refresh_keys(db, affected_months)
+            await platform_counter_service.documents_removed(
+                db, deleted_records, [doc.razon_social for doc in old_documents]
+            )
             await db.commit()
+            document_stats_service.invalidate(doc.user_id for doc in old_documents)
         
         stats = {
             "cutoff_date": cutoff_date.isoformat(),
@@ -131,6 +142,10 @@ class DocumentCleanupService:
                 logger.error(f"Error deleting guest document {doc.id}: {str(e)}")
         
         if not dry_run:
+            await db.flush()
+            await platform_counter_service.documents_removed(
+                db, deleted_records, [doc.razon_social for doc in guest_documents]
+            )
             await db.commit()
         
         return {
@@ -0,0 +1,116 @@
+"""
+Document Stats Service - per-user counters behind the dashboard and documents overview
+✅ One aggregate query (COUNT(*) FILTER (WHERE ...), sums, recent uploads as JSON)
+✅ Results cached per user; invalidated on upload, processing, delete and cleanup
+"""
+
+from typing import Iterable, Optional
+
+from sqlalchemy import select, func, literal_column, type_coerce
+from sqlalchemy.dialects.postgresql import JSON, aggregate_order_by
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import aliased
+
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+from app.models.base import Document, FormTypeEnum, ProcessingStatusEnum
+
+RECENT_UPLOADS = 5
+
+
+class DocumentStatsService:
+    """Computes and caches the document statistics of one user"""
+
+    def __init__(self, cache_size: int = 1024, cache_ttl: float = 30.0):
+        self.cache = TTLCache(maxsize=cache_size, ttl=cache_ttl)
+
+    def _query(self, user_id: int):
+        """Every counter of the user in a single SELECT"""
+        recent_doc = aliased(Document)
+        recent = (
+            select(
+                recent_doc.id,
+                recent_doc.original_filename,
+                recent_doc.razon_social,
+                recent_doc.periodo_fiscal_completo,
+                recent_doc.uploaded_at
+            )
+            .where(recent_doc.user_id == user_id)
+            .order_by(recent_doc.uploaded_at.desc())
+            .limit(RECENT_UPLOADS)
+            .subquery()
+        )
+        recent_json = select(func.coalesce(
+            func.json_agg(aggregate_order_by(
+                func.json_build_object(
+                    'id', recent.c.id,
+                    'filename', recent.c.original_filename,
+                    'razon_social', recent.c.razon_social,
+                    'periodo', recent.c.periodo_fiscal_completo,
+                    'uploaded_at', recent.c.uploaded_at
+                ),
+                recent.c.uploaded_at.desc()
+            )),
+            literal_column("'[]'::json")
+        )).scalar_subquery()
+
+        return select(
+            func.count().label("total_documents"),
+            *(
+                func.count().filter(Document.processing_status == status).label(f"status_{status.value}")
+                for status in ProcessingStatusEnum
+            ),
+            *(
+                func.count().filter(Document.form_type == form_type).label(f"type_{form_type.value}")
+                for form_type in FormTypeEnum
+            ),
+            func.count(func.distinct(Document.razon_social)).label("unique_clients"),
+            func.coalesce(func.sum(Document.total_pages), 0).label("total_pages"),
+            func.coalesce(func.sum(Document.total_characters), 0).label("total_characters"),
+            type_coerce(recent_json, JSON).label("recent_uploads"),
+        ).where(Document.user_id == user_id)
+
+    async def user_stats(self, db: AsyncSession, user_id: int) -> dict:
+        """Counters of one user (cached)"""
+        cached = self.cache.get(user_id)
+        if cached is not None:
+            return cached
+
+        row = (await db.execute(self._query(user_id))).one()
+        completed = row.status_completed
+        processing = row.status_processing
+        failed = row.status_failed
+
+        stats = {
+            "total_documents": row.total_documents,
+            "by_status": {
+                "completed": completed,
+                "processing": processing,
+                "failed": failed,
+                "pending": row.total_documents - processing - completed - failed
+            },
+            "by_form_type": {
+                form_type.value: getattr(row, f"type_{form_type.value}")
+                for form_type in FormTypeEnum
+                if getattr(row, f"type_{form_type.value}")
+            },
+            "unique_clients": row.unique_clients,
+            "total_pages_extracted": row.total_pages,
+            "total_characters_extracted": row.total_characters,
+            "recent_uploads": row.recent_uploads,
+        }
+        self.cache.set(user_id, stats)
+        return stats
+
+    def invalidate(self, user_ids: Iterable[Optional[int]]):
+        """Drop cached counters after documents of these users changed (guests are never cached)"""
+        for user_id in set(user_ids):
+            if user_id is not None:
+                self.cache.pop(user_id)
+
+
+# Singleton instance
+document_stats_service = DocumentStatsService(
+    cache_size=settings.DOCUMENT_STATS_CACHE_SIZE,
+    cache_ttl=settings.DOCUMENT_STATS_CACHE_TTL_SECONDS
+)
@@ -4,24 +4,72 @@ Enhanced Form Processing Service - COMPLETE VERSION
 ✅ No filter function needed after migration
 """
 
-import pdfplumber
-import re
-from typing import Dict, Optional, Tuple
+import asyncio
+import copy
+import os
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy import select
+from sqlalchemy import select, delete
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import undefer
 from datetime import datetime
 import logging
 
+from app.core.config import settings
 from app.models.base import Document, Form103Totals, Form103LineItem, Form104Data, ProcessingStatusEnum, FormTypeEnum
 from app.services.form_103_parser import form_103_parser
 from app.services.form_104_parser import form_104_parser_complete
+from app.services.extraction_executor import extraction_executor
+from app.services.layout_extractor import merge_page_fields
+from app.services.client_year_service import client_year_service, aggregate_key
+from app.services.platform_counter_service import platform_counter_service
+from app.services.pattern_registry import pattern_registry, PERIOD_PATTERNS, PATTERNS_VERSION
 
 logger = logging.getLogger(__name__)
 
+# Form types whose boxes are read by coordinates instead of regex over the flattened text
+LAYOUT_FORMS = tuple(
+    form_type.value
+    for form_type, mode in (
+        (FormTypeEnum.FORM_103, settings.FORM_103_EXTRACTION_MODE),
+        (FormTypeEnum.FORM_104, settings.FORM_104_EXTRACTION_MODE),
+    )
+    if mode == "layout"
+)
+
+# Leading pages read per form type after page 1 was classified (0 = every page)
+FORM_PAGE_LIMITS = {
+    FormTypeEnum.FORM_103: settings.FORM_103_MAX_PAGES,
+    FormTypeEnum.FORM_104: settings.FORM_104_MAX_PAGES,
+}
+
+# Form103Totals columns filled from the parser's "totals"
+FORM_103_TOTALS_FIELDS = (
+    "subtotal_operaciones_pais",
+    "subtotal_retencion",
+    "total_retencion",
+    "total_impuesto_pagar",
+    "interes_mora",
+    "multa",
+    "total_pagado",
+    "pagos_no_sujetos",
+    "otras_retenciones_base",
+    "otras_retenciones_retenido",
+)
+
 
 class EnhancedFormProcessingService:
     """Service for processing PDF forms and storing structured data"""
     
+    def __init__(self):
+        # Striped locks keyed by duplicate key (bounded memory, shared by all requests and workers)
+        self._dedupe_locks = [asyncio.Lock() for _ in range(64)]
+    
+    def _dedupe_lock(self, *key) -> asyncio.Lock:
+        """Lock guarding the duplicate check + insert for one duplicate key"""
+        return self._dedupe_locks[hash(key) % len(self._dedupe_locks)]
+    
     async def check_duplicate_document(
         self,
         razon_social: str,
@@ -29,7 +77,8 @@ class EnhancedFormProcessingService:
         form_type: FormTypeEnum,
         user_id: Optional[int],
         session_id: Optional[str],
-        db: AsyncSession
+        db: AsyncSession,
+        exclude_id: Optional[int] = None
     ) -> Optional[Document]:
         """Check if document already exists"""
         query = select(Document).where(
@@ -41,12 +90,102 @@ class EnhancedFormProcessingService:
         if user_id:
             query = query.where(Document.user_id == user_id)
         elif session_id:
-            query = query.where(Document.session_id == session_id)
+            # user_id IS NULL: lets the planner use uq_documents_session_period_form
+            query = query.where(Document.user_id.is_(None), Document.session_id == session_id)
         else:
             return None
         
-        result = await db.execute(query)
-        return result.scalar_one_or_none()
+        # A queued document must not match itself
+        if exclude_id is not None:
+            query = query.where(Document.id != exclude_id)
+        
+        result = await db.execute(query.order_by(Document.id).limit(1))
+        return result.scalars().first()
+    
+    async def find_document_by_hash(
+        self,
+        content_hash: str,
+        user_id: Optional[int],
+        session_id: Optional[str],
+        db: AsyncSession
+    ) -> Optional[Document]:
+        """Owner's existing upload of the exact same file (no PDF access needed)"""
+        query = select(Document).where(Document.content_hash == content_hash)
+        
+        if user_id:
+            query = query.where(Document.user_id == user_id)
+        elif session_id:
+            query = query.where(Document.user_id.is_(None), Document.session_id == session_id)
+        else:
+            return None
+        
+        result = await db.execute(query.limit(1))
+        return result.scalars().first()
+    
+    async def reusable_document_by_hash(
+        self,
+        content_hash: str,
+        user_id: Optional[int],
+        session_id: Optional[str],
+        db: AsyncSession
+    ) -> Optional[Document]:
+        """
+        Owner's earlier upload of the same bytes that can answer a new upload
+        ✅ COMPLETED or still queued (PENDING / PROCESSING): returned
+        ✅ FAILED: deleted with its file (caller commits) so the new copy is ingested from scratch
+        """
+        existing = await self.find_document_by_hash(content_hash, user_id, session_id, db)
+        if existing is None or existing.processing_status != ProcessingStatusEnum.FAILED:
+            return existing
+        
+        logger.info(f"🗑️ Replacing failed document {existing.id} with a new upload of the same file")
+        if existing.file_path and os.path.exists(existing.file_path):
+            os.remove(existing.file_path)
+        await db.delete(existing)
+        await db.flush()
+        await platform_counter_service.documents_removed(db, 1, [existing.razon_social])
+        return None
+    
+    async def _cached_extraction(self, document: Document, db: AsyncSession) -> Optional[Tuple[str, int, int, Optional[dict]]]:
+        """
+        Extraction cache shared by all owners: reuse text (and parsed data) of any
+        completed document with the same content hash
+        Returns: (text, total_pages, total_chars, parsed_data) - parsed_data is None when it must be re-parsed
+        """
+        if not document.content_hash:
+            return None
+        
+        result = await db.execute(
+            select(Document)
+            .where(
+                Document.content_hash == document.content_hash,
+                Document.processing_status == ProcessingStatusEnum.COMPLETED,
+                Document.extracted_text.isnot(None)
+            )
+            .options(undefer(Document.extracted_text), undefer(Document.parsed_data))
+            .order_by(Document.id.desc())
+            .limit(1)
+        )
+        source = result.scalars().first()
+        if source is None:
+            return None
+        
+        parsed_data = source.parsed_data or {}
+        mode = "layout" if source.form_type.value in LAYOUT_FORMS else "regex"
+        reusable = (
+            parsed_data.get("pattern_version") == PATTERNS_VERSION
+            and parsed_data.get("extraction_mode", "regex") == mode
+        )
+        if not reusable and mode == "layout":
+            return None  # Box coordinates are not stored: extract again
+        
+        logger.info(f"♻️ Reusing extraction of document {source.id} (same content hash)")
+        return (
+            source.extracted_text,
+            source.total_pages,
+            source.total_characters,
+            copy.deepcopy(parsed_data) if reusable else None
+        )
     
     async def process_uploaded_document(
         self,
@@ -56,96 +195,237 @@ class EnhancedFormProcessingService:
         db: AsyncSession,
         user_id: Optional[int] = None,
         session_id: Optional[str] = None,
-        allow_duplicates: bool = False
+        allow_duplicates: bool = False,
+        content_hash: Optional[str] = None
     ) -> Tuple[Document, bool]:
         """
         Process a newly uploaded document
         Returns: (document, is_duplicate)
         """
+        document = Document(
+            filename=file_path.split("/")[-1].replace("\\", "/").split("/")[-1],
+            original_filename=original_filename,
+            file_path=file_path,
+            file_size=file_size,
+            processing_status=ProcessingStatusEnum.PROCESSING,
+            user_id=user_id,
+            session_id=session_id,
+            content_hash=content_hash
+        )
+        return await self._run_pipeline(document, db, allow_duplicates)
+    
+    async def process_pending_document(
+        self,
+        document: Document,
+        db: AsyncSession,
+        allow_duplicates: bool = False
+    ) -> Tuple[Document, bool]:
+        """
+        Process a document that was queued by the upload API (status PENDING)
+        ✅ On duplicate the queued row is removed and the existing document is returned
+        Returns: (document, is_duplicate)
+        """
+        document.processing_status = ProcessingStatusEnum.PROCESSING
+        document.processing_error = None
+        await db.commit()
+        
+        result, is_duplicate = await self._run_pipeline(document, db, allow_duplicates)
+        
+        if is_duplicate:
+            await db.delete(document)
+            await db.flush()
+            await platform_counter_service.documents_removed(db, 1, [document.razon_social])
+            await db.commit()
+        
+        return (result, is_duplicate)
+    
+    async def _run_pipeline(
+        self,
+        document: Document,
+        db: AsyncSession,
+        allow_duplicates: bool
+    ) -> Tuple[Document, bool]:
+        """
+        Extract, classify, dedupe and parse a document, then commit it
+        ✅ Staged extraction: page 1 is classified and its header checked for duplicates
+        before the remaining pages (only those the form type needs) are read
+        ✅ Page 1 unclassifiable: the whole document is read and classified, as before staging
+        """
         try:
-            # Extract text from PDF
-            text, total_pages, total_chars = self._extract_text_with_metadata(file_path)
-            
-            # Classify form type
-            form_type = self._classify_form_type(text)
-            
-            # Create initial document record
-            document = Document(
-                filename=file_path.split("/")[-1].replace("\\", "/").split("/")[-1],
-                original_filename=original_filename,
-                file_path=file_path,
-                file_size=file_size,
-                form_type=form_type,
-                extracted_text=text,
-                total_pages=total_pages,
-                total_characters=total_chars,
-                processing_status=ProcessingStatusEnum.PROCESSING,
-                user_id=user_id,
-                session_id=session_id
-            )
-            
-            # Extract header information
-            self._extract_header_info(document, text)
-
-            # Check for duplicates
-            if not allow_duplicates and document.razon_social and document.periodo_fiscal_completo:
-                existing = await self.check_duplicate_document(
-                    razon_social=document.razon_social,
-                    periodo_fiscal_completo=document.periodo_fiscal_completo,
-                    form_type=form_type,
-                    user_id=user_id,
-                    session_id=session_id,
-                    db=db
+            cached = await self._cached_extraction(document, db)
+            if cached:
+                text, total_pages, total_chars, parsed_data = cached
+                layout = {}
+                form_type = self._classify_form_type(text)
+                document.form_type = form_type
+                self._extract_header_info(document, text)
+            else:
+                # Stage 1: page 1 holds the form title and the header (runs in the extraction pool)
+                text, total_pages, _, layout = await extraction_executor.extract(
+                    document.file_path, LAYOUT_FORMS, last_page=1, content_hash=document.content_hash
                 )
+                parsed_data = None
+                pages_read = 1
+                form_type = self._classify_form_type(text)
+                if form_type == FormTypeEnum.UNKNOWN and total_pages > 1:
+                    # Title not on page 1: classify the whole document before giving up
+                    text = await self._extract_more(document, text, layout, LAYOUT_FORMS, 1, total_pages)
+                    pages_read = total_pages
+                    form_type = self._classify_form_type(text)
+                document.form_type = form_type
+                self._extract_header_info(document, text)
                 
-                if existing:
-                    logger.warning(f"⚠️ Duplicate detected: {existing.razon_social} - {existing.periodo_fiscal_completo}")
-                    return (existing, True)
-            
-            # Add to database
-            db.add(document)
-            await db.flush()
-            
-            # Parse form-specific data
-            if form_type == FormTypeEnum.FORM_103:
-                await self._process_form_103(document, text, db)
-            elif form_type == FormTypeEnum.FORM_104:
-                await self._process_form_104(document, text, db)
-            
-            # Mark as completed
-            document.processing_status = ProcessingStatusEnum.COMPLETED
-            document.processed_at = datetime.utcnow()
-            
-            await db.commit()
-            await db.refresh(document)
-            
-            logger.info(f"✅ Successfully processed document {document.id}: {form_type.value}")
-            logger.info(f"   Period: {document.periodo_fiscal_completo}")
-            logger.info(f"   Client: {document.razon_social}")
+                # Stage 2: a known duplicate needs no further pages
+                if not allow_duplicates:
+                    existing = await self._find_duplicate(document, db)
+                    if existing:
+                        logger.warning(f"⚠️ Duplicate detected on page 1: {existing.razon_social} - {existing.periodo_fiscal_completo}")
+                        return (existing, True)
+                
+                # Stage 3: remaining pages the form type needs
+                last_page = self._pages_needed(form_type, total_pages)
+                if last_page > pages_read:
+                    text = await self._extract_more(
+                        document,
+                        text,
+                        layout,
+                        tuple(form for form in LAYOUT_FORMS if form == form_type.value),
+                        pages_read,
+                        last_page
+                    )
+                    if not (document.razon_social and document.periodo_fiscal_completo):
+                        self._extract_header_info(document, text)
+                total_chars = len(text)
             
-            return (document, False)
+            document.extracted_text = text
+            document.total_pages = total_pages
+            document.total_characters = total_chars
+
+            # Same owner/client/period/form: serialize so concurrent uploads cannot both pass the duplicate check
+            async with self._dedupe_lock(
+                document.user_id or document.session_id,
+                document.razon_social,
+                document.periodo_fiscal_completo,
+                form_type
+            ):
+                return await self._store_document(
+                    document, text, db, allow_duplicates, layout.get(form_type.value), parsed_data
+                )
             
         except Exception as e:
             logger.error(f"Error processing document: {str(e)}")
-            if 'document' in locals():
+            if document in db:
                 document.processing_status = ProcessingStatusEnum.FAILED
                 document.processing_error = str(e)
                 await db.commit()
             raise
     
-    def _extract_text_with_metadata(self, file_path: str) -> tuple[str, int, int]:
-        """Extract text from PDF and get metadata"""
-        text_parts = []
+    async def _store_document(
+        self,
+        document: Document,
+        text: str,
+        db: AsyncSession,
+        allow_duplicates: bool,
+        layout: Optional[dict] = None,
+        parsed_data: Optional[dict] = None
+    ) -> Tuple[Document, bool]:
+        """Check for duplicates, parse form data and commit (caller holds the dedupe lock)"""
+        # Check for duplicates
+        if not allow_duplicates:
+            existing = await self._find_duplicate(document, db)
+            if existing:
+                logger.warning(f"⚠️ Duplicate detected: {existing.razon_social} - {existing.periodo_fiscal_completo}")
+                return (existing, True)
         
-        with pdfplumber.open(file_path) as pdf:
-            total_pages = len(pdf.pages)
-            for page in pdf.pages:
-                text_parts.append(page.extract_text() or "")
+        # Add to database
+        is_new = document.id is None
+        # Read before flushing: a rollback expires the document's attributes
+        document_id, user_id, session_id = document.id, document.user_id, document.session_id
+        content_hash, razon_social = document.content_hash, document.razon_social
+        periodo, form_type = document.periodo_fiscal_completo, document.form_type
+        db.add(document)
+        try:
+            await db.flush()
+        except IntegrityError:
+            # Stored concurrently (other request or worker) for the same owner: same file
+            # (unique content hash) or same client / period / form (unique duplicate key)
+            await db.rollback()
+            existing = None
+            if content_hash:
+                existing = await self.find_document_by_hash(content_hash, user_id, session_id, db)
+            if existing is None and razon_social and periodo:
+                existing = await self.check_duplicate_document(
+                    razon_social, periodo, form_type, user_id, session_id, db, exclude_id=document_id
+                )
+            if existing is None:
+                raise
+            return (existing, True)
+        if is_new:
+            await platform_counter_service.document_added(db)
+        
+        # Parse form-specific data
+        if document.form_type == FormTypeEnum.FORM_103:
+            await self._process_form_103(document, text, db, layout, parsed_data)
+        elif document.form_type == FormTypeEnum.FORM_104:
+            await self._process_form_104(document, text, db, layout, parsed_data)
+        
+        # Mark as completed
+        document.processing_status = ProcessingStatusEnum.COMPLETED
+        document.processed_at = datetime.utcnow()
+        
+        # Keep the client's monthly aggregates in step (same transaction)
+        await db.flush()
+        await client_year_service.refresh_keys(db, [aggregate_key(document)])
+        await platform_counter_service.client_seen(db, document)
+        
+        await db.commit()
+        await db.refresh(document)
         
-        full_text = "\n".join(text_parts)
-        total_chars = len(full_text)
+        logger.info(f"✅ Successfully processed document {document.id}: {document.form_type.value}")
+        logger.info(f"   Period: {document.periodo_fiscal_completo}")
+        logger.info(f"   Client: {document.razon_social}")
         
-        return full_text, total_pages, total_chars
+        return (document, False)
+    
+    async def _find_duplicate(self, document: Document, db: AsyncSession) -> Optional[Document]:
+        """Existing document of the owner with the same client / period / form (needs the parsed header)"""
+        if not (document.razon_social and document.periodo_fiscal_completo):
+            return None
+        return await self.check_duplicate_document(
+            razon_social=document.razon_social,
+            periodo_fiscal_completo=document.periodo_fiscal_completo,
+            form_type=document.form_type,
+            user_id=document.user_id,
+            session_id=document.session_id,
+            db=db,
+            exclude_id=document.id
+        )
+    
+    async def _extract_more(
+        self,
+        document: Document,
+        text: str,
+        layout: dict,
+        layout_forms: Tuple[str, ...],
+        first_page: int,
+        last_page: int
+    ) -> str:
+        """Extract pages [first_page, last_page) and append them (layout fields merged in place)"""
+        rest, _, _, rest_layout = await extraction_executor.extract(
+            document.file_path,
+            layout_forms,
+            first_page=first_page,
+            last_page=last_page,
+            content_hash=document.content_hash
+        )
+        for form, form_layout in rest_layout.items():
+            merge_page_fields(layout, form, form_layout["codes"], form_layout["rows"])
+        return f"{text}\n{rest}"
+    
+    def _pages_needed(self, form_type: FormTypeEnum, total_pages: int) -> int:
+        """Number of leading pages to extract for a form type (unknown forms: page 1, already read)"""
+        limit = FORM_PAGE_LIMITS.get(form_type, 1)
+        return min(limit, total_pages) if limit else total_pages
     
     def _classify_form_type(self, text: str) -> FormTypeEnum:
         """Determine form type based on text content"""
@@ -178,30 +458,20 @@ class EnhancedFormProcessingService:
     def _extract_header_info(self, document: Document, text: str):
         """Extract header information from form text"""
         # Extract RUC
-        ruc_match = re.search(r'(?:RUC|Identificación|No\. Identificación)[:\s]*(\d{13})', text, re.IGNORECASE)
+        ruc_match = pattern_registry.search("document.ruc", text)
         if ruc_match:
             document.identificacion_ruc = ruc_match.group(1)
         
         # Extract Razon Social
-        razon_match = re.search(
-            r'(?:Razón Social|Apellidos y Nombres)[:\s]*([A-ZÁÉÍÓÚÑ\.]+(?:\s+[A-ZÁÉÍÓÚÑ\.]+)*(?:\s+(?:S\.A\.S\.|S\.A\.|CIA\.|LTDA\.|C\.A\.|S\.C\.|CIA\. LTDA\.))?)',
-            text,
-            re.IGNORECASE
-        )
+        razon_match = pattern_registry.search("document.razon_social", text)
         if razon_match:
             razon_social_raw = razon_match.group(1).strip()
             document.razon_social = razon_social_raw.split('\n')[0].strip()
         
         # Extract Period
-        periodo_patterns = [
-            r'Período\s+Fiscal[:\s]+(ENERO|FEBRERO|MARZO|ABRIL|MAYO|JUNIO|JULIO|AGOSTO|SEPTIEMBRE|OCTUBRE|NOVIEMBRE|DICIEMBRE)\s+(\d{4})',
-            r'(?:Período|Mes)[:\s]+(ENERO|FEBRERO|MARZO|ABRIL|MAYO|JUNIO|JULIO|AGOSTO|SEPTIEMBRE|OCTUBRE|NOVIEMBRE|DICIEMBRE)\s+(\d{4})',
-            r'(?:Período|Mes).*?(ENERO|FEBRERO|MARZO|ABRIL|MAYO|JUNIO|JULIO|AGOSTO|SEPTIEMBRE|OCTUBRE|NOVIEMBRE|DICIEMBRE)\s+(\d{4})',
-        ]
-        
         periodo_match = None
-        for pattern in periodo_patterns:
-            periodo_match = re.search(pattern, text, re.IGNORECASE)
+        for pattern_name in PERIOD_PATTERNS:
+            periodo_match = pattern_registry.search(pattern_name, text)
             if periodo_match:
                 break
         
@@ -227,7 +497,7 @@ class EnhancedFormProcessingService:
             logger.warning(f"⚠️ Could not extract period from text")
         
         # Extract fecha recaudacion
-        fecha_match = re.search(r'(?:Fecha de Recaudación)[:\s]*(\d{2}[-/]\d{2}[-/]\d{4})', text, re.IGNORECASE)
+        fecha_match = pattern_registry.search("document.fecha_recaudacion", text)
         if fecha_match:
             try:
                 fecha_str = fecha_match.group(1).replace('-', '/')
@@ -235,66 +505,32 @@ class EnhancedFormProcessingService:
             except:
                 pass
     
-    async def _process_form_103(self, document: Document, text: str, db: AsyncSession) -> Dict:
-        """Process Form 103 - Income Tax Withholdings"""
-        parsed_data = form_103_parser.parse(text)
+    async def _process_form_103(
+        self,
+        document: Document,
+        text: str,
+        db: AsyncSession,
+        layout: Optional[dict] = None,
+        parsed_data: Optional[dict] = None
+    ) -> Dict:
+        """
+        Process Form 103 - Income Tax Withholdings
+        ✅ Bulk writes: totals upserted, line items replaced with one DELETE + one multi-row INSERT
+        """
+        parsed_data = parsed_data or form_103_parser.parse(text, layout)
         document.parsed_data = parsed_data
         
-        totals = parsed_data.get("totals", {})
+        totals_values, line_items = self._form_103_rows(document.id, document.user_id, parsed_data)
         
-        result = await db.execute(
-            select(Form103Totals).filter(Form103Totals.document_id == document.id)
-        )
-        existing_totals = result.scalar_one_or_none()
-        
-        if existing_totals:
-            existing_totals.subtotal_operaciones_pais = totals.get("subtotal_operaciones_pais", 0.0)
-            existing_totals.subtotal_retencion = totals.get("subtotal_retencion", 0.0)
-            existing_totals.total_retencion = totals.get("total_retencion", 0.0)
-            existing_totals.total_impuesto_pagar = totals.get("total_impuesto_pagar", 0.0)
-            existing_totals.interes_mora = totals.get("interes_mora", 0.0)
-            existing_totals.multa = totals.get("multa", 0.0)
-            existing_totals.total_pagado = totals.get("total_pagado", 0.0)
-            existing_totals.pagos_no_sujetos = totals.get("pagos_no_sujetos", 0.0)
-            existing_totals.otras_retenciones_base = totals.get("otras_retenciones_base", 0.0)
-            existing_totals.otras_retenciones_retenido = totals.get("otras_retenciones_retenido", 0.0)
-        else:
-            form_103_totals = Form103Totals(
-                document_id=document.id,
-                subtotal_operaciones_pais=totals.get("subtotal_operaciones_pais", 0.0),
-                subtotal_retencion=totals.get("subtotal_retencion", 0.0),
-                total_retencion=totals.get("total_retencion", 0.0),
-                total_impuesto_pagar=totals.get("total_impuesto_pagar", 0.0),
-                interes_mora=totals.get("interes_mora", 0.0),
-                multa=totals.get("multa", 0.0),
-                total_pagado=totals.get("total_pagado", 0.0),
-                pagos_no_sujetos=totals.get("pagos_no_sujetos", 0.0),
-                otras_retenciones_base=totals.get("otras_retenciones_base", 0.0),
-                otras_retenciones_retenido=totals.get("otras_retenciones_retenido", 0.0)
-            )
-            db.add(form_103_totals)
+        statement = insert(Form103Totals).values(document_id=document.id, **totals_values)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["document_id"],
+            set_={field: statement.excluded[field] for field in totals_values}
+        ))
         
-        line_items = parsed_data.get("line_items", [])
-        
-        result = await db.execute(
-            select(Form103LineItem).filter(Form103LineItem.document_id == document.id)
-        )
-        existing_items = result.scalars().all()
-        for item in existing_items:
-            await db.delete(item)
-        
-        for idx, item_data in enumerate(line_items):
-            line_item = Form103LineItem(
-                document_id=document.id,
-                concepto=item_data.get("concepto", ""),
-                codigo_base=item_data.get("codigo_base", ""),
-                base_imponible=item_data.get("base_imponible", 0.0),
-                codigo_retencion=item_data.get("codigo_retencion", ""),
-                valor_retenido=item_data.get("valor_retenido", 0.0),
-                order_index=idx,
-                user_id=document.user_id
-            )
-            db.add(line_item)
+        await db.execute(delete(Form103LineItem).where(Form103LineItem.document_id == document.id))
+        if line_items:
+            await db.execute(insert(Form103LineItem), line_items)
         
         return {
             "status": "success",
@@ -303,30 +539,29 @@ class EnhancedFormProcessingService:
             "line_items_count": len(line_items)
         }
     
-    async def _process_form_104(self, document: Document, text: str, db: AsyncSession) -> Dict:
+    async def _process_form_104(
+        self,
+        document: Document,
+        text: str,
+        db: AsyncSession,
+        layout: Optional[dict] = None,
+        parsed_data: Optional[dict] = None
+    ) -> Dict:
         """
         Process Form 104 - VAT Declaration
         ✅ Uses ALL 127 fields directly (no filter needed after migration)
+        ✅ One INSERT ... ON CONFLICT (document_id) DO UPDATE (new and reprocessed documents)
         """
-        parsed_data = form_104_parser_complete.parse(text)
+        parsed_data = parsed_data or form_104_parser_complete.parse(text, layout)
         document.parsed_data = parsed_data
         
-        result = await db.execute(
-            select(Form104Data).filter(Form104Data.document_id == document.id)
-        )
-        existing_data = result.scalar_one_or_none()
+        field_data = self._extract_all_form_104_fields(parsed_data)
         
-        if existing_data:
-            self._update_form_104_data(existing_data, parsed_data)
-        else:
-            # ✅ Extract ALL fields directly - no filter needed
-            field_data = self._extract_all_form_104_fields(parsed_data)
-            
-            form_104_data = Form104Data(
-                document_id=document.id,
-                **field_data
-            )
-            db.add(form_104_data)
+        statement = insert(Form104Data).values(document_id=document.id, **field_data)
+        await db.execute(statement.on_conflict_do_update(
+            index_elements=["document_id"],
+            set_={field: statement.excluded[field] for field in field_data}
+        ))
         
         return {
             "status": "success",
@@ -334,6 +569,58 @@ class EnhancedFormProcessingService:
             "fields_extracted": 127
         }
     
+    def _form_103_rows(self, document_id: int, user_id: Optional[int], parsed_data: Dict) -> Tuple[Dict, List[Dict]]:
+        """Form103Totals values and Form103LineItem rows of one parsed Form 103"""
+        totals = parsed_data.get("totals", {})
+        totals_values = {field: totals.get(field, 0.0) for field in FORM_103_TOTALS_FIELDS}
+        line_items = [
+            {
+                "document_id": document_id,
+                "concepto": item_data.get("concepto", ""),
+                "codigo_base": item_data.get("codigo_base", ""),
+                "base_imponible": item_data.get("base_imponible", 0.0),
+                "codigo_retencion": item_data.get("codigo_retencion", ""),
+                "valor_retenido": item_data.get("valor_retenido", 0.0),
+                "order_index": idx,
+                "user_id": user_id
+            }
+            for idx, item_data in enumerate(parsed_data.get("line_items", []))
+        ]
+        return totals_values, line_items
+    
+    async def write_parsed_batch(self, db: AsyncSession, results: List[Tuple[int, Optional[int], FormTypeEnum, Dict]]):
+        """
+        Write the form data of many re-parsed documents (caller commits)
+        results: (document_id, user_id, form_type, parsed_data)
+        ✅ One upsert per form table and one DELETE + INSERT for all Form 103 line items
+        """
+        totals_rows, line_items, form_103_ids, form_104_rows = [], [], [], []
+        for document_id, user_id, form_type, parsed_data in results:
+            if form_type == FormTypeEnum.FORM_103:
+                totals_values, items = self._form_103_rows(document_id, user_id, parsed_data)
+                totals_rows.append({"document_id": document_id, **totals_values})
+                line_items.extend(items)
+                form_103_ids.append(document_id)
+            elif form_type == FormTypeEnum.FORM_104:
+                form_104_rows.append({"document_id": document_id, **self._extract_all_form_104_fields(parsed_data)})
+        
+        if totals_rows:
+            statement = insert(Form103Totals)
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["document_id"],
+                set_={field: statement.excluded[field] for field in FORM_103_TOTALS_FIELDS}
+            ), totals_rows)
+            await db.execute(delete(Form103LineItem).where(Form103LineItem.document_id.in_(form_103_ids)))
+            if line_items:
+                await db.execute(insert(Form103LineItem), line_items)
+        
+        if form_104_rows:
+            statement = insert(Form104Data)
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["document_id"],
+                set_={field: statement.excluded[field] for field in form_104_rows[0] if field != "document_id"}
+            ), form_104_rows)
+    
     def _extract_all_form_104_fields(self, parsed_data: Dict) -> Dict:
         """
         Extract ALL 127 Form 104 fields
@@ -478,16 +765,6 @@ class EnhancedFormProcessingService:
             "multa": totals.get("multa", 0.0),
             "total_pagado": totals.get("total_pagado", 0.0),
         }
-    
-    def _update_form_104_data(self, data_obj: Form104Data, parsed_data: Dict):
-        """Update existing Form104Data with all fields"""
-        field_data = self._extract_all_form_104_fields(parsed_data)
-        
-        for key, value in field_data.items():
-            if key != 'retenciones_iva':  # Handle separately
-                setattr(data_obj, key, value)
-        
-        data_obj.retenciones_iva = field_data['retenciones_iva']
 
 
 # Singleton instance
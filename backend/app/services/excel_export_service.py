@@ -0,0 +1,281 @@
+"""
+Excel Export Service - streaming .xlsx generation for the yearly summaries
+✅ openpyxl write_only worksheets: rows go to disk as they are appended, memory stays flat
+✅ Named styles registered once per workbook and shared by every cell
+✅ Workbooks are built in a worker thread and streamed back in chunks
+✅ Bulk export: rows are fetched on the event loop and handed to the writer thread in batches
+"""
+
+import asyncio
+import os
+import queue
+import tempfile
+from typing import AsyncIterator, Callable, Iterable, Iterator, Optional
+
+import aiofiles
+import openpyxl
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Font, PatternFill, Alignment, Border, Side, NamedStyle
+from openpyxl.utils import get_column_letter
+
+from app.core.config import settings
+from app.services.client_year_service import FORM_FIELDS, FORM_104_FIELDS, periodo_label
+
+MONTH_NAMES = ['', 'Enero', 'Febrero', 'Marzo', 'Abril', 'Mayo', 'Junio',
+               'Julio', 'Agosto', 'Septiembre', 'Octubre', 'Noviembre', 'Diciembre']
+
+SHEET_TITLES = {
+    'form_103': ("Form 103 - Retenciones", "Form 103 (Retenciones en la Fuente)"),
+    'form_104': ("Form 104 - IVA", "Form 104 (IVA)"),
+}
+
+MONEY_FORMAT = '$#,##0.00'
+
+# Batches of rows queued between the fetching loop and the writer thread
+MAX_QUEUED_BATCHES = 4
+
+
+def _named_styles() -> list:
+    """Every style used by the exports (new objects per workbook)"""
+    thin = Side(style='thin')
+    border = Border(left=thin, right=thin, top=thin, bottom=thin)
+    right = Alignment(horizontal='right')
+    total_fill = PatternFill(start_color="D9D9D9", end_color="D9D9D9", fill_type="solid")
+
+    return [
+        NamedStyle('export_title', font=Font(size=14, bold=True)),
+        NamedStyle('export_subtitle', font=Font(size=11, bold=True)),
+        NamedStyle('export_note', font=Font(size=9, italic=True)),
+        NamedStyle('export_section', font=Font(size=12, bold=True)),
+        NamedStyle(
+            'export_header',
+            font=Font(color="FFFFFF", bold=True, size=11),
+            fill=PatternFill(start_color="1F4E78", end_color="1F4E78", fill_type="solid"),
+            alignment=Alignment(horizontal='center', vertical='center', wrap_text=True),
+            border=border
+        ),
+        NamedStyle('export_text', border=border),
+        NamedStyle('export_money', border=border, number_format=MONEY_FORMAT, alignment=right),
+        NamedStyle('export_total_text', font=Font(bold=True), fill=total_fill, border=border),
+        NamedStyle('export_total_money', font=Font(bold=True), fill=total_fill, border=border,
+                   number_format=MONEY_FORMAT, alignment=right),
+        NamedStyle('export_resumen_label', font=Font(bold=True), border=border),
+        NamedStyle(
+            'export_resumen_grand_label',
+            font=Font(bold=True, color="FFFFFF", size=12),
+            fill=PatternFill(start_color="4CAF50", end_color="4CAF50", fill_type="solid"),
+            border=border
+        ),
+        NamedStyle(
+            'export_resumen_grand_money',
+            font=Font(bold=True, size=12),
+            fill=PatternFill(start_color="C8E6C9", end_color="C8E6C9", fill_type="solid"),
+            border=border, number_format=MONEY_FORMAT, alignment=right
+        ),
+    ]
+
+
+def new_workbook() -> openpyxl.Workbook:
+    """Write-only workbook with the export styles registered"""
+    wb = openpyxl.Workbook(write_only=True)
+    for style in _named_styles():
+        wb.add_named_style(style)
+    return wb
+
+
+def styled(ws, value, style: Optional[str]) -> WriteOnlyCell:
+    """Cell carrying one of the registered named styles"""
+    cell = WriteOnlyCell(ws, value=value)
+    if style:
+        cell.style = style
+    return cell
+
+
+def _excel_fields(form: str) -> list:
+    return [field for field in FORM_FIELDS[form] if field.excel]
+
+
+def _set_widths(ws, widths: list):
+    """Column widths (write-only sheets need them before the first row)"""
+    for col, width in enumerate(widths, 1):
+        ws.column_dimensions[get_column_letter(col)].width = width
+
+
+def _header_row(ws, headers: list) -> list:
+    return [styled(ws, header, 'export_header') for header in headers]
+
+
+def _values_row(ws, leading: list, values: Iterable[float], total: bool = False) -> list:
+    text, money = ('export_total_text', 'export_total_money') if total else ('export_text', 'export_money')
+    return [styled(ws, value, text) for value in leading] + [styled(ws, value, money) for value in values]
+
+
+def write_yearly_workbook(path: str, razon_social: str, year: str, email: str, months: list, totals) -> None:
+    """
+    Yearly summary of one client (one sheet per form), same layout as the original export
+    months / totals: client_year_service.summarize_year() rows
+    """
+    wb = new_workbook()
+
+    for form, (sheet_title, form_title) in SHEET_TITLES.items():
+        fields = _excel_fields(form)
+        ws = wb.create_sheet(sheet_title)
+        _set_widths(ws, [12, 15] + [18 if form == 'form_103' else 15] * len(fields))
+
+        ws.append([styled(ws, f"Resumen Anual {year} - {form_title}", 'export_title')])
+        ws.append([styled(ws, razon_social, 'export_subtitle')])
+        ws.append([styled(ws, f"Usuario: {email}", 'export_note')])
+        ws.append([])
+        if form == 'form_104':
+            ws.append([styled(ws, "DETALLE MENSUAL", 'export_section')])
+
+        ws.append(_header_row(ws, ['Mes', 'Período'] + [field.excel for field in fields]))
+        for row in months:
+            if not getattr(row, f"{form}_has_totals"):
+                continue
+            ws.append(_values_row(
+                ws,
+                [MONTH_NAMES[row.periodo_mes_numero], periodo_label(row) or "N/A"],
+                (getattr(row, f"{form}_{field.name}") for field in fields)
+            ))
+        ws.append(_values_row(
+            ws, ["TOTAL ANUAL", None], (getattr(totals, f"{form}_{field.name}") for field in fields), total=True
+        ))
+
+    # Form 104 "RESUMEN ANUAL" block
+    ws = wb[SHEET_TITLES['form_104'][0]]
+    ws.append([])
+    ws.append([])
+    ws.append([styled(ws, "RESUMEN ANUAL", 'export_section')])
+    for field in FORM_104_FIELDS:
+        if not field.resumen:
+            continue
+        grand = field.resumen == 'TOTAL PAGADO'
+        ws.append([
+            styled(ws, field.resumen, 'export_resumen_grand_label' if grand else 'export_resumen_label'),
+            styled(ws, getattr(totals, f"form_104_{field.name}"), 'export_resumen_grand_money' if grand else 'export_money'),
+        ])
+
+    wb.save(path)
+
+
+def write_bulk_workbook(path: str, email: str, batches: Iterator[list]) -> int:
+    """
+    Monthly rows of many clients and years (one sheet per form) with a total row per client/year
+    batches: lists of client_year_aggregates rows ordered by client, year and month
+    Returns the number of monthly rows written
+    """
+    wb = new_workbook()
+    sheets = {}
+    for form, (sheet_title, form_title) in SHEET_TITLES.items():
+        fields = _excel_fields(form)
+        ws = wb.create_sheet(sheet_title)
+        _set_widths(ws, [40, 8, 12, 18] + [15] * len(fields))
+        ws.append([styled(ws, f"Exportación Anual - {form_title}", 'export_title')])
+        ws.append([styled(ws, f"Usuario: {email}", 'export_note')])
+        ws.append([])
+        ws.append(_header_row(ws, ['Cliente', 'Año', 'Mes', 'Período'] + [field.excel for field in fields]))
+        sheets[form] = {"ws": ws, "fields": fields, "key": None, "totals": None}
+
+    def close_group(sheet):
+        """TOTAL row of the client/year just finished"""
+        if sheet["key"] is None:
+            return
+        razon_social, year = sheet["key"]
+        sheet["ws"].append(_values_row(
+            sheet["ws"], [razon_social, year, "TOTAL", None], sheet["totals"], total=True
+        ))
+
+    written = 0
+    for batch in batches:
+        for row in batch:
+            written += 1
+            for form, sheet in sheets.items():
+                if not getattr(row, f"{form}_has_totals"):
+                    continue
+                key = (row.razon_social, row.periodo_anio)
+                if key != sheet["key"]:
+                    close_group(sheet)
+                    sheet["key"] = key
+                    sheet["totals"] = [0.0] * len(sheet["fields"])
+
+                values = [getattr(row, f"{form}_{field.name}") or 0.0 for field in sheet["fields"]]
+                sheet["totals"] = [total + value for total, value in zip(sheet["totals"], values)]
+                sheet["ws"].append(_values_row(
+                    sheet["ws"],
+                    [row.razon_social, row.periodo_anio, MONTH_NAMES[row.periodo_mes_numero], periodo_label(row) or "N/A"],
+                    values
+                ))
+
+    for sheet in sheets.values():
+        close_group(sheet)
+
+    wb.save(path)
+    return written
+
+
+def _temp_path() -> str:
+    handle, path = tempfile.mkstemp(prefix="export_", suffix=".xlsx")
+    os.close(handle)
+    return path
+
+
+async def build_workbook(writer: Callable, *args) -> str:
+    """Run writer(path, *args) in a worker thread; returns the path of the finished file"""
+    path = _temp_path()
+    try:
+        await asyncio.to_thread(writer, path, *args)
+    except BaseException:
+        os.remove(path)
+        raise
+    return path
+
+
+async def build_workbook_streaming(writer: Callable, batches: AsyncIterator[list], *args) -> str:
+    """
+    Run writer(path, *args, batch_iterator) in a worker thread while batches are fetched on the loop
+    At most MAX_QUEUED_BATCHES batches are held in memory at a time
+    """
+    path = _temp_path()
+    handoff: queue.Queue = queue.Queue(maxsize=MAX_QUEUED_BATCHES)
+    writer_task = asyncio.ensure_future(
+        asyncio.to_thread(writer, path, *args, iter(handoff.get, None))
+    )
+
+    async def put(item) -> bool:
+        """Queue one item without blocking the loop; False if the writer stopped"""
+        while not writer_task.done():
+            try:
+                handoff.put_nowait(item)
+                return True
+            except queue.Full:
+                await asyncio.wait({writer_task}, timeout=0.05)
+        return False
+
+    finished = False
+    try:
+        try:
+            async for batch in batches:
+                if not await put(batch):
+                    break
+        finally:
+            # Always end the iterator so the writer thread returns
+            await put(None)
+            await asyncio.wait({writer_task})
+        writer_task.result()
+        finished = True
+    finally:
+        if not finished and os.path.exists(path):
+            os.remove(path)
+    return path
+
+
+async def stream_file(path: str, chunk_size: int = 0) -> AsyncIterator[bytes]:
+    """Yield a finished export in chunks and delete it afterwards (also on client disconnect)"""
+    try:
+        async with aiofiles.open(path, "rb") as handle:
+            while chunk := await handle.read(chunk_size or settings.EXPORT_CHUNK_SIZE):
+                yield chunk
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
@@ -0,0 +1,154 @@
+"""
+Extraction Cache - raw pdfplumber output per page, on disk
+✅ Keyed by (content hash, pdfplumber version, extraction mode): a parser or regex fix re-parses
+without decoding the PDF again; upgrading pdfplumber invalidates every entry
+✅ One zlib-compressed JSON file per page, written atomically (safe across worker processes)
+✅ Size bounded: least recently used pages are evicted (reads refresh the file's mtime)
+"""
+
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import time
+import zlib
+from typing import List, Optional
+
+import pdfplumber
+
+from app.core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Word box keys needed to rebuild text and read layout fields
+WORD_KEYS = ("text", "x0", "x1", "top", "bottom")
+
+
+def file_sha256(file_path: str, chunk_size: int = 1048576) -> str:
+    """Content hash of a file already on disk (same digest the upload API stores)"""
+    digest = hashlib.sha256()
+    with open(file_path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """Page-level cache of extracted text (and word boxes in layout mode)"""
+
+    def __init__(self, directory: str, max_bytes: int = 536870912, prune_interval: float = 60.0):
+        """
+        directory: Cache root (created on first write)
+        max_bytes: Total size kept on disk, 0 = cache disabled
+        prune_interval: Minimum seconds between eviction scans of one process
+        """
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.prune_interval = prune_interval
+        self.version = pdfplumber.__version__
+        self._last_prune = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_bytes > 0
+
+    def _path(self, content_hash: str, mode: str, page: int) -> str:
+        key = hashlib.sha256(f"{content_hash}:{self.version}:{mode}".encode()).hexdigest()
+        return os.path.join(self.directory, key[:2], f"{key}-{page}.json.z")
+
+    def get_page(self, content_hash: str, mode: str, page: int) -> Optional[dict]:
+        """
+        Cached page or None
+        Returns: {"total_pages", "text", "width", "words"} (words only in layout mode)
+        """
+        path = self._path(content_hash, mode, page)
+        try:
+            with open(path, "rb") as f:
+                entry = json.loads(zlib.decompress(f.read()))
+            os.utime(path)  # LRU: recently read pages are evicted last
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"⚠️ Dropping unreadable extraction cache entry {path}: {e}")
+            self._discard(path)
+            return None
+        return entry
+
+    def put_page(
+        self,
+        content_hash: str,
+        mode: str,
+        page: int,
+        total_pages: int,
+        text: str,
+        width: float,
+        words: Optional[List[dict]] = None
+    ):
+        """Store one page (failures are logged, never raised: the cache is an optimization)"""
+        entry = {"total_pages": total_pages, "text": text, "width": width}
+        if words is not None:
+            entry["words"] = [
+                {key: word[key] if key == "text" else float(word[key]) for key in WORD_KEYS}
+                for word in words
+            ]
+        path = self._path(content_hash, mode, page)
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename: readers in other processes never see a partial file
+            fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(zlib.compress(json.dumps(entry, separators=(",", ":")).encode(), 6))
+            os.replace(tmp_path, path)
+        except OSError as e:
+            logger.warning(f"⚠️ Could not write extraction cache entry {path}: {e}")
+            return
+        self._maybe_prune()
+
+    def _discard(self, path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _maybe_prune(self):
+        now = time.monotonic()
+        if now - self._last_prune >= self.prune_interval:
+            self._last_prune = now
+            self.prune()
+
+    def prune(self) -> int:
+        """Evict least recently used pages until the cache fits max_bytes; returns files removed"""
+        entries = []
+        total = 0
+        try:
+            for shard in os.scandir(self.directory):
+                if not shard.is_dir():
+                    continue
+                for entry in os.scandir(shard.path):
+                    try:
+                        stat = entry.stat()
+                    except OSError:
+                        continue
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+                    total += stat.st_size
+        except FileNotFoundError:
+            return 0
+
+        removed = 0
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            self._discard(path)
+            total -= size
+            removed += 1
+        if removed:
+            logger.info(f"🧹 Extraction cache evicted {removed} pages ({total} bytes kept)")
+        return removed
+
+
+# Singleton instance
+extraction_cache = ExtractionCache(
+    directory=settings.EXTRACTION_CACHE_DIR,
+    max_bytes=settings.EXTRACTION_CACHE_MAX_BYTES
+)
@@ -0,0 +1,305 @@
+"""
+PDF Extraction Executor
+Runs pdfplumber extraction off the event loop in a process (or thread) pool
+✅ Bounded number of in-flight jobs (backpressure)
+✅ Per-job timeout: a hung pool is replaced, its other jobs still finish before it is stopped
+✅ Crash isolation: a malformed PDF that kills its worker does not take down the API
+✅ Pages already decoded once are served from the on-disk extraction cache
+"""
+
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import Executor, Future, ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List, Optional, Set, Tuple
+
+import pdfplumber
+
+from app.core.config import settings
+from app.services.extraction_cache import extraction_cache, file_sha256
+from app.services.layout_extractor import page_text_and_words, read_fields, merge_page_fields
+
+logger = logging.getLogger(__name__)
+
+
+class ExtractionError(Exception):
+    """Raised when a PDF could not be extracted (timeout, worker crash or malformed file)"""
+
+
+def _read_pages(
+    file_path: str,
+    layout: bool,
+    first_page: int,
+    last_page: Optional[int],
+    content_hash: Optional[str]
+) -> Tuple[int, List[dict]]:
+    """
+    Raw pages in the slice: {"text", "width", "words"} from the extraction cache when present,
+    else from pdfplumber (and stored for the next pass)
+    Returns: (total_pages, pages)
+    """
+    cache = extraction_cache if extraction_cache.enabled else None
+    mode = "layout" if layout else "text"
+    pages = []
+    total_pages = None
+
+    if cache:
+        content_hash = content_hash or file_sha256(file_path)
+        head = cache.get_page(content_hash, mode, 0)
+        if head is not None:
+            total_pages = head["total_pages"]
+            pages = [
+                head if index == 0 else cache.get_page(content_hash, mode, index)
+                for index in range(total_pages)[first_page:last_page]
+            ]
+            if all(page is not None for page in pages):
+                return total_pages, pages
+
+    # Cache miss (or disabled): decode the PDF, reusing the pages that were cached
+    with pdfplumber.open(file_path) as pdf:
+        total_pages = len(pdf.pages)
+        indexes = range(total_pages)[first_page:last_page]
+        if len(pages) != len(indexes):
+            pages = [None] * len(indexes)
+        for position, index in enumerate(indexes):
+            if pages[position] is not None:
+                continue
+            page = pdf.pages[index]
+            if layout:
+                text, words = page_text_and_words(page)
+            else:
+                text, words = page.extract_text() or "", None
+            pages[position] = {"text": text, "width": page.width, "words": words}
+            if cache:
+                cache.put_page(content_hash, mode, index, total_pages, text, page.width, words)
+
+    return total_pages, pages
+
+
+def extract_text_with_metadata(
+    file_path: str,
+    layout_forms: Tuple[str, ...] = (),
+    first_page: int = 0,
+    last_page: Optional[int] = None,
+    content_hash: Optional[str] = None
+) -> Tuple[str, int, int, dict]:
+    """
+    Extract text from PDF and get metadata
+    Module-level so it can be pickled and run inside a worker process
+    
+    layout_forms: form types ("form_103", "form_104") whose boxes should also be read
+    by coordinates; the words are extracted once and reused for the text
+    first_page / last_page: 0-based slice of the pages to read (default: every page)
+    content_hash: sha256 of the file if known (extraction cache key; hashed here otherwise)
+    Returns: (text, total_pages, total_characters, layout) - total_pages counts the whole
+    document, text and total_characters only the pages read
+    """
+    text_parts = []
+    layout = {}
+
+    total_pages, pages = _read_pages(file_path, bool(layout_forms), first_page, last_page, content_hash)
+    for page in pages:
+        for form in layout_forms:
+            codes, rows = read_fields(page["words"], form, page["width"])
+            merge_page_fields(layout, form, codes, rows)
+        text_parts.append(page["text"])
+
+    full_text = "\n".join(text_parts)
+    total_chars = len(full_text)
+
+    return full_text, total_pages, total_chars, layout
+
+
+class ExtractionExecutor:
+    """Pluggable pool that runs PDF extraction jobs outside the event loop"""
+
+    def __init__(
+        self,
+        mode: str = "process",
+        max_workers: int = 0,
+        max_pending: int = 32,
+        timeout: float = 60.0
+    ):
+        """
+        mode: "process" (default, crash isolated) or "thread"
+        max_workers: Pool size, 0 = one worker per CPU core
+        max_pending: Jobs allowed in flight before new callers wait
+        timeout: Seconds a single job may run before it is abandoned
+        """
+        if mode not in ("process", "thread"):
+            raise ValueError(f"Unknown extraction executor mode: {mode}")
+
+        self.mode = mode
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.max_pending = max_pending
+        self.timeout = timeout
+
+        self._executor: Optional[Executor] = None
+        # Unfinished jobs of each pool, and pools waiting for them before being stopped
+        self._jobs: Dict[Executor, Set[Future]] = {}
+        self._draining: Dict[Executor, asyncio.Task] = {}
+        self._semaphore: Optional[asyncio.Semaphore] = None
+        self._in_flight = 0
+        self._waiting = 0
+        self._timeouts = 0
+        self._crashes = 0
+
+    def _get_executor(self) -> Executor:
+        """Create the pool lazily (and again after a crash)"""
+        if self._executor is None:
+            if self.mode == "process":
+                # spawn: never fork a process that is running an event loop and threads
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn")
+                )
+            else:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers,
+                    thread_name_prefix="pdf-extract"
+                )
+            logger.info(f"🧵 Extraction executor started ({self.mode}, {self.max_workers} workers)")
+        return self._executor
+
+    def _recycle(self, broken: Executor):
+        """Drop a broken pool so the next job gets a fresh one (its jobs already failed with it)"""
+        if self._executor is broken:
+            self._executor = None
+        self._jobs.pop(broken, None)
+        broken.shutdown(wait=False)
+
+    def _retire(self, hung: Executor):
+        """
+        Replace a pool whose worker is stuck on a timed-out job
+        Jobs that have not started yet are cancelled (their callers retry on the new pool),
+        running ones get their own timeout to finish before its workers are stopped, so no
+        healthy job is killed
+        """
+        if self._executor is hung:
+            self._executor = None
+        if hung in self._draining:
+            return
+        for job in list(self._jobs.get(hung, ())):
+            job.cancel()
+        task = asyncio.create_task(self._drain(hung))
+        self._draining[hung] = task
+        task.add_done_callback(lambda _: self._draining.pop(hung, None))
+
+    async def _drain(self, hung: Executor):
+        running = list(self._jobs.pop(hung, ()))
+        if running:
+            try:
+                await asyncio.wait_for(
+                    asyncio.gather(*(asyncio.wrap_future(job) for job in running), return_exceptions=True),
+                    timeout=self.timeout
+                )
+            except asyncio.TimeoutError:
+                pass  # Every caller gave up within its own timeout: the rest are stuck
+        self._stop(hung)
+
+    def _stop(self, pool: Executor):
+        """Shut a pool down, terminating its workers (still stuck on timed-out jobs)"""
+        if isinstance(pool, ProcessPoolExecutor):
+            # ProcessPoolExecutor has no public way to stop a running job
+            for process in list((getattr(pool, "_processes", None) or {}).values()):
+                process.terminate()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    async def extract(
+        self,
+        file_path: str,
+        layout_forms: Tuple[str, ...] = (),
+        first_page: int = 0,
+        last_page: Optional[int] = None,
+        content_hash: Optional[str] = None
+    ) -> Tuple[str, int, int, dict]:
+        """
+        Extract (text, total_pages, total_characters, layout) from a PDF without blocking the loop
+        first_page / last_page: 0-based slice of the pages to read (default: every page)
+        content_hash: sha256 of the file, if known (extraction cache key)
+
+        Raises:
+            ExtractionError: on timeout, worker crash or unreadable PDF
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_pending)
+
+        self._waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self._waiting -= 1
+
+        self._in_flight += 1
+        try:
+            # One retry: the pool may have been broken under us by another job's crash
+            for attempt in range(2):
+                executor = self._get_executor()
+                job = executor.submit(
+                    extract_text_with_metadata,
+                    file_path, layout_forms, first_page, last_page, content_hash
+                )
+                jobs = self._jobs.setdefault(executor, set())
+                jobs.add(job)
+                job.add_done_callback(jobs.discard)
+
+                try:
+                    return await asyncio.wait_for(asyncio.wrap_future(job), timeout=self.timeout)
+                except asyncio.TimeoutError:
+                    self._timeouts += 1
+                    logger.error(f"⏱️ Extraction timed out after {self.timeout}s: {file_path}")
+                    if not job.cancelled():
+                        self._retire(executor)  # Still running: its worker is stuck
+                    raise ExtractionError(f"PDF extraction timed out after {self.timeout:g}s")
+                except asyncio.CancelledError:
+                    if asyncio.current_task().cancelling():
+                        raise
+                    # Only the job was cancelled (its pool was retired or shut down): not this PDF's fault
+                    logger.warning(f"⚠️ Extraction job cancelled by its pool: {file_path}")
+                    if attempt == 0:
+                        continue
+                    raise ExtractionError("PDF extraction was cancelled")
+                except BrokenProcessPool:
+                    self._crashes += 1
+                    logger.error(f"💥 Extraction worker crashed on: {file_path}")
+                    self._recycle(executor)
+                    if attempt == 0:
+                        continue
+                    raise ExtractionError("PDF extraction worker crashed (malformed PDF?)")
+                except Exception as e:
+                    raise ExtractionError(f"Could not read PDF: {e}") from e
+        finally:
+            self._in_flight -= 1
+            self._semaphore.release()
+
+    def stats(self) -> dict:
+        """Current load of the executor"""
+        return {
+            "mode": self.mode,
+            "max_workers": self.max_workers,
+            "max_pending": self.max_pending,
+            "in_flight": self._in_flight,
+            "waiting": self._waiting,
+            "timeouts": self._timeouts,
+            "crashes": self._crashes
+        }
+
+    def shutdown(self):
+        """Stop the pool (called on application shutdown)"""
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        for pool, task in list(self._draining.items()):
+            task.cancel()
+            self._stop(pool)
+
+
+# Singleton instance
+extraction_executor = ExtractionExecutor(
+    mode=settings.EXTRACTION_EXECUTOR_MODE,
+    max_workers=settings.EXTRACTION_MAX_WORKERS,
+    max_pending=settings.EXTRACTION_MAX_PENDING,
+    timeout=settings.EXTRACTION_TIMEOUT_SECONDS
+)
@@ -9,27 +9,76 @@ Form 103 Parser - FINAL CORRECTED VERSION
 - Code 903: Interés por mora
 - Code 904: Multa
 - Code 999: Total Pagado
+✅ Layout mode: table rows and totals read by word coordinates (see layout_extractor)
 """
 
-import re
 from typing import Dict, List, Optional
 
+from app.services.pattern_registry import pattern_registry, PATTERNS_VERSION
+
+
+# Header field -> registry pattern name
+HEADER_PATTERNS = {
+    "codigo_verificador": "header.codigo_verificador",
+    "numero_serial": "header.numero_serial",
+    "fecha_recaudacion": "header.fecha_recaudacion",
+    "obligacion_tributaria": "header.obligacion_tributaria_103",
+    "identificacion": "header.identificacion",
+    "razon_social": "header.razon_social",
+    "periodo_fiscal": "header.periodo_fiscal",
+    "tipo_declaracion": "header.tipo_declaracion"
+}
+
+# Line item concepts that are table headers or totals
+SKIP_CONCEPTS = ['BASE IMPONIBLE', 'VALOR RETENIDO', 'TOTAL', 'SUBTOTAL', 'CODIGO', 'CONCEPTO']
+
+# Totals field -> box code (layout mode)
+TOTALS_CODES = {
+    "subtotal_operaciones_pais": "349",
+    "subtotal_retencion": "399",
+    "pagos_no_sujetos": "332",
+    "otras_retenciones_base": "3440",
+    "otras_retenciones_retenido": "3940",
+    "total_retencion": "499",
+    "total_impuesto_pagar": "902",
+    "interes_mora": "903",
+    "multa": "904",
+    "total_pagado": "999",
+}
+
+# Rows reported only in totals (otras retenciones 2,75%), never as line items
+TOTALS_ONLY_CODES = {"3440"}
+
+PAGOS_NO_SUJETOS_CONCEPTO = "Pagos de bienes y servicios no sujetos a retención (Código 332)"
+
 
 class Form103Parser:
     """Parser for Ecuadorian Form 103 - Income Tax Withholdings"""
     
-    def parse(self, text: str) -> Dict:
+    def parse(self, text: str, layout: Optional[Dict] = None) -> Dict:
         """
         Parse Form 103 and extract ALL structured data
         
+        layout: table read by coordinates ({"codes": {...}, "rows": [...]});
+        when given it replaces the line item / totals regexes (header still comes from the text)
+        
         Returns:
             Dictionary with header, line items, and totals
         """
+        if layout:
+            line_items = self._layout_line_items(layout)
+            totals = self._layout_totals(layout["codes"])
+        else:
+            line_items = self._extract_line_items(text)
+            totals = self._extract_totals(text)
+        
         result = {
             "form_type": "form_103",
+            "pattern_version": PATTERNS_VERSION,
+            "extraction_mode": "layout" if layout else "regex",
             "header": self._extract_header(text),
-            "line_items": self._extract_line_items(text),
-            "totals": self._extract_totals(text)
+            "line_items": line_items,
+            "totals": totals
         }
         
         return result
@@ -38,19 +87,8 @@ class Form103Parser:
         """Extract header information"""
         header = {}
         
-        patterns = {
-            "codigo_verificador": r"CÓDIGO VERIFICADOR\s+([A-Z0-9]+)",
-            "numero_serial": r"NÚMERO SERIAL\s+(\d+)",
-            "fecha_recaudacion": r"FECHA RECAUDACIÓN\s+(\d{2}-\d{2}-\d{4})",
-            "obligacion_tributaria": r"Obligación Tributaria:\s+(\d+\s*-\s*[A-ZÁÉÍÓÚÑ\s]+)",
-            "identificacion": r"Identificación:\s+(\d+)",
-            "razon_social": r"Razón Social:\s+([A-ZÁÉÍÓÚÑ\s\.]+?)(?:\n|Período)",
-            "periodo_fiscal": r"Período Fiscal:\s+([A-Z]+)\s+(\d{4})",
-            "tipo_declaracion": r"Tipo Declaración:\s+([A-Z]+)"
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        for key, pattern_name in HEADER_PATTERNS.items():
+            match = pattern_registry.search(pattern_name, text)
             if match:
                 if key == "periodo_fiscal":
                     header["periodo_mes"] = match.group(1).strip()
@@ -65,15 +103,11 @@ class Form103Parser:
         line_items = []
         
         # Pattern to match: "Description CODE1 VALUE1 CODE2 VALUE2"
-        pattern = r'([A-Za-zÁÉÍÓÚáéíóúñÑ\s\(\)\-,/\.]+?)\s+(\d{3,4})\s+([\d\.,]+)\s+(\d{3,4})\s+([\d\.,]+)'
-        
-        for match in re.finditer(pattern, text):
+        for match in pattern_registry.finditer("103.line_item", text):
             concepto = match.group(1).strip()
             
             # Skip headers and totals
-            if any(skip in concepto.upper() for skip in [
-                'BASE IMPONIBLE', 'VALOR RETENIDO', 'TOTAL', 'SUBTOTAL', 'CODIGO', 'CONCEPTO'
-            ]):
+            if any(skip in concepto.upper() for skip in SKIP_CONCEPTS):
                 continue
             
             base_str = match.group(3).replace(',', '')
@@ -94,13 +128,12 @@ class Form103Parser:
                 continue
         
         # ✅ SPECIAL: Extract Code 332 (single value, no retention pair)
-        code_332_pattern = r"Pagos de bienes y servicios no sujetos a retención.*?332\s+([\d\.,]+)"
-        match_332 = re.search(code_332_pattern, text, re.IGNORECASE | re.DOTALL)
+        match_332 = pattern_registry.search("103.pagos_no_sujetos", text)
         if match_332:
             try:
                 value_332 = float(match_332.group(1).replace(',', ''))
                 line_items.append({
-                    "concepto": "Pagos de bienes y servicios no sujetos a retención (Código 332)",
+                    "concepto": PAGOS_NO_SUJETOS_CONCEPTO,
                     "codigo_base": "332",
                     "base_imponible": value_332,
                     "codigo_retencion": "N/A",
@@ -111,6 +144,56 @@ class Form103Parser:
         
         return line_items
     
+    def _layout_line_items(self, layout: Dict) -> List[Dict]:
+        """Line items from table rows holding a base and a retained box"""
+        line_items = []
+        
+        for concepto, cells in layout["rows"]:
+            if len(cells) != 2 or any(skip in concepto.upper() for skip in SKIP_CONCEPTS):
+                continue
+            (codigo_base, base_str), (codigo_retencion, valor_str) = cells
+            if codigo_base in TOTALS_ONLY_CODES:
+                continue
+            base_imponible = self._to_float(base_str)
+            valor_retenido = self._to_float(valor_str)
+            if base_imponible is None or valor_retenido is None:
+                continue
+            
+            line_items.append({
+                "concepto": concepto,
+                "codigo_base": codigo_base,
+                "base_imponible": base_imponible,
+                "codigo_retencion": codigo_retencion,
+                "valor_retenido": valor_retenido
+            })
+        
+        # ✅ SPECIAL: Code 332 (single value, no retention pair)
+        value_332 = self._to_float(layout["codes"].get("332", ""))
+        if value_332 is not None:
+            line_items.append({
+                "concepto": PAGOS_NO_SUJETOS_CONCEPTO,
+                "codigo_base": "332",
+                "base_imponible": value_332,
+                "codigo_retencion": "N/A",
+                "valor_retenido": 0.0
+            })
+        
+        return line_items
+    
+    def _layout_totals(self, codes: Dict[str, str]) -> Dict:
+        """Summary totals straight from the box codes (0.0 when missing)"""
+        return {
+            field_name: self._to_float(codes.get(code, "")) or 0.0
+            for field_name, code in TOTALS_CODES.items()
+        }
+    
+    def _to_float(self, value_str: str) -> Optional[float]:
+        """Parse a box amount such as 1,234.56 (None when it is not a number)"""
+        try:
+            return float(value_str.replace(',', ''))
+        except ValueError:
+            return None
+    
     def _extract_totals(self, text: str) -> Dict:
         """
         Extract summary totals from the form
@@ -120,8 +203,7 @@ class Form103Parser:
         
         # ✅ Code 349/399: SUBTOTAL OPERACIONES EFECTUADAS EN EL PAÍS
         # Pattern: "SUBTOTAL OPERACIONES EFECTUADAS EN EL PAÍS  349  27710.90  399  374.18"
-        subtotal_pattern = r"SUBTOTAL OPERACIONES EFECTUADAS EN EL PAÍS\s+349\s+([\d\.,]+)\s+399\s+([\d\.,]+)"
-        match = re.search(subtotal_pattern, text, re.IGNORECASE)
+        match = pattern_registry.search("103.subtotal", text)
         if match:
             totals["subtotal_operaciones_pais"] = float(match.group(1).replace(',', ''))
             totals["subtotal_retencion"] = float(match.group(2).replace(',', ''))
@@ -130,8 +212,7 @@ class Form103Parser:
             totals["subtotal_retencion"] = 0.0
         
         # ✅ Code 332: Pagos no sujetos a retención (appears as single value)
-        code_332_pattern = r"Pagos de bienes y servicios no sujetos a retención.*?332\s+([\d\.,]+)"
-        match_332 = re.search(code_332_pattern, text, re.IGNORECASE | re.DOTALL)
+        match_332 = pattern_registry.search("103.pagos_no_sujetos", text)
         if match_332:
             totals["pagos_no_sujetos"] = float(match_332.group(1).replace(',', ''))
         else:
@@ -139,8 +220,7 @@ class Form103Parser:
         
         # ✅ Code 3440/3940: Otras retenciones - Aplicables el 2,75%
         # Pattern: ". Aplicables el 2,75%  3440  153.40  3940  4.22"
-        otras_ret_pattern = r"Aplicables\s+el\s+2,75%\s+3440\s+([\d\.,]+)\s+3940\s+([\d\.,]+)"
-        match_otras = re.search(otras_ret_pattern, text, re.IGNORECASE)
+        match_otras = pattern_registry.search("103.otras_retenciones", text)
         if match_otras:
             totals["otras_retenciones_base"] = float(match_otras.group(1).replace(',', ''))
             totals["otras_retenciones_retenido"] = float(match_otras.group(2).replace(',', ''))
@@ -149,40 +229,35 @@ class Form103Parser:
             totals["otras_retenciones_retenido"] = 0.0
         
         # Total retención (Code 499)
-        total_ret_pattern = r"TOTAL DE RETENCIÓN DE IMPUESTO A LA RENTA.*?499\s+([\d\.,]+)"
-        match = re.search(total_ret_pattern, text, re.IGNORECASE | re.DOTALL)
+        match = pattern_registry.search("103.total_retencion", text)
         if match:
             totals["total_retencion"] = float(match.group(1).replace(',', ''))
         else:
             totals["total_retencion"] = 0.0
         
         # Total impuesto a pagar (Code 902)
-        total_imp_pattern = r"TOTAL IMPUESTO A PAGAR.*?902\s+([\d\.,]+)"
-        match = re.search(total_imp_pattern, text, re.IGNORECASE | re.DOTALL)
+        match = pattern_registry.search("103.total_impuesto_pagar", text)
         if match:
             totals["total_impuesto_pagar"] = float(match.group(1).replace(',', ''))
         else:
             totals["total_impuesto_pagar"] = 0.0
         
         # ✅ Code 903: Interés por mora
-        interes_pattern = r"Interés\s+por\s+mora\s+903\s+([\d\.,]+)"
-        match = re.search(interes_pattern, text, re.IGNORECASE)
+        match = pattern_registry.search("103.interes_mora", text)
         if match:
             totals["interes_mora"] = float(match.group(1).replace(',', ''))
         else:
             totals["interes_mora"] = 0.0
         
         # ✅ Code 904: Multa
-        multa_pattern = r"Multa\s+904\s+([\d\.,]+)"
-        match = re.search(multa_pattern, text, re.IGNORECASE)
+        match = pattern_registry.search("103.multa", text)
         if match:
             totals["multa"] = float(match.group(1).replace(',', ''))
         else:
             totals["multa"] = 0.0
         
         # Total pagado (Code 999)
-        total_pag_pattern = r"TOTAL PAGADO\s+999\s+([\d\.,]+)"
-        match = re.search(total_pag_pattern, text, re.IGNORECASE)
+        match = pattern_registry.search("103.total_pagado", text)
         if match:
             totals["total_pagado"] = float(match.group(1).replace(',', ''))
         else:
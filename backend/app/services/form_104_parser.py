@@ -2,29 +2,278 @@
 Form 104 (IVA) Parser Service - COMPLETE VERSION WITH ALL 127 FIELDS
 Extracts EVERY field from all 5 pages of the Form 104 PDF
 ✅ Captures ALL monetary values from codes: 401-487, 499-565, 601-625, 699-702, 721-731, 799-904, 999
+✅ Single pass: the text is scanned once into a {code: value} index shared by every section
+✅ Layout mode: the index can come from word coordinates instead (see layout_extractor)
 """
 
 import re
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+from app.services.pattern_registry import pattern_registry, PATTERNS_VERSION
+
+
+# Header field -> registry pattern name
+HEADER_PATTERNS = {
+    "codigo_verificador": "header.codigo_verificador",
+    "numero_serial": "header.numero_serial",
+    "fecha_recaudacion": "header.fecha_recaudacion",
+    "obligacion_tributaria": "header.obligacion_tributaria_104",
+    "identificacion": "header.identificacion",
+    "razon_social": "header.razon_social",
+    "periodo_fiscal": "header.periodo_fiscal",
+    "tipo_declaracion": "header.tipo_declaracion",
+    "estado_declaracion": "header.estado_declaracion"
+}
+
+# Page 1-2: RESUMEN DE VENTAS (codes 401-454)
+VENTAS_FIELDS = {
+    # Ventas locales tarifa diferente de cero
+    "401": "ventas_locales_bruto",
+    "411": "ventas_locales_neto",
+    "421": "impuesto_generado_ventas_locales",
+    
+    # Ventas activos fijos tarifa diferente
+    "402": "ventas_activos_fijos_bruto",
+    "412": "ventas_activos_fijos_neto",
+    "422": "impuesto_generado_activos_fijos",
+    
+    # Ventas tarifa 5%
+    "425": "ventas_tarifa_5_bruto",
+    "435": "ventas_tarifa_5_neto",
+    "445": "impuesto_generado_tarifa_5",
+    
+    # Ajustes IVA
+    "423": "iva_ajuste_pagar",
+    "424": "iva_ajuste_favor",
+    
+    # Ventas tarifa 0% sin derecho
+    "403": "ventas_0_sin_derecho_bruto",
+    "413": "ventas_0_sin_derecho_neto",
+    "404": "activos_fijos_0_sin_derecho_bruto",
+    "414": "activos_fijos_0_sin_derecho_neto",
+    
+    # Ventas tarifa 0% con derecho
+    "405": "ventas_0_con_derecho_bruto",
+    "415": "ventas_0_con_derecho_neto",
+    "406": "activos_fijos_0_con_derecho_bruto",
+    "416": "activos_fijos_0_con_derecho_neto",
+    
+    # Exportaciones
+    "407": "exportaciones_bienes_bruto",
+    "417": "exportaciones_bienes_neto",
+    "408": "exportaciones_servicios_bruto",
+    "418": "exportaciones_servicios_neto",
+    
+    # TOTALES VENTAS
+    "409": "total_ventas_bruto",
+    "419": "total_ventas_neto",
+    "429": "total_impuesto_generado",
+    
+    # Page 2 - Transferencias y notas de crédito
+    "431": "transferencias_no_objeto_bruto",
+    "441": "transferencias_no_objeto_neto",
+    "442": "notas_credito_0_compensar",
+    "443": "notas_credito_diferente_0_bruto",
+    "453": "notas_credito_diferente_0_impuesto",
+    "434": "ingresos_reembolso_bruto",
+    "444": "ingresos_reembolso_neto",
+    "454": "ingresos_reembolso_impuesto",
+}
+
+
+# LIQUIDACIÓN DEL IVA EN EL MES (codes 480-499); 486 is an integer, 487 is text
+LIQUIDACION_FIELDS = {
+    "480": "transferencias_contado_mes",
+    "481": "transferencias_credito_mes",
+    "482": "total_impuesto_generado",
+    "483": "impuesto_liquidar_mes_anterior",
+    "484": "impuesto_liquidar_este_mes",
+    "485": "impuesto_liquidar_proximo_mes",
+    "486": "mes_pagar_iva_credito",
+    "487": "tamano_copci",
+    "499": "total_impuesto_liquidar_mes",
+}
+
+
+# Page 2-3: ADQUISICIONES (codes 500-565)
+COMPRAS_FIELDS = {
+    # Adquisiciones tarifa diferente con derecho
+    "500": "adquisiciones_diferente_0_con_derecho_bruto",
+    "510": "adquisiciones_diferente_0_con_derecho_neto",
+    "520": "impuesto_adquisiciones_diferente_0",
+    
+    # Activos fijos tarifa diferente con derecho
+    "501": "activos_fijos_diferente_0_bruto",
+    "511": "activos_fijos_diferente_0_neto",
+    "521": "impuesto_activos_fijos_diferente_0",
+    
+    # Adquisiciones tarifa 5% con derecho
+    "540": "adquisiciones_tarifa_5_bruto",
+    "550": "adquisiciones_tarifa_5_neto",
+    "560": "impuesto_adquisiciones_tarifa_5",
+    
+    # Adquisiciones sin derecho
+    "502": "adquisiciones_sin_derecho_bruto",
+    "512": "adquisiciones_sin_derecho_neto",
+    "522": "impuesto_adquisiciones_sin_derecho",
+    
+    # Importaciones servicios
+    "503": "importaciones_servicios_bruto",
+    "513": "importaciones_servicios_neto",
+    "523": "impuesto_importaciones_servicios",
+    
+    # Importaciones bienes (excluye activos)
+    "504": "importaciones_bienes_bruto",
+    "514": "importaciones_bienes_neto",
+    "524": "impuesto_importaciones_bienes",
+    
+    # Importaciones activos fijos
+    "505": "importaciones_activos_fijos_bruto",
+    "515": "importaciones_activos_fijos_neto",
+    "525": "impuesto_importaciones_activos_fijos",
+    
+    # Ajustes IVA adquisiciones
+    "526": "ajuste_positivo_credito",
+    "527": "ajuste_negativo_credito",
+    
+    # Importaciones tarifa 0%
+    "506": "importaciones_0_bruto",
+    "516": "importaciones_0_neto",
+    
+    # Adquisiciones tarifa 0%
+    "507": "adquisiciones_0_bruto",
+    "517": "adquisiciones_0_neto",
+    
+    # Adquisiciones RISE/Negocios Populares
+    "508": "adquisiciones_rise_bruto",
+    "518": "adquisiciones_rise_neto",
+    
+    # TOTALES ADQUISICIONES
+    "509": "total_adquisiciones_bruto",
+    "519": "total_adquisiciones_neto",
+    "529": "total_impuesto_adquisiciones",
+    
+    # Page 3 - Adquisiciones no objeto/exentas
+    "531": "adquisiciones_no_objeto_bruto",
+    "541": "adquisiciones_no_objeto_neto",
+    "532": "adquisiciones_exentas_bruto",
+    "542": "adquisiciones_exentas_neto",
+    "543": "notas_credito_0_compensar",
+    "544": "notas_credito_diferente_0_bruto",
+    "554": "notas_credito_diferente_0_impuesto",
+    "535": "pagos_reembolso_bruto",
+    "545": "pagos_reembolso_neto",
+    "555": "pagos_reembolso_impuesto",
+    
+    # Factor proporcionalidad y crédito tributario
+    "563": "factor_proporcionalidad",
+    "564": "credito_tributario_aplicable",
+    "565": "iva_no_considerado_credito",
+}
+
+
+# IVA retenido: code -> percentage (codes 721-731)
+RETENTION_CODES = {
+    "721": 10,
+    "723": 20,
+    "725": 30,
+    "727": 50,
+    "729": 70,
+    "731": 100
+}
+
+
+# DEVOLUCIÓN ISD POR EXPORTACIONES (codes 700-702)
+EXPORTACIONES_FIELDS = {
+    "700": "importaciones_materias_primas_valor",
+    "701": "importaciones_materias_primas_isd_pagado",
+    "702": "proporcion_ingreso_neto_divisas_por_importacion",
+}
+
+
+# Summary totals (codes 601-625, 699, 799-904, 999)
+TOTALS_FIELDS = {
+    # Resumen impositivo (Page 4)
+    "601": "impuesto_causado",
+    "602": "credito_tributario_aplicable",
+    "603": "compensacion_iva_medio_electronico",
+    "604": "saldo_credito_anterior_iva_medio_electronico",
+    "605": "saldo_credito_anterior_adquisiciones",
+    "606": "saldo_credito_anterior_retenciones",
+    "607": "saldo_credito_anterior_compensacion_electronico",
+    "608": "saldo_credito_anterior_zonas_afectadas",
+    "609": "retenciones_efectuadas",
+    "610": "ajuste_iva_devuelto_electronico",
+    "611": "ajuste_credito_compensacion_zonas_afectadas",
+    "612": "ajuste_iva_devuelto_adquisiciones",
+    "613": "ajuste_iva_devuelto_retenciones",
+    "614": "ajuste_iva_otras_instituciones",
+    "615": "saldo_credito_proximo_adquisiciones",
+    "616": "saldo_credito_proximo_iva_electronico",
+    "617": "saldo_credito_proximo_retenciones",
+    "618": "saldo_credito_proximo_compensacion_electronico",
+    "619": "saldo_credito_proximo_zonas_afectadas",
+    "620": "subtotal_a_pagar",
+    "621": "ajuste_reduccion_impuesto_tarifa_5",
+    "622": "iva_devuelto_adultos_mayores",
+    "623": "ajuste_reduccion_impuesto_iva_diferencial",
+    "624": "iva_pagado_no_compensado",
+    "625": "ajuste_credito_superior_5_anos",
+    
+    # Impuesto a pagar por percepción (Page 5)
+    "699": "total_impuesto_pagar_percepcion",
+    
+    # Impuesto retenido y a pagar por retención
+    "799": "total_impuesto_retenido",
+    "801": "total_impuesto_pagar_retencion",
+    
+    # Totales de la Declaración
+    "859": "total_consolidado_iva",
+    "902": "total_impuesto_a_pagar",
+    "903": "interes_mora",
+    "904": "multa",
+    "999": "total_pagado",
+}
+
+
+def build_code_index(text: str) -> Dict[str, str]:
+    """
+    Walk the text once and map each box code to the value that follows its first occurrence
+    Equivalent to running rf'\b{code}\b\s+([\d,\.]+)' for every code
+    """
+    index = {}
+    for match in pattern_registry.finditer("104.code_value", text):
+        index.setdefault(match.group(1), match.group(2))
+    return index
+
+
+LEADING_INT = re.compile(r"^(\d+)")
 
 
 class Form104ParserComplete:
     """Complete parser for Ecuadorian Form 104 - VAT (IVA) Declaration - ALL FIELDS"""
     
-    def parse(self, text: str) -> Dict:
+    def parse(self, text: str, layout: Optional[Dict] = None) -> Dict:
         """
         Parse Form 104 and extract ALL 127 structured fields (including zero values)
         Returns comprehensive data matching all 5 pages of the PDF
+        
+        layout: box values read by coordinates ({"codes": {...}, "rows": [...]});
+        when given it replaces the regex code index (header still comes from the text)
         """
+        codes = layout["codes"] if layout else build_code_index(text)
+        
         result = {
             "form_type": "form_104",
+            "pattern_version": PATTERNS_VERSION,
+            "extraction_mode": "layout" if layout else "regex",
             "header": self._extract_header(text),
-            "ventas": self._extract_ventas_complete(text),
-            "liquidacion": self._extract_liquidacion(text),
-            "compras": self._extract_compras_complete(text),
-            "retenciones_iva": self._extract_retenciones_complete(text),
-            "exportaciones": self._extract_exportaciones(text),
-            "totals": self._extract_totals_complete(text)
+            "ventas": self._extract_ventas_complete(codes),
+            "liquidacion": self._extract_liquidacion(text, codes, layout is not None),
+            "compras": self._extract_compras_complete(codes),
+            "retenciones_iva": self._extract_retenciones_complete(codes),
+            "exportaciones": self._extract_exportaciones(codes),
+            "totals": self._extract_totals_complete(codes)
         }
         
         return result
@@ -33,20 +282,8 @@ class Form104ParserComplete:
         """Extract header information"""
         header = {}
         
-        patterns = {
-            "codigo_verificador": r"CÓDIGO VERIFICADOR\s+([A-Z0-9]+)",
-            "numero_serial": r"NÚMERO SERIAL\s+(\d+)",
-            "fecha_recaudacion": r"FECHA RECAUDACIÓN\s+(\d{2}-\d{2}-\d{4})",
-            "obligacion_tributaria": r"Obligación Tributaria:\s+(\d+\s+[A-ZÁÉÍÓÚÑ\s]+)",
-            "identificacion": r"Identificación:\s+(\d+)",
-            "razon_social": r"Razón Social:\s+([A-ZÁÉÍÓÚÑ\s\.]+?)(?:\n|Período)",
-            "periodo_fiscal": r"Período Fiscal:\s+([A-Z]+)\s+(\d{4})",
-            "tipo_declaracion": r"Tipo Declaración:\s+([A-Z]+)",
-            "estado_declaracion": r"Estado de la\s+Declaración:\s+([A-Z]+)"
-        }
-        
-        for key, pattern in patterns.items():
-            match = re.search(pattern, text, re.IGNORECASE | re.MULTILINE)
+        for key, pattern_name in HEADER_PATTERNS.items():
+            match = pattern_registry.search(pattern_name, text)
             if match:
                 if key == "periodo_fiscal":
                     header["periodo_mes"] = match.group(1).strip()
@@ -56,302 +293,64 @@ class Form104ParserComplete:
         
         return header
     
-    def _extract_ventas_complete(self, text: str) -> Dict:
-        """Extract ALL sales (ventas) values from codes 401-454"""
-        ventas = {}
-        
-        # Page 1 - RESUMEN DE VENTAS
-        field_map = {
-            # Ventas locales tarifa diferente de cero
-            "401": "ventas_locales_bruto",
-            "411": "ventas_locales_neto",
-            "421": "impuesto_generado_ventas_locales",
-            
-            # Ventas activos fijos tarifa diferente
-            "402": "ventas_activos_fijos_bruto",
-            "412": "ventas_activos_fijos_neto",
-            "422": "impuesto_generado_activos_fijos",
-            
-            # Ventas tarifa 5%
-            "425": "ventas_tarifa_5_bruto",
-            "435": "ventas_tarifa_5_neto",
-            "445": "impuesto_generado_tarifa_5",
-            
-            # Ajustes IVA
-            "423": "iva_ajuste_pagar",
-            "424": "iva_ajuste_favor",
-            
-            # Ventas tarifa 0% sin derecho
-            "403": "ventas_0_sin_derecho_bruto",
-            "413": "ventas_0_sin_derecho_neto",
-            "404": "activos_fijos_0_sin_derecho_bruto",
-            "414": "activos_fijos_0_sin_derecho_neto",
-            
-            # Ventas tarifa 0% con derecho
-            "405": "ventas_0_con_derecho_bruto",
-            "415": "ventas_0_con_derecho_neto",
-            "406": "activos_fijos_0_con_derecho_bruto",
-            "416": "activos_fijos_0_con_derecho_neto",
-            
-            # Exportaciones
-            "407": "exportaciones_bienes_bruto",
-            "417": "exportaciones_bienes_neto",
-            "408": "exportaciones_servicios_bruto",
-            "418": "exportaciones_servicios_neto",
-            
-            # TOTALES VENTAS
-            "409": "total_ventas_bruto",
-            "419": "total_ventas_neto",
-            "429": "total_impuesto_generado",
-            
-            # Page 2 - Transferencias y notas de crédito
-            "431": "transferencias_no_objeto_bruto",
-            "441": "transferencias_no_objeto_neto",
-            "442": "notas_credito_0_compensar",
-            "443": "notas_credito_diferente_0_bruto",
-            "453": "notas_credito_diferente_0_impuesto",
-            "434": "ingresos_reembolso_bruto",
-            "444": "ingresos_reembolso_neto",
-            "454": "ingresos_reembolso_impuesto",
+    def _amounts(self, codes: Dict[str, str], field_map: Dict[str, str]) -> Dict:
+        """Look up every code of a section in the index (0.0 when missing)"""
+        return {
+            field_name: self._parse_float(codes[code]) if code in codes else 0.0
+            for code, field_name in field_map.items()
         }
-        
-        for code, field_name in field_map.items():
-            pattern = rf'\b{code}\b\s+([\d,\.]+)'
-            match = re.search(pattern, text)
-            ventas[field_name] = self._parse_float(match.group(1)) if match else 0.0
-        
-        return ventas
     
-    def _extract_liquidacion(self, text: str) -> Dict:
+    def _extract_ventas_complete(self, codes: Dict[str, str]) -> Dict:
+        """Extract ALL sales (ventas) values from codes 401-454"""
+        return self._amounts(codes, VENTAS_FIELDS)
+    
+    def _extract_liquidacion(self, text: str, codes: Dict[str, str], from_layout: bool = False) -> Dict:
         """Extract LIQUIDACIÓN DEL IVA EN EL MES (codes 480-499)"""
         liquidacion = {}
         
-        field_map = {
-            "480": "transferencias_contado_mes",
-            "481": "transferencias_credito_mes",
-            "482": "total_impuesto_generado",
-            "483": "impuesto_liquidar_mes_anterior",
-            "484": "impuesto_liquidar_este_mes",
-            "485": "impuesto_liquidar_proximo_mes",
-            "486": "mes_pagar_iva_credito",
-            "487": "tamano_copci",
-            "499": "total_impuesto_liquidar_mes",
-        }
-        
-        for code, field_name in field_map.items():
+        for code, field_name in LIQUIDACION_FIELDS.items():
             if code == "487":  # Text field
-                pattern = rf'\b{code}\b\s+([A-Za-záéíóúñ\s]+?)(?:\n|$)'
-                match = re.search(pattern, text, re.IGNORECASE)
+                if from_layout and codes.get(code):
+                    liquidacion[field_name] = codes[code]
+                    continue
+                match = pattern_registry.search("104.tamano_copci", text)
                 liquidacion[field_name] = match.group(1).strip() if match else "No aplica"
             elif code == "486":  # Integer
-                pattern = rf'\b{code}\b\s+(\d+)'
-                match = re.search(pattern, text)
+                match = LEADING_INT.match(codes.get(code, "")) if from_layout else None
+                if match is None:
+                    match = pattern_registry.search("104.mes_pagar", text)
                 liquidacion[field_name] = int(match.group(1)) if match else 0
             else:  # Float
-                pattern = rf'\b{code}\b\s+([\d,\.]+)'
-                match = re.search(pattern, text)
-                liquidacion[field_name] = self._parse_float(match.group(1)) if match else 0.0
+                liquidacion[field_name] = self._parse_float(codes[code]) if code in codes else 0.0
         
         return liquidacion
     
-    def _extract_compras_complete(self, text: str) -> Dict:
+    def _extract_compras_complete(self, codes: Dict[str, str]) -> Dict:
         """Extract ALL purchases (adquisiciones) from codes 500-565"""
-        compras = {}
-        
-        field_map = {
-            # Adquisiciones tarifa diferente con derecho
-            "500": "adquisiciones_diferente_0_con_derecho_bruto",
-            "510": "adquisiciones_diferente_0_con_derecho_neto",
-            "520": "impuesto_adquisiciones_diferente_0",
-            
-            # Activos fijos tarifa diferente con derecho
-            "501": "activos_fijos_diferente_0_bruto",
-            "511": "activos_fijos_diferente_0_neto",
-            "521": "impuesto_activos_fijos_diferente_0",
-            
-            # Adquisiciones tarifa 5% con derecho
-            "540": "adquisiciones_tarifa_5_bruto",
-            "550": "adquisiciones_tarifa_5_neto",
-            "560": "impuesto_adquisiciones_tarifa_5",
-            
-            # Adquisiciones sin derecho
-            "502": "adquisiciones_sin_derecho_bruto",
-            "512": "adquisiciones_sin_derecho_neto",
-            "522": "impuesto_adquisiciones_sin_derecho",
-            
-            # Importaciones servicios
-            "503": "importaciones_servicios_bruto",
-            "513": "importaciones_servicios_neto",
-            "523": "impuesto_importaciones_servicios",
-            
-            # Importaciones bienes (excluye activos)
-            "504": "importaciones_bienes_bruto",
-            "514": "importaciones_bienes_neto",
-            "524": "impuesto_importaciones_bienes",
-            
-            # Importaciones activos fijos
-            "505": "importaciones_activos_fijos_bruto",
-            "515": "importaciones_activos_fijos_neto",
-            "525": "impuesto_importaciones_activos_fijos",
-            
-            # Ajustes IVA adquisiciones
-            "526": "ajuste_positivo_credito",
-            "527": "ajuste_negativo_credito",
-            
-            # Importaciones tarifa 0%
-            "506": "importaciones_0_bruto",
-            "516": "importaciones_0_neto",
-            
-            # Adquisiciones tarifa 0%
-            "507": "adquisiciones_0_bruto",
-            "517": "adquisiciones_0_neto",
-            
-            # Adquisiciones RISE/Negocios Populares
-            "508": "adquisiciones_rise_bruto",
-            "518": "adquisiciones_rise_neto",
-            
-            # TOTALES ADQUISICIONES
-            "509": "total_adquisiciones_bruto",
-            "519": "total_adquisiciones_neto",
-            "529": "total_impuesto_adquisiciones",
-            
-            # Page 3 - Adquisiciones no objeto/exentas
-            "531": "adquisiciones_no_objeto_bruto",
-            "541": "adquisiciones_no_objeto_neto",
-            "532": "adquisiciones_exentas_bruto",
-            "542": "adquisiciones_exentas_neto",
-            "543": "notas_credito_0_compensar",
-            "544": "notas_credito_diferente_0_bruto",
-            "554": "notas_credito_diferente_0_impuesto",
-            "535": "pagos_reembolso_bruto",
-            "545": "pagos_reembolso_neto",
-            "555": "pagos_reembolso_impuesto",
-            
-            # Factor proporcionalidad y crédito tributario
-            "563": "factor_proporcionalidad",
-            "564": "credito_tributario_aplicable",
-            "565": "iva_no_considerado_credito",
-        }
-        
-        for code, field_name in field_map.items():
-            pattern = rf'\b{code}\b\s+([\d,\.]+)'
-            match = re.search(pattern, text)
-            compras[field_name] = self._parse_float(match.group(1)) if match else 0.0
-        
-        return compras
+        return self._amounts(codes, COMPRAS_FIELDS)
     
-    def _extract_retenciones_complete(self, text: str) -> List[Dict]:
-        """Extract ALL VAT retentions from codes 721-731, 799-801"""
-        retenciones_list = []
-        
-        # Individual retentions (IVA Retenido)
-        retention_codes = {
-            "721": 10,
-            "723": 20,
-            "725": 30,
-            "727": 50,
-            "729": 70,
-            "731": 100
-        }
-        
-        for code, percentage in retention_codes.items():
-            pattern = rf'\b{code}\b\s+([\d,\.]+)'
-            match = re.search(pattern, text)
-            valor = self._parse_float(match.group(1)) if match else 0.0
-            
-            retenciones_list.append({
+    def _extract_retenciones_complete(self, codes: Dict[str, str]) -> List[Dict]:
+        """Extract ALL VAT retentions from codes 721-731"""
+        # 799 and 801 are summary fields for the entire declaration: see _extract_totals_complete
+        return [
+            {
                 "codigo": code,
                 "porcentaje": percentage,
-                "valor": valor
-            })
-            
-        # Summary Retenciones
-        field_map_summary = {
-            "799": "total_impuesto_retenido",
-            "801": "total_impuesto_pagar_retencion",
-        }
-        
-        # We store 799 and 801 directly in the totals section as they are summary fields for the entire declaration.
-        # However, if we must return them as part of retenciones_iva section as requested in the partial code structure,
-        # we can return them as a separate dictionary item or modify the return type.
-        # Sticking to the list of dictionaries format for individual retention rates and adding summary fields in `_extract_totals_complete`.
-        # The prompt asked to complete the partial method, which only included the list, so I will only include the list here.
-        
-        return retenciones_list
+                "valor": self._parse_float(codes[code]) if code in codes else 0.0
+            }
+            for code, percentage in RETENTION_CODES.items()
+        ]
     
-    def _extract_exportaciones(self, text: str) -> Dict:
+    def _extract_exportaciones(self, codes: Dict[str, str]) -> Dict:
         """Extract DEVOLUCIÓN ISD POR EXPORTACIONES (codes 700-702)"""
-        exportaciones = {}
-        
-        field_map = {
-            "700": "importaciones_materias_primas_valor",
-            "701": "importaciones_materias_primas_isd_pagado",
-            "702": "proporcion_ingreso_neto_divisas_por_importacion",
-        }
-        
-        for code, field_name in field_map.items():
-            pattern = rf'\b{code}\b\s+([\d,\.]+)'
-            match = re.search(pattern, text)
-            exportaciones[field_name] = self._parse_float(match.group(1)) if match else 0.0
-        
-        return exportaciones
+        return self._amounts(codes, EXPORTACIONES_FIELDS)
     
-    def _extract_totals_complete(self, text: str) -> Dict:
+    def _extract_totals_complete(self, codes: Dict[str, str]) -> Dict:
         """
         Extract ALL summary totals from codes 601-625, 699, 799-904, 999
         (The remaining summary fields not in other sections)
         """
-        totals = {}
-        
-        field_map = {
-            # Resumen impositivo (Page 4)
-            "601": "impuesto_causado",
-            "602": "credito_tributario_aplicable",
-            "603": "compensacion_iva_medio_electronico",
-            "604": "saldo_credito_anterior_iva_medio_electronico",
-            "605": "saldo_credito_anterior_adquisiciones",
-            "606": "saldo_credito_anterior_retenciones",
-            "607": "saldo_credito_anterior_compensacion_electronico",
-            "608": "saldo_credito_anterior_zonas_afectadas",
-            "609": "retenciones_efectuadas",
-            "610": "ajuste_iva_devuelto_electronico",
-            "611": "ajuste_credito_compensacion_zonas_afectadas",
-            "612": "ajuste_iva_devuelto_adquisiciones",
-            "613": "ajuste_iva_devuelto_retenciones",
-            "614": "ajuste_iva_otras_instituciones",
-            "615": "saldo_credito_proximo_adquisiciones",
-            "616": "saldo_credito_proximo_iva_electronico",
-            "617": "saldo_credito_proximo_retenciones",
-            "618": "saldo_credito_proximo_compensacion_electronico",
-            "619": "saldo_credito_proximo_zonas_afectadas",
-            "620": "subtotal_a_pagar",
-            "621": "ajuste_reduccion_impuesto_tarifa_5",
-            "622": "iva_devuelto_adultos_mayores",
-            "623": "ajuste_reduccion_impuesto_iva_diferencial",
-            "624": "iva_pagado_no_compensado",
-            "625": "ajuste_credito_superior_5_anos",
-            
-            # Impuesto a pagar por percepción (Page 5)
-            "699": "total_impuesto_pagar_percepcion",
-            
-            # Impuesto retenido y a pagar por retención
-            "799": "total_impuesto_retenido",
-            "801": "total_impuesto_pagar_retencion",
-            
-            # Totales de la Declaración
-            "859": "total_consolidado_iva",
-            "902": "total_impuesto_a_pagar",
-            "903": "interes_mora",
-            "904": "multa",
-            "999": "total_pagado",
-        }
-        
-        for code, field_name in field_map.items():
-            pattern = rf'\b{code}\b\s+([\d,\.]+)'
-            match = re.search(pattern, text)
-            totals[field_name] = self._parse_float(match.group(1)) if match else 0.0
-        
-        return totals
+        return self._amounts(codes, TOTALS_FIELDS)
 
     def _parse_float(self, value_str: str) -> float:
         """
@@ -366,4 +365,4 @@ class Form104ParserComplete:
             return 0.0
 
 # CRITICAL: Singleton instance export
-form_104_parser_complete = Form104ParserComplete()
\ No newline at end of file
+form_104_parser_complete = Form104ParserComplete()
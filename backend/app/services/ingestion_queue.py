@@ -0,0 +1,327 @@
+"""
+Upload Ingestion Queue
+Postgres-backed job queue drained by background workers
+✅ Upload endpoints only store the file and enqueue a job
+✅ Jobs are claimed with SELECT ... FOR UPDATE SKIP LOCKED (safe across API replicas)
+✅ Jobs left behind by a crashed worker are re-queued
+"""
+
+import asyncio
+import logging
+import os
+import socket
+from datetime import datetime, timedelta, timezone
+from typing import List, Optional, Tuple
+
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from app.core.config import settings
+from app.core.database import AsyncSessionLocal
+from app.models.base import Document, UploadJob, ProcessingStatusEnum, FormTypeEnum
+from app.services.enhanced_form_processing_service import enhanced_form_processing_service
+from app.services.extraction_executor import ExtractionError
+from app.services.document_stats_service import document_stats_service
+from app.services.platform_counter_service import platform_counter_service
+
+logger = logging.getLogger(__name__)
+
+
+def job_to_dict(job: UploadJob, document: Optional[Document] = None) -> dict:
+    """Serialize a job (and its document, when loaded) for the status endpoints"""
+    data = {
+        "job_id": job.id,
+        "batch_id": job.batch_id,
+        "document_id": job.document_id,
+        "filename": job.original_filename,
+        "status": job.status.value,
+        "attempts": job.attempts,
+        "is_duplicate": job.is_duplicate,
+        "error": job.error,
+        "created_at": job.created_at.isoformat() if job.created_at else None,
+        "started_at": job.started_at.isoformat() if job.started_at else None,
+        "finished_at": job.finished_at.isoformat() if job.finished_at else None,
+    }
+    if document is not None:
+        data["form_type"] = document.form_type.value if document.form_type else None
+        data["razon_social"] = document.razon_social
+        data["periodo_fiscal_completo"] = document.periodo_fiscal_completo
+    return data
+
+
+class IngestionQueue:
+    """Enqueue uploads and run the workers that process them"""
+
+    def __init__(
+        self,
+        workers: int = 2,
+        poll_interval: float = 2.0,
+        max_attempts: int = 3,
+        stale_after: int = 600
+    ):
+        """
+        workers: Worker tasks started in this process (0 = enqueue only)
+        poll_interval: Seconds an idle worker waits before polling again
+        max_attempts: Attempts before a job is marked as failed
+        stale_after: Seconds after which a PROCESSING job is considered abandoned
+        """
+        self.workers = workers
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.stale_after = stale_after
+
+        self._instance_id = f"{socket.gethostname()}-{os.getpid()}"
+        self._tasks: List[asyncio.Task] = []
+        self._wakeup: Optional[asyncio.Event] = None
+
+    # ============================================
+    # Producer side (upload API)
+    # ============================================
+
+    async def enqueue_upload(
+        self,
+        file_path: str,
+        original_filename: str,
+        file_size: int,
+        batch_id: str,
+        db: AsyncSession,
+        user_id: Optional[int] = None,
+        session_id: Optional[str] = None,
+        content_hash: Optional[str] = None
+    ) -> Tuple[Document, UploadJob]:
+        """
+        Create a PENDING document and its job
+        The caller commits, then calls notify()
+        """
+        document = Document(
+            filename=os.path.basename(file_path),
+            original_filename=original_filename,
+            file_path=file_path,
+            file_size=file_size,
+            form_type=FormTypeEnum.UNKNOWN,
+            processing_status=ProcessingStatusEnum.PENDING,
+            user_id=user_id,
+            session_id=session_id,
+            content_hash=content_hash
+        )
+        db.add(document)
+        await db.flush()
+        await platform_counter_service.document_added(db)
+
+        job = UploadJob(
+            batch_id=batch_id,
+            document_id=document.id,
+            original_filename=original_filename,
+            user_id=user_id,
+            session_id=session_id,
+            status=ProcessingStatusEnum.PENDING
+        )
+        db.add(job)
+        await db.flush()
+        return document, job
+
+    def notify(self):
+        """Wake up idle local workers (other replicas pick the job up on their next poll)"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    # ============================================
+    # Consumer side (workers)
+    # ============================================
+
+    async def claim_next(self, db: AsyncSession, worker_id: str) -> Optional[int]:
+        """Lock the oldest pending job, mark it as PROCESSING and return its id"""
+        result = await db.execute(
+            select(UploadJob)
+            .where(UploadJob.status == ProcessingStatusEnum.PENDING)
+            .order_by(UploadJob.id)
+            .limit(1)
+            .with_for_update(skip_locked=True)
+        )
+        job = result.scalar_one_or_none()
+
+        if job is None:
+            await db.rollback()
+            return None
+
+        job.status = ProcessingStatusEnum.PROCESSING
+        job.attempts += 1
+        job.worker_id = worker_id
+        job.started_at = datetime.now(timezone.utc)
+        job_id = job.id
+        await db.commit()
+        return job_id
+
+    async def process_job(self, job_id: int):
+        """Run the processing pipeline for one claimed job"""
+        async with AsyncSessionLocal() as db:
+            job = await db.get(UploadJob, job_id)
+            if job is None:
+                return
+            document = await db.get(Document, job.document_id) if job.document_id else None
+
+            if document is None:
+                job.status = ProcessingStatusEnum.FAILED
+                job.error = "Document was deleted before it could be processed"
+                job.finished_at = datetime.now(timezone.utc)
+                await db.commit()
+                return
+
+            file_path = document.file_path
+            user_id = document.user_id
+
+            try:
+                result, is_duplicate = await enhanced_form_processing_service.process_pending_document(
+                    document, db, allow_duplicates=False
+                )
+
+                if is_duplicate and file_path and os.path.exists(file_path):
+                    os.remove(file_path)
+
+                job.document_id = result.id
+                job.is_duplicate = is_duplicate
+                job.status = ProcessingStatusEnum.COMPLETED
+                job.error = None
+                job.finished_at = datetime.now(timezone.utc)
+                await db.commit()
+
+                logger.info(f"✅ Job {job_id} done: {'duplicate of' if is_duplicate else 'document'} {result.id}")
+
+            except Exception as e:
+                await db.rollback()
+
+                job = await db.get(UploadJob, job_id)
+                # Unreadable PDFs fail the same way every time
+                retry = job.attempts < self.max_attempts and not isinstance(e, ExtractionError)
+
+                job.error = str(e)
+                if retry:
+                    job.status = ProcessingStatusEnum.PENDING
+                    document = await db.get(Document, job.document_id) if job.document_id else None
+                    if document is not None:
+                        document.processing_status = ProcessingStatusEnum.PENDING
+                else:
+                    job.status = ProcessingStatusEnum.FAILED
+                    job.finished_at = datetime.now(timezone.utc)
+                await db.commit()
+
+                logger.error(f"❌ Job {job_id} failed (attempt {job.attempts}, {'retrying' if retry else 'giving up'}): {e}")
+
+            finally:
+                document_stats_service.invalidate([user_id])
+
+    async def requeue_stale_jobs(self) -> int:
+        """Put jobs whose worker died back in the queue (or fail them after max_attempts)"""
+        cutoff = datetime.now(timezone.utc) - timedelta(seconds=self.stale_after)
+        stale = (
+            UploadJob.status == ProcessingStatusEnum.PROCESSING,
+            UploadJob.started_at < cutoff
+        )
+
+        async with AsyncSessionLocal() as db:
+            failed = (await db.execute(
+                update(UploadJob)
+                .where(*stale, UploadJob.attempts >= self.max_attempts)
+                .values(
+                    status=ProcessingStatusEnum.FAILED,
+                    error="Worker stopped responding",
+                    finished_at=datetime.now(timezone.utc)
+                )
+                .returning(UploadJob.document_id)
+            )).scalars().all()
+            requeued = (await db.execute(
+                update(UploadJob)
+                .where(*stale)
+                .values(status=ProcessingStatusEnum.PENDING, worker_id=None)
+                .returning(UploadJob.document_id)
+            )).scalars().all()
+
+            # Documents follow their job: never left PROCESSING (and holding their content hash) forever
+            for document_ids, status in ((failed, ProcessingStatusEnum.FAILED), (requeued, ProcessingStatusEnum.PENDING)):
+                document_ids = [document_id for document_id in document_ids if document_id]
+                if document_ids:
+                    await db.execute(
+                        update(Document)
+                        .where(Document.id.in_(document_ids))
+                        .values(
+                            processing_status=status,
+                            processing_error="Worker stopped responding" if status == ProcessingStatusEnum.FAILED else None
+                        )
+                    )
+            await db.commit()
+
+        if failed or requeued:
+            logger.warning(f"♻️ Stale upload jobs: {len(requeued)} re-queued, {len(failed)} failed")
+        return len(requeued)
+
+    async def _wait_for_work(self):
+        """Sleep until notified or until the next poll"""
+        try:
+            await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+        except asyncio.TimeoutError:
+            pass
+        self._wakeup.clear()
+
+    async def _worker(self, index: int):
+        """Claim and process jobs forever"""
+        worker_id = f"{self._instance_id}-{index}"
+        logger.info(f"📥 Ingestion worker {worker_id} started")
+
+        while True:
+            try:
+                async with AsyncSessionLocal() as db:
+                    job_id = await self.claim_next(db, worker_id)
+
+                if job_id is None:
+                    await self._wait_for_work()
+                    continue
+
+                await self.process_job(job_id)
+
+            except asyncio.CancelledError:
+                if asyncio.current_task().cancelling():
+                    raise
+                # A cancelled inner future (not this task): keep the worker alive
+                logger.error(f"❌ Ingestion worker {worker_id} job cancelled")
+                await asyncio.sleep(self.poll_interval)
+            except Exception as e:
+                logger.error(f"❌ Ingestion worker {worker_id} error: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _reaper(self):
+        """Periodically re-queue abandoned jobs"""
+        interval = max(self.stale_after / 2, self.poll_interval)
+        while True:
+            try:
+                await self.requeue_stale_jobs()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"❌ Stale job check failed: {str(e)}")
+            await asyncio.sleep(interval)
+
+    async def start(self):
+        """Start worker tasks (called from the application lifespan)"""
+        if self._tasks or self.workers <= 0:
+            return
+
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._reaper()))
+        logger.info(f"🚀 Ingestion queue started with {self.workers} workers")
+
+    async def stop(self):
+        """Cancel worker tasks; claimed jobs are re-queued by the reaper of any replica"""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Singleton instance
+ingestion_queue = IngestionQueue(
+    workers=settings.INGESTION_WORKERS,
+    poll_interval=settings.INGESTION_POLL_INTERVAL,
+    max_attempts=settings.INGESTION_MAX_ATTEMPTS,
+    stale_after=settings.INGESTION_STALE_AFTER_SECONDS
+)
@@ -0,0 +1,115 @@
+"""
+Layout Extractor - reads SRI box values by position instead of regex over flattened text
+✅ Words are extracted once per page and reused to rebuild the page text
+✅ A code only counts when it sits in one of the form's code columns
+   (labels such as "trasládese campo 429" are ignored)
+✅ An empty box stays empty instead of borrowing the next code as its value
+✅ An amount beats text for the same code (labels like "campo 615 de la declaración" sit in
+   the code column too)
+Runs inside the extraction worker (see extraction_executor)
+"""
+
+import re
+from typing import Dict, List, Tuple
+
+from pdfplumber.utils import cluster_objects
+
+
+CODE_WORD = re.compile(r"^\d{3,4}$")
+AMOUNT_WORD = re.compile(r"^(?=.*\d)[\d,\.]+$")
+
+# Same line tolerance pdfplumber uses for extract_text()
+ROW_TOLERANCE = 3
+
+# Bounding-box templates measured on the SRI landscape forms (842 x 595 pt).
+# region: (x0, top, x1, bottom) holding the boxes (footer excluded)
+# code_columns: x0 ranges where box codes are printed; values follow to the right
+LAYOUT_TEMPLATES = {
+    # Pages 1-5: ventas, liquidación, adquisiciones, resumen impositivo, retenciones, totales
+    "form_104": {
+        "page_width": 842,
+        "region": (500, 0, 842, 545),
+        "code_columns": [(515, 533), (594, 609), (635, 653), (750, 766)],
+    },
+    # Pages 1-3: retenciones table (base / retenido) and totals; concept labels are needed.
+    # The base column moved from x≈645 to x≈680 between form versions: one band covers both
+    "form_103": {
+        "page_width": 842,
+        "region": (0, 0, 842, 545),
+        "code_columns": [(640, 700), (750, 781)],
+    },
+}
+
+
+def _keep_value(codes: Dict[str, str], code: str, value: str):
+    """First amount wins; a text value is only kept until an amount shows up"""
+    current = codes.get(code)
+    if current is None or (not AMOUNT_WORD.match(current) and AMOUNT_WORD.match(value)):
+        codes[code] = value
+
+
+def page_text_and_words(page) -> Tuple[str, List[dict]]:
+    """Extract words once and rebuild the text page.extract_text() would return"""
+    words = page.extract_words()
+    lines = cluster_objects(words, "top", ROW_TOLERANCE)
+    text = "\n".join(
+        " ".join(word["text"] for word in sorted(line, key=lambda w: w["x0"]))
+        for line in lines
+    )
+    return text, words
+
+
+def read_fields(words: List[dict], form: str, page_width: float) -> Tuple[Dict[str, str], List[tuple]]:
+    """
+    Coordinate lookup of every box on one page
+    Returns:
+        codes: {code: value} (first amount, else first text; empty boxes omitted)
+        rows: [(concept, [(code, value), ...]), ...] one entry per table row holding codes
+    """
+    template = LAYOUT_TEMPLATES[form]
+    scale = page_width / template["page_width"]
+    x0, top, x1, bottom = (value * scale for value in template["region"])
+    columns = [(lo * scale, hi * scale) for lo, hi in template["code_columns"]]
+
+    in_region = [
+        w for w in words
+        if w["x0"] >= x0 and w["x1"] <= x1 and w["top"] >= top and w["bottom"] <= bottom
+    ]
+
+    codes = {}
+    rows = []
+
+    for line in cluster_objects(in_region, "top", ROW_TOLERANCE):
+        line = sorted(line, key=lambda w: w["x0"])
+        code_positions = [
+            i for i, w in enumerate(line)
+            if CODE_WORD.match(w["text"]) and any(lo <= w["x0"] <= hi for lo, hi in columns)
+        ]
+        if not code_positions:
+            continue
+
+        cells = []
+        for n, i in enumerate(code_positions):
+            # A box's value sits between its code and the next code of the row
+            end = code_positions[n + 1] if n + 1 < len(code_positions) else len(line)
+            cell_words = [w["text"] for w in line[i + 1:end] if w["text"] != "_"]
+            amounts = [text for text in cell_words if AMOUNT_WORD.match(text)]
+            value = amounts[0] if amounts else " ".join(cell_words)
+
+            code = line[i]["text"]
+            cells.append((code, value))
+            if value:
+                _keep_value(codes, code, value)
+
+        concept = " ".join(w["text"] for w in line[:code_positions[0]] if w["text"] != "_")
+        rows.append((concept, cells))
+
+    return codes, rows
+
+
+def merge_page_fields(layout: Dict[str, dict], form: str, codes: Dict[str, str], rows: List[tuple]):
+    """Accumulate one page into the document layout (same precedence as read_fields)"""
+    form_layout = layout.setdefault(form, {"codes": {}, "rows": []})
+    for code, value in codes.items():
+        _keep_value(form_layout["codes"], code, value)
+    form_layout["rows"].extend(rows)
@@ -0,0 +1,178 @@
+"""
+Pattern Registry - every regex used to read SRI forms, compiled once
+✅ Shared by Form 103 / Form 104 parsers, the processing service and the scripts
+✅ Versioned: bump PATTERNS_VERSION whenever a pattern changes meaning
+✅ Per-pattern hit rate and timing (GET /api/admin/parser/patterns)
+"""
+
+import re
+import time
+from typing import Dict, List, Optional, Pattern, Match
+
+
+# Bump when a pattern change can alter parsed output (stored in parsed_data)
+PATTERNS_VERSION = "1"
+
+MONTHS = "ENERO|FEBRERO|MARZO|ABRIL|MAYO|JUNIO|JULIO|AGOSTO|SEPTIEMBRE|OCTUBRE|NOVIEMBRE|DICIEMBRE"
+
+HEADER_FLAGS = re.IGNORECASE | re.MULTILINE
+
+
+class PatternStats:
+    """Counters for one pattern"""
+    __slots__ = ("calls", "hits", "total_ns", "max_ns")
+
+    def __init__(self):
+        self.calls = 0
+        self.hits = 0
+        self.total_ns = 0
+        self.max_ns = 0
+
+
+class PatternRegistry:
+    """Named, precompiled patterns with usage statistics"""
+
+    def __init__(self, version: str):
+        self.version = version
+        self._patterns: Dict[str, Pattern] = {}
+        self._stats: Dict[str, PatternStats] = {}
+
+    def register(self, name: str, pattern: str, flags: int = 0) -> Pattern:
+        """Compile and register a pattern under a unique name"""
+        if name in self._patterns:
+            raise ValueError(f"Pattern already registered: {name}")
+        compiled = re.compile(pattern, flags)
+        self._patterns[name] = compiled
+        self._stats[name] = PatternStats()
+        return compiled
+
+    def get(self, name: str) -> Pattern:
+        """Compiled pattern (no statistics recorded)"""
+        return self._patterns[name]
+
+    def _record(self, name: str, start_ns: int, hit: bool):
+        elapsed = time.perf_counter_ns() - start_ns
+        stats = self._stats[name]
+        stats.calls += 1
+        stats.total_ns += elapsed
+        if hit:
+            stats.hits += 1
+        if elapsed > stats.max_ns:
+            stats.max_ns = elapsed
+
+    def search(self, name: str, text: str) -> Optional[Match]:
+        """pattern.search with hit/timing statistics"""
+        pattern = self._patterns[name]
+        start = time.perf_counter_ns()
+        match = pattern.search(text)
+        self._record(name, start, match is not None)
+        return match
+
+    def finditer(self, name: str, text: str) -> List[Match]:
+        """All matches of a pattern (a call counts as a hit when anything matched)"""
+        pattern = self._patterns[name]
+        start = time.perf_counter_ns()
+        matches = list(pattern.finditer(text))
+        self._record(name, start, bool(matches))
+        return matches
+
+    def stats(self) -> dict:
+        """Hit rates and timings of every registered pattern"""
+        patterns = {}
+        for name, stats in self._stats.items():
+            patterns[name] = {
+                "pattern": self._patterns[name].pattern,
+                "calls": stats.calls,
+                "hits": stats.hits,
+                "hit_rate": round(stats.hits / stats.calls, 4) if stats.calls else None,
+                "avg_us": round(stats.total_ns / stats.calls / 1000, 2) if stats.calls else None,
+                "max_us": round(stats.max_ns / 1000, 2),
+                "total_ms": round(stats.total_ns / 1_000_000, 2)
+            }
+        return {
+            "version": self.version,
+            "pattern_count": len(self._patterns),
+            "patterns": patterns
+        }
+
+    def reset_stats(self):
+        """Zero all counters"""
+        for name in self._stats:
+            self._stats[name] = PatternStats()
+
+
+# Singleton instance
+pattern_registry = PatternRegistry(PATTERNS_VERSION)
+register = pattern_registry.register
+
+
+# ===================================
+# Form header (printed by the SRI on every form)
+# ===================================
+
+register("header.codigo_verificador", r"CÓDIGO VERIFICADOR\s+([A-Z0-9]+)", HEADER_FLAGS)
+register("header.numero_serial", r"NÚMERO SERIAL\s+(\d+)", HEADER_FLAGS)
+register("header.fecha_recaudacion", r"FECHA RECAUDACIÓN\s+(\d{2}-\d{2}-\d{4})", HEADER_FLAGS)
+register("header.obligacion_tributaria_103", r"Obligación Tributaria:\s+(\d+\s*-\s*[A-ZÁÉÍÓÚÑ\s]+)", HEADER_FLAGS)
+register("header.obligacion_tributaria_104", r"Obligación Tributaria:\s+(\d+\s+[A-ZÁÉÍÓÚÑ\s]+)", HEADER_FLAGS)
+register("header.identificacion", r"Identificación:\s+(\d+)", HEADER_FLAGS)
+register("header.razon_social", r"Razón Social:\s+([A-ZÁÉÍÓÚÑ\s\.]+?)(?:\n|Período)", HEADER_FLAGS)
+register("header.periodo_fiscal", r"Período Fiscal:\s+([A-Z]+)\s+(\d{4})", HEADER_FLAGS)
+register("header.tipo_declaracion", r"Tipo Declaración:\s+([A-Z]+)", HEADER_FLAGS)
+register("header.estado_declaracion", r"Estado de la\s+Declaración:\s+([A-Z]+)", HEADER_FLAGS)
+
+
+# ===================================
+# Document identity (used for client grouping and duplicate detection)
+# ===================================
+
+register("document.ruc", r"(?:RUC|Identificación|No\. Identificación)[:\s]*(\d{13})", re.IGNORECASE)
+register(
+    "document.razon_social",
+    r"(?:Razón Social|Apellidos y Nombres)[:\s]*([A-ZÁÉÍÓÚÑ\.]+(?:\s+[A-ZÁÉÍÓÚÑ\.]+)*(?:\s+(?:S\.A\.S\.|S\.A\.|CIA\.|LTDA\.|C\.A\.|S\.C\.|CIA\. LTDA\.))?)",
+    re.IGNORECASE
+)
+register("document.fecha_recaudacion", r"(?:Fecha de Recaudación)[:\s]*(\d{2}[-/]\d{2}[-/]\d{4})", re.IGNORECASE)
+
+
+# ===================================
+# Period (tried in order, first match wins)
+# ===================================
+
+register("period.fiscal", rf"Período\s+Fiscal[:\s]+({MONTHS})\s+(\d{{4}})", re.IGNORECASE)
+register("period.label", rf"(?:Período|Mes)[:\s]+({MONTHS})\s+(\d{{4}})", re.IGNORECASE)
+register("period.loose", rf"(?:Período|Mes).*?({MONTHS})\s+(\d{{4}})", re.IGNORECASE)
+PERIOD_PATTERNS = ["period.fiscal", "period.label", "period.loose"]
+
+# Looser variants used when re-reading stored text (any word, validated against the month map)
+register("period.stored_fiscal", r"Período\s+Fiscal[:\s]*([A-Z]+)\s+(\d{4})", re.IGNORECASE)
+register("period.stored_fiscal_plain", r"PERIODO\s+FISCAL[:\s]*([A-Z]+)\s+(\d{4})", re.IGNORECASE)
+register("period.stored_periodo", r"Periodo[:\s]*([A-Z]+)\s+(\d{4})", re.IGNORECASE)
+STORED_PERIOD_PATTERNS = ["period.stored_fiscal", "period.stored_fiscal_plain", "period.stored_periodo"]
+
+
+# ===================================
+# Form 103 (retenciones en la fuente)
+# ===================================
+
+# "Description CODE1 VALUE1 CODE2 VALUE2"
+register("103.line_item", r"([A-Za-zÁÉÍÓÚáéíóúñÑ\s\(\)\-,/\.]+?)\s+(\d{3,4})\s+([\d\.,]+)\s+(\d{3,4})\s+([\d\.,]+)")
+register("103.pagos_no_sujetos", r"Pagos de bienes y servicios no sujetos a retención.*?332\s+([\d\.,]+)", re.IGNORECASE | re.DOTALL)
+register("103.subtotal", r"SUBTOTAL OPERACIONES EFECTUADAS EN EL PAÍS\s+349\s+([\d\.,]+)\s+399\s+([\d\.,]+)", re.IGNORECASE)
+register("103.otras_retenciones", r"Aplicables\s+el\s+2,75%\s+3440\s+([\d\.,]+)\s+3940\s+([\d\.,]+)", re.IGNORECASE)
+register("103.total_retencion", r"TOTAL DE RETENCIÓN DE IMPUESTO A LA RENTA.*?499\s+([\d\.,]+)", re.IGNORECASE | re.DOTALL)
+register("103.total_impuesto_pagar", r"TOTAL IMPUESTO A PAGAR.*?902\s+([\d\.,]+)", re.IGNORECASE | re.DOTALL)
+register("103.interes_mora", r"Interés\s+por\s+mora\s+903\s+([\d\.,]+)", re.IGNORECASE)
+register("103.multa", r"Multa\s+904\s+([\d\.,]+)", re.IGNORECASE)
+register("103.total_pagado", r"TOTAL PAGADO\s+999\s+([\d\.,]+)", re.IGNORECASE)
+
+
+# ===================================
+# Form 104 (IVA)
+# ===================================
+
+# Every 3-4 digit box code followed by a numeric value.
+# The value is a lookahead so a code that reads as the previous code's value is still indexed.
+register("104.code_value", r"\b(\d{3,4})\b(?=\s+([\d,\.]+))")
+register("104.mes_pagar", r"\b486\b\s+(\d+)")
+register("104.tamano_copci", r"\b487\b\s+([A-Za-záéíóúñ\s]+?)(?:\n|$)", re.IGNORECASE)
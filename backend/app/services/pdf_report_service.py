@@ -0,0 +1,376 @@
+"""
+PDF Report Service - branded yearly summary PDFs
+✅ ReportLab rendering runs in a worker thread, never on the event loop
+✅ Logos fetched with async httpx, cached content-addressed in memory and on disk (TTL + size limit)
+✅ Finished PDFs cached on disk, keyed by user, client, year, excluded months,
+   branding, logo content and the aggregates' data version
+"""
+
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import time
+from collections import OrderedDict
+from io import BytesIO
+from typing import Optional, Tuple
+
+import httpx
+from PIL import Image as PILImage
+from reportlab.lib import colors
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+from reportlab.lib.units import inch
+from reportlab.platypus import SimpleDocTemplate, Table, Image, TableStyle, Paragraph, Spacer
+
+from app.core.config import settings
+from app.core.ttl_cache import TTLCache
+from app.services.client_year_service import FORM_FIELDS
+
+logger = logging.getLogger(__name__)
+
+# Bump when the report layout changes so cached PDFs are not served
+REPORT_LAYOUT_VERSION = 1
+
+# Seconds a failed logo download is remembered (no 5 s wait on every request)
+LOGO_FAILURE_TTL = 60
+
+MONTH_SHORT_NAMES = ['', 'Enero', 'Feb', 'Mar', 'Abr', 'May', 'Jun', 'Jul', 'Ago', 'Sep', 'Oct', 'Nov', 'Dic']
+
+
+class DiskCache:
+    """
+    Files in one directory: entries expire after ttl seconds,
+    oldest entries are evicted once the directory exceeds max_bytes
+    Blocking file IO - call from a worker thread
+    """
+
+    def __init__(self, directory: str, ttl: int, max_bytes: int):
+        self.directory = directory
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key)
+
+    def get(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            if time.time() - os.path.getmtime(path) > self.ttl:
+                os.remove(path)
+                return None
+            with open(path, "rb") as handle:
+                return handle.read()
+        except FileNotFoundError:
+            return None
+
+    def put(self, key: str, data: bytes):
+        os.makedirs(self.directory, exist_ok=True)
+        path = self._path(key)
+        temp_path = f"{path}.{os.getpid()}.part"
+        with open(temp_path, "wb") as handle:
+            handle.write(data)
+        os.replace(temp_path, path)
+        self.evict()
+
+    def evict(self):
+        """Drop expired entries, then the oldest ones until the size limit is met"""
+        now = time.time()
+        entries = []
+        for entry in os.scandir(self.directory):
+            if not entry.is_file() or entry.name.endswith(".part"):
+                continue
+            try:
+                stat = entry.stat()
+                if now - stat.st_mtime > self.ttl:
+                    os.remove(entry.path)
+                else:
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            except FileNotFoundError:
+                continue  # Removed by another worker
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total -= size
+
+
+class LogoCache:
+    """
+    Branding logos by URL
+    URL -> SHA-256 of the content (LRU + TTL, max_urls entries), content stored once per digest
+    in memory (LRU, byte budget) and on disk
+    """
+
+    def __init__(self, disk: DiskCache, ttl: int, memory_bytes: int, timeout: float, max_size: int, max_urls: int):
+        self.disk = disk
+        self.ttl = ttl
+        self.memory_bytes = memory_bytes
+        self.timeout = timeout
+        self.max_size = max_size
+
+        self._urls = TTLCache(maxsize=max_urls, ttl=ttl)  # url -> digest
+        self._failures = TTLCache(maxsize=max_urls, ttl=LOGO_FAILURE_TTL)  # urls that could not be fetched
+        self._memory: "OrderedDict[str, bytes]" = OrderedDict()
+        self._memory_size = 0
+
+    @staticmethod
+    def _url_key(url: str) -> str:
+        return "url-" + hashlib.sha256(url.encode()).hexdigest()
+
+    def _remember(self, digest: str, data: bytes):
+        if digest in self._memory:
+            self._memory.move_to_end(digest)
+            return
+        self._memory[digest] = data
+        self._memory_size += len(data)
+        while self._memory_size > self.memory_bytes and len(self._memory) > 1:
+            _, evicted = self._memory.popitem(last=False)
+            self._memory_size -= len(evicted)
+
+    async def _content(self, digest: str) -> Optional[bytes]:
+        data = self._memory.get(digest)
+        if data is not None:
+            self._memory.move_to_end(digest)
+            return data
+        data = await asyncio.to_thread(self.disk.get, digest)
+        if data is not None:
+            self._remember(digest, data)
+        return data
+
+    async def _download(self, url: str) -> Optional[bytes]:
+        try:
+            async with httpx.AsyncClient(timeout=self.timeout, follow_redirects=True) as client:
+                async with client.stream("GET", url) as response:
+                    response.raise_for_status()
+                    chunks, size = [], 0
+                    async for chunk in response.aiter_bytes():
+                        size += len(chunk)
+                        if size > self.max_size:
+                            logger.warning(f"⚠️ Logo larger than {self.max_size} bytes, ignored: {url}")
+                            return None
+                        chunks.append(chunk)
+            return b"".join(chunks)
+        except httpx.HTTPError as e:
+            logger.warning(f"⚠️ Could not fetch logo {url}: {e}")
+            return None
+
+    async def get(self, url: str) -> Optional[Tuple[str, bytes]]:
+        """(digest, content) of the logo, or None when it cannot be fetched"""
+        if self._failures.get(url):
+            return None
+        digest = self._urls.get(url)
+        if digest is not None:
+            data = await self._content(digest)
+            if data is not None:
+                return digest, data
+
+        # Another worker (or a previous run) may have fetched it already
+        url_key = self._url_key(url)
+        stored = await asyncio.to_thread(self.disk.get, url_key)
+        if stored:
+            data = await self._content(stored.decode())
+            if data is not None:
+                self._urls.set(url, stored.decode())
+                return stored.decode(), data
+
+        data = await self._download(url)
+        if data is None:
+            self._failures.set(url, True)
+            return None
+
+        digest = hashlib.sha256(data).hexdigest()
+        self._urls.set(url, digest)
+        self._remember(digest, data)
+        await asyncio.to_thread(self.disk.put, digest, data)
+        await asyncio.to_thread(self.disk.put, url_key, digest.encode())
+        return digest, data
+
+
+def render_yearly_pdf(
+    razon_social: str,
+    year: str,
+    branding: dict,
+    logo: Optional[bytes],
+    months: list,
+    totals
+) -> bytes:
+    """
+    Build the branded yearly summary (blocking - run in a worker thread)
+    months / totals: client_year_service.summarize_year() rows
+    """
+    output = BytesIO()
+    pdf_doc = SimpleDocTemplate(output, pagesize=letter, topMargin=0.5*inch, bottomMargin=0.5*inch)
+    elements = []
+    styles = getSampleStyleSheet()
+
+    # Custom styles
+    title_style = ParagraphStyle(
+        'CustomTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        textColor=colors.HexColor(branding['primary_color']),
+        spaceAfter=12,
+        alignment=1
+    )
+
+    subtitle_style = ParagraphStyle(
+        'CustomSubtitle',
+        parent=styles['Heading2'],
+        fontSize=14,
+        textColor=colors.HexColor(branding['secondary_color']),
+        spaceAfter=10
+    )
+
+    # Logo
+    if logo:
+        try:
+            img = PILImage.open(BytesIO(logo))
+            aspect = img.height / float(img.width)
+            elements.append(Image(BytesIO(logo), width=2*inch, height=(2*aspect)*inch))
+            elements.append(Spacer(1, 0.2*inch))
+        except Exception as e:
+            logger.warning(f"⚠️ Logo is not a readable image: {e}")
+
+    # Title
+    elements.append(Paragraph(branding['company_name'], title_style))
+    elements.append(Paragraph(f"Resumen Anual {year}", title_style))
+    elements.append(Paragraph(razon_social, subtitle_style))
+    elements.append(Spacer(1, 0.3*inch))
+
+    def form_table(form: str, with_periodo: bool, column_width: float, header_color: str) -> Table:
+        """Monthly rows + TOTAL row of one form (spec fields with a PDF label)"""
+        fields = [field for field in FORM_FIELDS[form] if field.pdf]
+        leading = ['Mes', 'Período'] if with_periodo else ['Mes']
+        table_data = [leading + [field.pdf for field in fields]]
+
+        for row in months:
+            if not getattr(row, f"{form}_has_totals"):
+                continue
+            cells = [MONTH_SHORT_NAMES[row.periodo_mes_numero] if row.periodo_mes_numero else "N/A"]
+            if with_periodo:
+                cells.append(f"{row.periodo_mes[:3]} {year}" if row.periodo_mes else "N/A")
+            cells.extend(f"${getattr(row, f'{form}_{field.name}'):,.2f}" for field in fields)
+            table_data.append(cells)
+
+        # Total row
+        table_data.append(
+            ['TOTAL'] + [''] * (len(leading) - 1)
+            + [f"${getattr(totals, f'{form}_{field.name}'):,.2f}" for field in fields]
+        )
+
+        table = Table(table_data, colWidths=[0.8*inch] + [column_width*inch] * (len(table_data[0]) - 1))
+        table.setStyle(TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor(header_color)),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 10),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, -1), (-1, -1), colors.lightgrey),
+            ('FONTNAME', (0, -1), (-1, -1), 'Helvetica-Bold'),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black)
+        ]))
+        return table
+
+    # --- Form 103 Summary ---
+    elements.append(Paragraph("Form 103 - Retenciones en la Fuente", subtitle_style))
+    elements.append(form_table('form_103', with_periodo=True, column_width=1.2, header_color=branding['primary_color']))
+    elements.append(Spacer(1, 0.4*inch))
+
+    # --- Form 104 Summary ---
+    elements.append(Paragraph("Form 104 - IVA", subtitle_style))
+    elements.append(form_table('form_104', with_periodo=False, column_width=1.3, header_color=branding['secondary_color']))
+    elements.append(Spacer(1, 0.4*inch))
+
+    pdf_doc.build(elements)
+    return output.getvalue()
+
+
+class PdfReportService:
+    """Yearly summary PDFs: cache lookup, logo, off-loop rendering"""
+
+    def __init__(self, reports: DiskCache, logos: LogoCache):
+        self.reports = reports
+        self.logos = logos
+        self._hits = 0
+        self._misses = 0
+
+    @staticmethod
+    def report_key(
+        user_id: int,
+        razon_social: str,
+        year: str,
+        excluded: set,
+        branding: dict,
+        logo_digest: Optional[str],
+        data_version: str
+    ) -> str:
+        """Cache key of one rendered report"""
+        payload = json.dumps(
+            [REPORT_LAYOUT_VERSION, user_id, razon_social, year, sorted(excluded),
+             branding, logo_digest, data_version],
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(payload.encode()).hexdigest() + ".pdf"
+
+    async def yearly_report(
+        self,
+        user_id: int,
+        razon_social: str,
+        year: str,
+        excluded: set,
+        branding: dict,
+        months: list,
+        totals
+    ) -> bytes:
+        """PDF bytes of the yearly summary, rendered only when not cached"""
+        logo = await self.logos.get(branding['logo_url']) if branding.get('logo_url') else None
+        logo_digest, logo_data = logo if logo else (None, None)
+
+        # Aggregate rows are rewritten (updated_at) or removed whenever a document changes
+        data_version = f"{totals.month_count}:{totals.updated_at}"
+        key = self.report_key(user_id, razon_social, year, excluded, branding, logo_digest, data_version)
+
+        cached = await asyncio.to_thread(self.reports.get, key)
+        if cached is not None:
+            self._hits += 1
+            return cached
+
+        self._misses += 1
+        pdf = await asyncio.to_thread(
+            render_yearly_pdf, razon_social, year, branding, logo_data, months, totals
+        )
+        await asyncio.to_thread(self.reports.put, key, pdf)
+        return pdf
+
+    def stats(self) -> dict:
+        return {"hits": self._hits, "misses": self._misses}
+
+
+# Singleton instance
+pdf_report_service = PdfReportService(
+    reports=DiskCache(
+        os.path.join(settings.PDF_CACHE_DIR, "reports"),
+        ttl=settings.PDF_CACHE_TTL_SECONDS,
+        max_bytes=settings.PDF_CACHE_MAX_BYTES
+    ),
+    logos=LogoCache(
+        DiskCache(
+            os.path.join(settings.PDF_CACHE_DIR, "logos"),
+            ttl=settings.LOGO_CACHE_TTL_SECONDS,
+            max_bytes=settings.LOGO_CACHE_MAX_BYTES
+        ),
+        ttl=settings.LOGO_CACHE_TTL_SECONDS,
+        memory_bytes=settings.LOGO_CACHE_MEMORY_BYTES,
+        timeout=settings.LOGO_FETCH_TIMEOUT_SECONDS,
+        max_size=settings.LOGO_MAX_SIZE,
+        max_urls=settings.LOGO_CACHE_MAX_URLS
+    )
+)
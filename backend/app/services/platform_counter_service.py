@@ -0,0 +1,188 @@
+"""
+Platform Counter Service - admin dashboard totals without full-table scans
+✅ Counters adjusted inside the caller's transaction (registration, upload, deletion, cleanup)
+✅ Deltas are applied once, at commit, in one statement: every transaction locks the rows in name order
+✅ Admin stats read 5 rows by primary key instead of counting users / documents
+✅ reconcile() recounts from the real tables and fixes any drift (scheduled + on demand)
+"""
+
+import logging
+from typing import Dict, Iterable, Optional
+
+from sqlalchemy import event, select, func, literal_column, type_coerce
+from sqlalchemy.dialects.postgresql import JSON, insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from app.models.base import Document, PlatformCounter, User
+
+logger = logging.getLogger(__name__)
+
+COUNTERS = ('total_users', 'active_users', 'superusers', 'total_documents', 'total_clients')
+
+# Session.info key holding the deltas of the open transaction
+PENDING_DELTAS = "platform_counter_deltas"
+
+
+def _adjust_statement(deltas: Dict[str, int]):
+    """Multi-row upsert adding the deltas (rows in name order)"""
+    statement = insert(PlatformCounter).values(
+        [{"name": name, "value": delta} for name, delta in sorted(deltas.items())]
+    )
+    return statement.on_conflict_do_update(
+        index_elements=["name"],
+        set_={
+            "value": PlatformCounter.value + statement.excluded.value,
+            "updated_at": func.now()
+        }
+    )
+
+
+@event.listens_for(Session, "before_commit")
+def _apply_pending_deltas(session: Session):
+    """Write the transaction's counter deltas right before it commits (runs inside the async commit)"""
+    deltas = {name: delta for name, delta in session.info.pop(PENDING_DELTAS, {}).items() if delta}
+    if deltas:
+        session.execute(_adjust_statement(deltas))
+
+
+@event.listens_for(Session, "after_transaction_end")
+def _drop_pending_deltas(session: Session, transaction):
+    """Rolled back (or committed): nothing is carried into the next transaction"""
+    if transaction.parent is None:
+        session.info.pop(PENDING_DELTAS, None)
+
+
+class PlatformCounterService:
+    """Maintains and serves platform_counters"""
+
+    async def adjust(self, db: AsyncSession, **deltas: int):
+        """
+        Add deltas to counters when the caller commits
+        Deltas of one transaction are summed and written in one statement at commit, so every
+        transaction locks the counter rows once, in name order: concurrent writers cannot deadlock
+        """
+        if not db.in_transaction():
+            await db.begin()  # A rollback must be able to discard the deltas
+        pending = db.info.setdefault(PENDING_DELTAS, {})
+        for name, delta in deltas.items():
+            pending[name] = pending.get(name, 0) + delta
+
+    async def user_added(self, db: AsyncSession, user: User):
+        await self.adjust(db, **self._user_deltas(user, 1))
+
+    async def user_changed(self, db: AsyncSession, was_active: bool, was_superuser: bool, user: User):
+        """Active / superuser flags edited by an admin"""
+        await self.adjust(
+            db,
+            active_users=int(bool(user.is_active)) - int(bool(was_active)),
+            superusers=int(bool(user.is_superuser)) - int(bool(was_superuser))
+        )
+
+    async def user_removed(self, db: AsyncSession, user: User):
+        await self.adjust(db, **self._user_deltas(user, -1))
+
+    def _user_deltas(self, user: User, sign: int) -> Dict[str, int]:
+        return {
+            "total_users": sign,
+            "active_users": sign if user.is_active else 0,
+            "superusers": sign if user.is_superuser else 0
+        }
+
+    async def document_added(self, db: AsyncSession):
+        """New document row (its client is counted by client_seen once the header is parsed)"""
+        await self.adjust(db, total_documents=1)
+
+    async def client_seen(self, db: AsyncSession, document: Document):
+        """Count the document's client if no other document has it yet (pending changes flushed)"""
+        if not document.razon_social:
+            return
+        other = await db.execute(
+            select(Document.id)
+            .where(Document.razon_social == document.razon_social, Document.id != document.id)
+            .limit(1)
+        )
+        if other.first() is None:
+            await self.adjust(db, total_clients=1)
+
+    async def documents_removed(self, db: AsyncSession, count: int, razon_sociales: Iterable[Optional[str]]):
+        """
+        Documents deleted (deletes must be flushed first; caller commits)
+        Clients whose last document went away are uncounted
+        """
+        names = set(name for name in razon_sociales if name)
+        gone = 0
+        if names:
+            remaining = await db.execute(
+                select(Document.razon_social).where(Document.razon_social.in_(names)).distinct()
+            )
+            gone = len(names - set(remaining.scalars().all()))
+        await self.adjust(db, total_documents=-count, total_clients=-gone)
+
+    async def read(self, db: AsyncSession) -> Dict[str, int]:
+        """Current values (reconciled first if the table was never filled)"""
+        result = await db.execute(select(PlatformCounter.name, PlatformCounter.value))
+        values = dict(result.all())
+        if any(name not in values for name in COUNTERS):
+            values = await self.reconcile(db)
+            await db.commit()
+        return {name: values[name] for name in COUNTERS}
+
+    async def reconcile(self, db: AsyncSession, wait: bool = True) -> Optional[Dict[str, int]]:
+        """
+        Overwrite the counters with exact values (caller commits right away)
+        ✅ One process at a time (advisory lock); wait=False skips when another one is running
+        ✅ Counted without row locks: uploads and deletes are not blocked by the scans; changes
+        committed during the count are kept by applying them on top of the recount
+        Drift is logged; returns the corrected values (None when skipped)
+        """
+        lock_key = func.hashtext("platform_counters:reconcile")
+        if wait:
+            await db.execute(select(func.pg_advisory_xact_lock(lock_key)))
+        elif not (await db.execute(select(func.pg_try_advisory_xact_lock(lock_key)))).scalar():
+            return None
+
+        # Counters and counts from one statement: the same snapshot
+        users = select(
+            func.count().label("total_users"),
+            func.count().filter(User.is_active == True).label("active_users"),
+            func.count().filter(User.is_superuser == True).label("superusers")
+        ).select_from(User).subquery()
+        documents = select(
+            func.count().label("total_documents"),
+            func.count(func.distinct(Document.razon_social)).label("total_clients")
+        ).select_from(Document).subquery()
+        stored_json = select(func.coalesce(
+            func.json_object_agg(PlatformCounter.name, PlatformCounter.value),
+            literal_column("'{}'::json")
+        )).scalar_subquery()
+        row = (await db.execute(select(users, documents, type_coerce(stored_json, JSON).label("stored")))).one()
+        counted = {name: getattr(row, name) for name in COUNTERS}
+        stored_then = row.stored or {}
+
+        # Short critical section: lock (name order), rebase on what was committed since the count
+        current = dict((await db.execute(
+            select(PlatformCounter.name, PlatformCounter.value)
+            .order_by(PlatformCounter.name)
+            .with_for_update()
+        )).all())
+        actual = {
+            name: counted[name] + current.get(name, 0) - stored_then.get(name, 0)
+            for name in COUNTERS
+        }
+
+        drift = {name: actual[name] - current.get(name, 0) for name in COUNTERS if current.get(name) != actual[name]}
+        if drift:
+            statement = insert(PlatformCounter).values(
+                [{"name": name, "value": actual[name]} for name in sorted(drift)]
+            )
+            await db.execute(statement.on_conflict_do_update(
+                index_elements=["name"],
+                set_={"value": statement.excluded.value, "updated_at": func.now()}
+            ))
+            logger.warning(f"⚠️ Platform counters corrected: {drift}")
+        return actual
+
+
+# Singleton instance
+platform_counter_service = PlatformCounterService()
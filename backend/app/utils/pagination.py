@@ -0,0 +1,29 @@
+"""
+Keyset Pagination Cursors
+Opaque cursors for "newest first" listings ordered by (uploaded_at, id)
+✅ Encodes the sort key of the last row returned; the next page starts right after it
+✅ URL-safe base64, no padding
+"""
+
+import base64
+import json
+from datetime import datetime
+from typing import Tuple
+
+
+class InvalidCursorError(ValueError):
+    """Cursor was not produced by encode_cursor (tampered or from another listing)"""
+
+
+def encode_cursor(uploaded_at: datetime, row_id: int) -> str:
+    raw = json.dumps([uploaded_at.isoformat(), row_id], separators=(',', ':')).encode('utf-8')
+    return base64.urlsafe_b64encode(raw).decode('ascii').rstrip('=')
+
+
+def decode_cursor(cursor: str) -> Tuple[datetime, int]:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        uploaded_at, row_id = json.loads(raw)
+        return datetime.fromisoformat(uploaded_at), int(row_id)
+    except (ValueError, TypeError) as e:
+        raise InvalidCursorError(f"Invalid cursor: {cursor!r}") from e
@@ -0,0 +1,60 @@
+"""
+Upload Writer
+Streams an UploadFile to disk in chunks
+✅ Never holds the whole file in memory, disk writes do not block the event loop
+✅ Size limit enforced while streaming (works when the client sends no Content-Length)
+✅ SHA-256 and size computed in the same pass
+✅ Written to a temporary file and renamed: a failed upload never leaves a partial PDF
+"""
+
+import hashlib
+import os
+import uuid
+from typing import Tuple
+
+import aiofiles
+import aiofiles.os
+from fastapi import UploadFile
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the maximum size"""
+
+
+async def stream_upload_to_disk(
+    file: UploadFile,
+    directory: str,
+    max_size: int,
+    chunk_size: int = 1024 * 1024
+) -> Tuple[str, int, str]:
+    """
+    Save an upload under a unique name in directory
+
+    Returns: (file_path, file_size, sha256 hex digest)
+    Raises:
+        UploadTooLargeError: when more than max_size bytes are received
+    """
+    file_extension = os.path.splitext(file.filename or "")[1]
+    file_path = os.path.join(directory, f"{uuid.uuid4().hex}{file_extension}")
+    temp_path = f"{file_path}.part"
+
+    hasher = hashlib.sha256()
+    size = 0
+
+    try:
+        async with aiofiles.open(temp_path, "wb") as buffer:
+            while chunk := await file.read(chunk_size):
+                size += len(chunk)
+                if size > max_size:
+                    raise UploadTooLargeError(f"File size exceeds maximum ({max_size} bytes)")
+                hasher.update(chunk)
+                await buffer.write(chunk)
+
+        await aiofiles.os.replace(temp_path, file_path)
+    except BaseException:
+        # Also on cancellation (client disconnected mid-upload)
+        if os.path.exists(temp_path):
+            await aiofiles.os.remove(temp_path)
+        raise
+
+    return file_path, size, hasher.hexdigest()
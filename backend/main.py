@@ -51,11 +51,18 @@ async def lifespan(app: FastAPI):
     os.makedirs(settings.UPLOAD_DIR, exist_ok=True)
     from app.core.scheduler import start_scheduler
     await start_scheduler()
+    from app.services.ingestion_queue import ingestion_queue
+    await ingestion_queue.start()
     
     yield
     
     # Shutdown
     logger.info("👋 Shutting down...")
+    await ingestion_queue.stop()
+    from app.services.extraction_executor import extraction_executor
+    extraction_executor.shutdown()
+    from app.core.password_hasher import password_hasher
+    password_hasher.shutdown()
     await engine.dispose()
 
 
@@ -0,0 +1,34 @@
+-- ============================================================================
+-- UPLOAD INGESTION QUEUE MIGRATION
+-- Add upload_jobs table; uploads are queued and processed by background workers
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS upload_jobs (
+    id SERIAL PRIMARY KEY,
+    batch_id VARCHAR(64) NOT NULL,
+    document_id INTEGER REFERENCES documents(id) ON DELETE SET NULL,
+    original_filename VARCHAR(255) NOT NULL,
+    user_id INTEGER REFERENCES users(id) ON DELETE CASCADE,
+    session_id VARCHAR(255),
+    status processingstatusenum NOT NULL DEFAULT 'PENDING',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id VARCHAR(100),
+    is_duplicate BOOLEAN DEFAULT FALSE,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE
+);
+
+CREATE INDEX IF NOT EXISTS ix_upload_jobs_batch_id ON upload_jobs(batch_id);
+CREATE INDEX IF NOT EXISTS ix_upload_jobs_document_id ON upload_jobs(document_id);
+CREATE INDEX IF NOT EXISTS ix_upload_jobs_user_id ON upload_jobs(user_id);
+CREATE INDEX IF NOT EXISTS ix_upload_jobs_session_id ON upload_jobs(session_id);
+CREATE INDEX IF NOT EXISTS ix_upload_jobs_status ON upload_jobs(status);
+
+-- Workers claim the oldest pending job: keep that scan tiny
+CREATE INDEX IF NOT EXISTS idx_upload_jobs_pending ON upload_jobs(id) WHERE status = 'PENDING';
+
+COMMENT ON TABLE upload_jobs IS 'Ingestion queue: claimed with SELECT ... FOR UPDATE SKIP LOCKED';
+COMMENT ON COLUMN upload_jobs.document_id IS 'Queued document, or the existing document when the upload was a duplicate';
+COMMENT ON COLUMN upload_jobs.worker_id IS 'host-pid-index of the worker that claimed the job';
@@ -0,0 +1,20 @@
+-- ============================================================================
+-- CONTENT HASH DEDUPLICATION MIGRATION
+-- SHA-256 of the uploaded bytes: identical re-uploads skip PDF extraction
+-- ============================================================================
+
+ALTER TABLE documents ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64);
+
+-- Cross-user extraction cache lookup
+CREATE INDEX IF NOT EXISTS ix_documents_content_hash ON documents(content_hash);
+
+-- One copy of a file per owner (users and guest sessions)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_user_content_hash
+    ON documents(user_id, content_hash)
+    WHERE user_id IS NOT NULL AND content_hash IS NOT NULL;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_session_content_hash
+    ON documents(session_id, content_hash)
+    WHERE user_id IS NULL AND session_id IS NOT NULL AND content_hash IS NOT NULL;
+
+COMMENT ON COLUMN documents.content_hash IS 'SHA-256 (hex) of the uploaded PDF; NULL for documents uploaded before this migration';
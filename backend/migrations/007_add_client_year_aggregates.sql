@@ -0,0 +1,106 @@
+-- ============================================================================
+-- CLIENT YEAR AGGREGATES MIGRATION
+-- Materialized per-client monthly totals for the yearly summary, validation and exports
+-- Rows are refreshed by the application whenever a document is processed or deleted
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS client_year_aggregates (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    razon_social VARCHAR(500) NOT NULL,
+    periodo_anio VARCHAR(10) NOT NULL,
+    periodo_mes_numero INTEGER NOT NULL,
+    periodo_mes VARCHAR(20),
+    form_103_document_id INTEGER,
+    form_103_has_totals BOOLEAN NOT NULL DEFAULT FALSE,
+    form_103_subtotal_operaciones_pais DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_103_total_retencion DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_103_total_impuesto_pagar DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_103_total_pagado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_document_id INTEGER,
+    form_104_has_totals BOOLEAN NOT NULL DEFAULT FALSE,
+    form_104_total_ventas_neto DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_generado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_adquisiciones DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_credito_tributario_aplicable DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_retenido DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_pagado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_impuesto_causado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_retenciones_efectuadas DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_subtotal_a_pagar DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_pagar_retencion DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_consolidado_iva DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_a_pagar DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_interes_mora DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_multa DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (form_103_document_id) REFERENCES documents(id) ON DELETE SET NULL,
+    FOREIGN KEY (form_104_document_id) REFERENCES documents(id) ON DELETE SET NULL
+);
+
+CREATE INDEX IF NOT EXISTS ix_client_year_aggregates_id ON client_year_aggregates(id);
+
+-- One row per user / client / year / month (also serves the yearly lookup)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_client_year_aggregates_key
+    ON client_year_aggregates(user_id, razon_social, periodo_anio, periodo_mes_numero);
+
+-- Form 104 rows duplicated by earlier reprocessing would be summed more than once:
+-- keep the newest row of each document (migration 011 then makes document_id unique)
+DELETE FROM form_104_data f
+USING form_104_data newer
+WHERE newer.document_id = f.document_id
+  AND newer.id > f.id;
+
+-- Backfill from the completed documents already stored
+INSERT INTO client_year_aggregates (
+    user_id, razon_social, periodo_anio, periodo_mes_numero, periodo_mes,
+    form_103_document_id, form_103_has_totals,
+    form_103_subtotal_operaciones_pais, form_103_total_retencion,
+    form_103_total_impuesto_pagar, form_103_total_pagado,
+    form_104_document_id, form_104_has_totals,
+    form_104_total_ventas_neto, form_104_total_impuesto_generado,
+    form_104_total_adquisiciones, form_104_credito_tributario_aplicable,
+    form_104_total_impuesto_retenido, form_104_total_pagado,
+    form_104_impuesto_causado, form_104_retenciones_efectuadas,
+    form_104_subtotal_a_pagar, form_104_total_impuesto_pagar_retencion,
+    form_104_total_consolidado_iva, form_104_total_impuesto_a_pagar,
+    form_104_interes_mora, form_104_multa
+)
+SELECT
+    d.user_id, d.razon_social, d.periodo_anio, d.periodo_mes_numero, MAX(d.periodo_mes),
+    MAX(d.id) FILTER (WHERE d.form_type = 'FORM_103'),
+    COALESCE(BOOL_OR(t.id IS NOT NULL), FALSE),
+    COALESCE(SUM(t.subtotal_operaciones_pais), 0),
+    COALESCE(SUM(t.total_retencion), 0),
+    COALESCE(SUM(t.total_impuesto_pagar), 0),
+    COALESCE(SUM(t.total_pagado), 0),
+    MAX(d.id) FILTER (WHERE d.form_type = 'FORM_104'),
+    COALESCE(BOOL_OR(f.id IS NOT NULL), FALSE),
+    COALESCE(SUM(f.total_ventas_neto), 0),
+    COALESCE(SUM(f.total_impuesto_generado), 0),
+    COALESCE(SUM(f.total_adquisiciones), 0),
+    COALESCE(SUM(f.credito_tributario_aplicable), 0),
+    COALESCE(SUM(f.total_impuesto_retenido), 0),
+    COALESCE(SUM(f.total_pagado), 0),
+    COALESCE(SUM(f.impuesto_causado), 0),
+    COALESCE(SUM(f.retenciones_efectuadas), 0),
+    COALESCE(SUM(f.subtotal_a_pagar), 0),
+    COALESCE(SUM(f.total_impuesto_pagar_retencion), 0),
+    COALESCE(SUM(f.total_consolidado_iva), 0),
+    COALESCE(SUM(f.total_impuesto_a_pagar), 0),
+    COALESCE(SUM(f.interes_mora), 0),
+    COALESCE(SUM(f.multa), 0)
+FROM documents d
+LEFT JOIN form_103_totals t ON t.document_id = d.id AND d.form_type = 'FORM_103'
+LEFT JOIN form_104_data f ON f.document_id = d.id AND d.form_type = 'FORM_104'
+WHERE d.processing_status = 'COMPLETED'
+  AND d.form_type IN ('FORM_103', 'FORM_104')
+  AND d.user_id IS NOT NULL
+  AND d.razon_social IS NOT NULL
+  AND d.periodo_anio IS NOT NULL
+  AND d.periodo_mes_numero IS NOT NULL
+GROUP BY d.user_id, d.razon_social, d.periodo_anio, d.periodo_mes_numero
+ON CONFLICT (user_id, razon_social, periodo_anio, periodo_mes_numero) DO NOTHING;
+
+COMMENT ON TABLE client_year_aggregates IS 'Per-client monthly Form 103/104 totals (completed documents only), maintained by client_year_service';
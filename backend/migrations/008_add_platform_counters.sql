@@ -0,0 +1,27 @@
+-- ============================================================================
+-- PLATFORM COUNTERS MIGRATION
+-- Admin dashboard totals maintained by the application (one row per counter)
+-- Adjusted on registration, upload, deletion and cleanup; reconciled periodically
+-- ============================================================================
+
+CREATE TABLE IF NOT EXISTS platform_counters (
+    name VARCHAR(50) PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+-- Backfill from the current data
+INSERT INTO platform_counters (name, value)
+SELECT 'total_users', COUNT(*) FROM users
+UNION ALL
+SELECT 'active_users', COUNT(*) FILTER (WHERE is_active) FROM users
+UNION ALL
+SELECT 'superusers', COUNT(*) FILTER (WHERE is_superuser) FROM users
+UNION ALL
+SELECT 'total_documents', COUNT(*) FROM documents
+UNION ALL
+SELECT 'total_clients', COUNT(DISTINCT razon_social) FROM documents
+ON CONFLICT (name) DO UPDATE SET value = EXCLUDED.value, updated_at = NOW();
+
+-- Verify
+SELECT name, value FROM platform_counters ORDER BY name;
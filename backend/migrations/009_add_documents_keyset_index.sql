@@ -0,0 +1,11 @@
+-- ============================================================================
+-- DOCUMENTS KEYSET PAGINATION INDEX
+-- Document listing pages by (uploaded_at, id) newest first instead of OFFSET:
+-- every page is an index range scan starting right after the previous one
+-- ============================================================================
+
+CREATE INDEX IF NOT EXISTS idx_documents_user_uploaded_at
+    ON documents(user_id, uploaded_at DESC, id DESC);
+
+-- Verify
+SELECT indexname, indexdef FROM pg_indexes WHERE indexname = 'idx_documents_user_uploaded_at';
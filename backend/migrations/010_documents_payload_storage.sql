@@ -0,0 +1,25 @@
+-- ============================================================================
+-- DOCUMENT PAYLOAD STORAGE MIGRATION
+-- parsed_data JSON -> JSONB (binary, deduplicated keys, no re-parsing on read)
+-- extracted_text / parsed_data are deferred in the application: loaded only by the
+-- endpoints that return them (document detail, Form 104 data, extraction cache)
+-- ============================================================================
+
+ALTER TABLE documents
+    ALTER COLUMN parsed_data TYPE JSONB USING parsed_data::jsonb;
+
+-- PostgreSQL 14+: compress the large payloads with lz4 (faster than the default pglz)
+-- Applies to values written from now on; skipped on servers without lz4 support
+DO $$
+BEGIN
+    IF current_setting('server_version_num')::int >= 140000 THEN
+        ALTER TABLE documents ALTER COLUMN extracted_text SET COMPRESSION lz4;
+        ALTER TABLE documents ALTER COLUMN parsed_data SET COMPRESSION lz4;
+    END IF;
+EXCEPTION WHEN OTHERS THEN
+    RAISE NOTICE 'lz4 compression not available, keeping default: %', SQLERRM;
+END $$;
+
+-- Verify
+SELECT column_name, data_type FROM information_schema.columns
+WHERE table_name = 'documents' AND column_name IN ('extracted_text', 'parsed_data');
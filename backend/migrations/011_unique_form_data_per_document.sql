@@ -0,0 +1,87 @@
+-- ============================================================================
+-- ONE FORM 104 DATA ROW PER DOCUMENT
+-- Form 103 totals and Form 104 data are written with
+-- INSERT ... ON CONFLICT (document_id) DO UPDATE, which needs a unique index
+-- (form_103_totals.document_id is already UNIQUE)
+-- Client months backfilled from duplicate rows are recomputed
+-- ============================================================================
+
+-- Client months whose Form 104 totals were summed over duplicate rows (databases where
+-- migration 007 ran before it removed the duplicates itself)
+CREATE TEMP TABLE form_104_duplicate_months AS
+SELECT DISTINCT d.user_id, d.razon_social, d.periodo_anio, d.periodo_mes_numero
+FROM documents d
+JOIN form_104_data f ON f.document_id = d.id
+WHERE d.user_id IS NOT NULL
+  AND d.razon_social IS NOT NULL
+  AND d.periodo_anio IS NOT NULL
+  AND d.periodo_mes_numero IS NOT NULL
+GROUP BY d.id
+HAVING COUNT(f.id) > 1;
+
+-- Keep only the newest Form 104 row of each document (older duplicates are stale reprocessing output)
+DELETE FROM form_104_data f
+USING form_104_data newer
+WHERE newer.document_id = f.document_id
+  AND newer.id > f.id;
+
+CREATE UNIQUE INDEX IF NOT EXISTS uq_form_104_data_document_id ON form_104_data(document_id);
+
+-- The unique index replaces the plain lookup index
+DROP INDEX IF EXISTS idx_form_104_document_id;
+DROP INDEX IF EXISTS ix_form_104_data_document_id;
+
+-- Recompute the Form 104 totals of those months from the remaining rows
+UPDATE client_year_aggregates a
+SET form_104_has_totals = s.has_totals,
+    form_104_total_ventas_neto = s.total_ventas_neto,
+    form_104_total_impuesto_generado = s.total_impuesto_generado,
+    form_104_total_adquisiciones = s.total_adquisiciones,
+    form_104_credito_tributario_aplicable = s.credito_tributario_aplicable,
+    form_104_total_impuesto_retenido = s.total_impuesto_retenido,
+    form_104_total_pagado = s.total_pagado,
+    form_104_impuesto_causado = s.impuesto_causado,
+    form_104_retenciones_efectuadas = s.retenciones_efectuadas,
+    form_104_subtotal_a_pagar = s.subtotal_a_pagar,
+    form_104_total_impuesto_pagar_retencion = s.total_impuesto_pagar_retencion,
+    form_104_total_consolidado_iva = s.total_consolidado_iva,
+    form_104_total_impuesto_a_pagar = s.total_impuesto_a_pagar,
+    form_104_interes_mora = s.interes_mora,
+    form_104_multa = s.multa,
+    updated_at = NOW()
+FROM (
+    SELECT
+        d.user_id, d.razon_social, d.periodo_anio, d.periodo_mes_numero,
+        COALESCE(BOOL_OR(f.id IS NOT NULL), FALSE) AS has_totals,
+        COALESCE(SUM(f.total_ventas_neto), 0) AS total_ventas_neto,
+        COALESCE(SUM(f.total_impuesto_generado), 0) AS total_impuesto_generado,
+        COALESCE(SUM(f.total_adquisiciones), 0) AS total_adquisiciones,
+        COALESCE(SUM(f.credito_tributario_aplicable), 0) AS credito_tributario_aplicable,
+        COALESCE(SUM(f.total_impuesto_retenido), 0) AS total_impuesto_retenido,
+        COALESCE(SUM(f.total_pagado), 0) AS total_pagado,
+        COALESCE(SUM(f.impuesto_causado), 0) AS impuesto_causado,
+        COALESCE(SUM(f.retenciones_efectuadas), 0) AS retenciones_efectuadas,
+        COALESCE(SUM(f.subtotal_a_pagar), 0) AS subtotal_a_pagar,
+        COALESCE(SUM(f.total_impuesto_pagar_retencion), 0) AS total_impuesto_pagar_retencion,
+        COALESCE(SUM(f.total_consolidado_iva), 0) AS total_consolidado_iva,
+        COALESCE(SUM(f.total_impuesto_a_pagar), 0) AS total_impuesto_a_pagar,
+        COALESCE(SUM(f.interes_mora), 0) AS interes_mora,
+        COALESCE(SUM(f.multa), 0) AS multa
+    FROM documents d
+    JOIN form_104_duplicate_months m
+        USING (user_id, razon_social, periodo_anio, periodo_mes_numero)
+    LEFT JOIN form_104_data f ON f.document_id = d.id
+    WHERE d.processing_status = 'COMPLETED'
+      AND d.form_type = 'FORM_104'
+    GROUP BY d.user_id, d.razon_social, d.periodo_anio, d.periodo_mes_numero
+) s
+WHERE a.user_id = s.user_id
+  AND a.razon_social = s.razon_social
+  AND a.periodo_anio = s.periodo_anio
+  AND a.periodo_mes_numero = s.periodo_mes_numero;
+
+DROP TABLE form_104_duplicate_months;
+
+-- Verify
+SELECT indexname FROM pg_indexes
+WHERE tablename = 'form_104_data' AND indexdef LIKE 'CREATE UNIQUE%';
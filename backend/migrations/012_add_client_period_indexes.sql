@@ -0,0 +1,57 @@
+-- ============================================================================
+-- CLIENT / PERIOD INDEXES MIGRATION
+-- Composite indexes for the clientes and duplicate-check access paths, and one
+-- document per owner / client / period / form enforced by the database
+-- Check the plans afterwards: python backend/app/scripts/check_query_plans.py
+-- ============================================================================
+
+-- Clientes list, client documents, monthly aggregate refresh:
+-- user -> client -> year -> month -> form, status and month name read from the index
+CREATE INDEX IF NOT EXISTS idx_documents_user_client_period
+    ON documents(user_id, razon_social, periodo_anio, periodo_mes_numero, form_type)
+    INCLUDE (processing_status, periodo_mes);
+
+-- Duplicates must be resolved before the unique indexes can be built
+-- List them with:
+--   SELECT user_id, CASE WHEN user_id IS NULL THEN session_id END AS guest_session,
+--          razon_social, periodo_fiscal_completo, form_type, array_agg(id ORDER BY id)
+--   FROM documents
+--   WHERE razon_social IS NOT NULL AND periodo_fiscal_completo IS NOT NULL
+--     AND (user_id IS NOT NULL OR session_id IS NOT NULL)
+--   GROUP BY 1, 2, 3, 4, 5
+--   HAVING COUNT(*) > 1;
+DO $$
+DECLARE
+    duplicates INTEGER;
+BEGIN
+    SELECT COUNT(*) INTO duplicates FROM (
+        SELECT 1
+        FROM documents
+        WHERE razon_social IS NOT NULL AND periodo_fiscal_completo IS NOT NULL
+          AND (user_id IS NOT NULL OR session_id IS NOT NULL)
+        GROUP BY CASE WHEN user_id IS NULL THEN session_id END, user_id,
+                 razon_social, periodo_fiscal_completo, form_type
+        HAVING COUNT(*) > 1
+    ) d;
+    IF duplicates > 0 THEN
+        RAISE EXCEPTION '% duplicate owner/client/period/form groups in documents - delete the extra documents (see the query above) and run this migration again', duplicates;
+    END IF;
+END $$;
+
+-- One document per user / client / period / form (also the duplicate check lookup)
+CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_user_period_form
+    ON documents(user_id, razon_social, periodo_fiscal_completo, form_type)
+    WHERE user_id IS NOT NULL AND razon_social IS NOT NULL AND periodo_fiscal_completo IS NOT NULL;
+
+-- Same for guest sessions
+CREATE UNIQUE INDEX IF NOT EXISTS uq_documents_session_period_form
+    ON documents(session_id, razon_social, periodo_fiscal_completo, form_type)
+    WHERE user_id IS NULL AND session_id IS NOT NULL
+      AND razon_social IS NOT NULL AND periodo_fiscal_completo IS NOT NULL;
+
+ANALYZE documents;
+
+-- Verify
+SELECT indexname, indexdef FROM pg_indexes
+WHERE tablename = 'documents'
+  AND indexname IN ('idx_documents_user_client_period', 'uq_documents_user_period_form', 'uq_documents_session_period_form');
@@ -8,7 +8,7 @@
 -- INSTRUCTIONS:
 -- 1. Create database: CREATE DATABASE pdf_extractor_db;
 -- 2. Run this file: psql -U postgres -d pdf_extractor_db -f complete_schema.sql
--- 3. Verify: \dt (should show 9 tables)
+-- 3. Verify: \dt (should show 11 tables)
 --
 
 -- PostgreSQL settings
@@ -82,7 +82,7 @@ CREATE TABLE documents (
     extracted_text TEXT,
     total_pages INTEGER,
     total_characters INTEGER,
-    parsed_data JSON,
+    parsed_data JSONB,
     codigo_verificador VARCHAR(100),
     numero_serial VARCHAR(100),
     fecha_recaudacion TIMESTAMP WITH TIME ZONE,
@@ -98,6 +98,7 @@ CREATE TABLE documents (
     periodo_mes_numero INTEGER,
     user_id INTEGER,
     session_id VARCHAR,
+    content_hash VARCHAR(64),
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
 );
 
@@ -329,6 +330,69 @@ CREATE TABLE usage_analytics (
     FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE SET NULL
 );
 
+-- Upload ingestion queue
+CREATE TABLE upload_jobs (
+    id SERIAL PRIMARY KEY,
+    batch_id VARCHAR(64) NOT NULL,
+    document_id INTEGER,
+    original_filename VARCHAR(255) NOT NULL,
+    user_id INTEGER,
+    session_id VARCHAR(255),
+    status processingstatusenum NOT NULL DEFAULT 'PENDING',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    worker_id VARCHAR(100),
+    is_duplicate BOOLEAN DEFAULT FALSE,
+    error TEXT,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    started_at TIMESTAMP WITH TIME ZONE,
+    finished_at TIMESTAMP WITH TIME ZONE,
+    FOREIGN KEY (document_id) REFERENCES documents(id) ON DELETE SET NULL,
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE
+);
+
+-- Per-client monthly totals (yearly summary, validation and exports)
+CREATE TABLE client_year_aggregates (
+    id SERIAL PRIMARY KEY,
+    user_id INTEGER NOT NULL,
+    razon_social VARCHAR(500) NOT NULL,
+    periodo_anio VARCHAR(10) NOT NULL,
+    periodo_mes_numero INTEGER NOT NULL,
+    periodo_mes VARCHAR(20),
+    form_103_document_id INTEGER,
+    form_103_has_totals BOOLEAN NOT NULL DEFAULT FALSE,
+    form_103_subtotal_operaciones_pais DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_103_total_retencion DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_103_total_impuesto_pagar DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_103_total_pagado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_document_id INTEGER,
+    form_104_has_totals BOOLEAN NOT NULL DEFAULT FALSE,
+    form_104_total_ventas_neto DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_generado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_adquisiciones DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_credito_tributario_aplicable DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_retenido DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_pagado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_impuesto_causado DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_retenciones_efectuadas DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_subtotal_a_pagar DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_pagar_retencion DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_consolidado_iva DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_total_impuesto_a_pagar DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_interes_mora DOUBLE PRECISION NOT NULL DEFAULT 0,
+    form_104_multa DOUBLE PRECISION NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW(),
+    FOREIGN KEY (user_id) REFERENCES users(id) ON DELETE CASCADE,
+    FOREIGN KEY (form_103_document_id) REFERENCES documents(id) ON DELETE SET NULL,
+    FOREIGN KEY (form_104_document_id) REFERENCES documents(id) ON DELETE SET NULL
+);
+
+-- Platform-wide counters (admin dashboard), maintained by the application
+CREATE TABLE platform_counters (
+    name VARCHAR(50) PRIMARY KEY,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
 -- ============================================================================
 -- INDEXES
 -- ============================================================================
@@ -355,6 +419,22 @@ CREATE INDEX idx_documents_user_id ON documents(user_id);
 CREATE INDEX idx_documents_razon_social ON documents(razon_social);
 CREATE INDEX idx_documents_periodo_mes ON documents(periodo_mes);
 CREATE INDEX idx_documents_periodo_mes_numero ON documents(periodo_mes_numero);
+CREATE INDEX ix_documents_content_hash ON documents(content_hash);
+CREATE INDEX idx_documents_user_uploaded_at ON documents(user_id, uploaded_at DESC, id DESC);
+CREATE INDEX idx_documents_user_client_period
+    ON documents(user_id, razon_social, periodo_anio, periodo_mes_numero, form_type)
+    INCLUDE (processing_status, periodo_mes);
+CREATE UNIQUE INDEX uq_documents_user_period_form
+    ON documents(user_id, razon_social, periodo_fiscal_completo, form_type)
+    WHERE user_id IS NOT NULL AND razon_social IS NOT NULL AND periodo_fiscal_completo IS NOT NULL;
+CREATE UNIQUE INDEX uq_documents_session_period_form
+    ON documents(session_id, razon_social, periodo_fiscal_completo, form_type)
+    WHERE user_id IS NULL AND session_id IS NOT NULL
+      AND razon_social IS NOT NULL AND periodo_fiscal_completo IS NOT NULL;
+CREATE UNIQUE INDEX uq_documents_user_content_hash ON documents(user_id, content_hash)
+    WHERE user_id IS NOT NULL AND content_hash IS NOT NULL;
+CREATE UNIQUE INDEX uq_documents_session_content_hash ON documents(session_id, content_hash)
+    WHERE user_id IS NULL AND session_id IS NOT NULL AND content_hash IS NOT NULL;
 
 -- Form 103 line items indexes
 CREATE INDEX ix_form_103_line_items_id ON form_103_line_items(id);
@@ -367,7 +447,7 @@ CREATE UNIQUE INDEX ix_form_103_totals_document_id ON form_103_totals(document_i
 
 -- Form 104 data indexes
 CREATE INDEX ix_form_104_data_id ON form_104_data(id);
-CREATE INDEX ix_form_104_data_document_id ON form_104_data(document_id);
+CREATE UNIQUE INDEX ix_form_104_data_document_id ON form_104_data(document_id);
 CREATE INDEX idx_form_104_data_user_id ON form_104_data(user_id);
 
 -- Temporary files indexes
@@ -378,6 +458,19 @@ CREATE INDEX idx_temp_files_expires_at ON temporary_files(expires_at);
 CREATE INDEX idx_analytics_user_id ON usage_analytics(user_id);
 CREATE INDEX idx_analytics_event_type ON usage_analytics(event_type);
 
+-- Upload jobs indexes
+CREATE INDEX ix_upload_jobs_batch_id ON upload_jobs(batch_id);
+CREATE INDEX ix_upload_jobs_document_id ON upload_jobs(document_id);
+CREATE INDEX ix_upload_jobs_user_id ON upload_jobs(user_id);
+CREATE INDEX ix_upload_jobs_session_id ON upload_jobs(session_id);
+CREATE INDEX ix_upload_jobs_status ON upload_jobs(status);
+CREATE INDEX idx_upload_jobs_pending ON upload_jobs(id) WHERE status = 'PENDING';
+
+-- Client year aggregates indexes
+CREATE INDEX ix_client_year_aggregates_id ON client_year_aggregates(id);
+CREATE UNIQUE INDEX uq_client_year_aggregates_key
+    ON client_year_aggregates(user_id, razon_social, periodo_anio, periodo_mes_numero);
+
 -- ============================================================================
 -- VERIFICATION QUERY
 -- ============================================================================
@@ -385,13 +478,16 @@ CREATE INDEX idx_analytics_event_type ON usage_analytics(event_type);
 -- Run this to verify all tables were created:
 -- SELECT table_name FROM information_schema.tables WHERE table_schema = 'public' ORDER BY table_name;
 
--- Expected output (9 tables):
+-- Expected output (11 tables):
+-- client_year_aggregates
 -- documents
 -- form_103_line_items
 -- form_103_totals
 -- form_104_data
 -- guest_sessions
+-- platform_counters
 -- temporary_files
+-- upload_jobs
 -- usage_analytics
 -- users
 
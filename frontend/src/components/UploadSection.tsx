@@ -1,9 +1,10 @@
 'use client'
 
-import { useState, useCallback, useEffect } from 'react'
+import { useState, useCallback, useEffect, useRef } from 'react'
 import { useDropzone } from 'react-dropzone'
-import { uploadSinglePDF, uploadMultiplePDFs } from '@/lib/api'
-import { Upload, FileText, CheckCircle, XCircle, Loader, AlertCircle, LogIn, X } from 'lucide-react'
+import { uploadSinglePDF, uploadMultiplePDFs, getUploadJob, getUploadBatch } from '@/lib/api'
+import type { UploadJob } from '@/types'
+import { Upload, FileText, CheckCircle, XCircle, Loader, AlertCircle, LogIn, X, Clock } from 'lucide-react'
 import { useAuth } from '@/contexts/AuthContext'
 import { useRouter } from 'next/navigation'
 
@@ -13,10 +14,11 @@ interface UploadSectionProps {
 
 interface UploadedFile {
   file: File
-  status: 'uploading' | 'success' | 'error' | 'duplicate' | 'blocked'
+  status: 'uploading' | 'queued' | 'success' | 'error' | 'duplicate' | 'blocked'
   message?: string
   formId?: number
   isDuplicate?: boolean
+  jobId?: number
 }
 
 interface GuestInfo {
@@ -25,6 +27,17 @@ interface GuestInfo {
   limit: number
 }
 
+// Queued uploads: how often (and how long) the job status is polled
+const POLL_INTERVAL_MS = 2000
+const MAX_POLLS = 150
+
+const QUEUED_MESSAGE = 'En cola para procesamiento...'
+
+const sleep = (ms: number) => new Promise(resolve => setTimeout(resolve, ms))
+
+// An upload answered with a job_id (and no duplicate verdict yet) is still being processed
+const isQueued = (result: any) => result.is_duplicate == null && result.job_id != null
+
 export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
   const [uploadedFiles, setUploadedFiles] = useState<UploadedFile[]>([])
   const [isUploading, setIsUploading] = useState(false)
@@ -32,6 +45,14 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
   const [guestInfo, setGuestInfo] = useState<GuestInfo | null>(null)
   const { isAuthenticated } = useAuth()
   const router = useRouter()
+  const mountedRef = useRef(true)
+
+  useEffect(() => {
+    mountedRef.current = true
+    return () => {
+      mountedRef.current = false
+    }
+  }, [])
 
   // Fetch guest info on mount and after uploads
   const fetchGuestInfo = useCallback(async () => {
@@ -59,6 +80,70 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
     fetchGuestInfo()
   }, [fetchGuestInfo])
 
+  // ✅ Poll queued uploads (whole batch when known, else job by job) until the workers finish them
+  const trackQueuedJobs = useCallback(async (jobIds: number[], batchId?: string | null) => {
+    const pending = new Set(jobIds)
+
+    for (let poll = 0; poll < MAX_POLLS && pending.size > 0 && mountedRef.current; poll++) {
+      await sleep(POLL_INTERVAL_MS)
+
+      let jobs: UploadJob[] = []
+      try {
+        if (batchId) {
+          jobs = (await getUploadBatch(batchId)).jobs
+        }
+        // Re-uploads of a file still queued elsewhere belong to another batch
+        const missing = Array.from(pending).filter(id => !jobs.some(job => job.job_id === id))
+        jobs = [...jobs, ...await Promise.all(missing.map(id => getUploadJob(id)))]
+      } catch (error) {
+        console.error('Error polling upload jobs:', error)
+        continue
+      }
+
+      const finished = jobs.filter(job =>
+        pending.has(job.job_id) && (job.status === 'completed' || job.status === 'failed')
+      )
+      if (finished.length === 0) continue
+      finished.forEach(job => pending.delete(job.job_id))
+
+      setUploadedFiles(prev =>
+        prev.map(f => {
+          const job = finished.find(j => j.job_id === f.jobId)
+          if (!job) return f
+          if (job.status === 'failed') {
+            return { ...f, status: 'error', message: job.error || 'Processing failed' }
+          }
+          return {
+            ...f,
+            status: job.is_duplicate ? 'duplicate' : 'success',
+            message: job.is_duplicate ? 'Duplicate document' : 'File processed successfully',
+            formId: job.document_id ?? undefined,
+            isDuplicate: job.is_duplicate ?? false
+          }
+        })
+      )
+
+      // Only refresh the lists once new documents are actually stored
+      if (finished.some(job => job.status === 'completed' && !job.is_duplicate)) {
+        onUploadSuccess?.()
+      }
+      // Duplicates and failures give guest slots back
+      if (!isAuthenticated) {
+        await fetchGuestInfo()
+      }
+    }
+
+    if (pending.size > 0 && mountedRef.current) {
+      setUploadedFiles(prev =>
+        prev.map(f =>
+          f.jobId !== undefined && pending.has(f.jobId) && f.status === 'queued'
+            ? { ...f, message: 'Sigue en cola: revisa la lista de documentos más tarde' }
+            : f
+        )
+      )
+    }
+  }, [onUploadSuccess, isAuthenticated, fetchGuestInfo])
+
   const onDrop = useCallback(async (acceptedFiles: File[]) => {
     // Filter only PDF files
     const pdfFiles = acceptedFiles.filter(file => 
@@ -113,22 +198,28 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
       if (filesToUpload.length === 1) {
         // Single file upload
         const result = await uploadSinglePDF(filesToUpload[0])
+        const queued = isQueued(result)
         
         setUploadedFiles(prev => 
           prev.map(f => 
             f.file === filesToUpload[0]
               ? { 
                   ...f, 
-                  status: result.is_duplicate ? 'duplicate' : 'success',
-                  message: result.message,
+                  status: queued ? 'queued' : result.is_duplicate ? 'duplicate' : 'success',
+                  message: queued ? QUEUED_MESSAGE : result.message,
                   formId: result.form_id,
-                  isDuplicate: result.is_duplicate
+                  isDuplicate: result.is_duplicate ?? undefined,
+                  jobId: result.job_id ?? undefined
                 }
               : f
           )
         )
         
-        if (!result.is_duplicate) {
+        if (queued) {
+          // ✅ Guest slot is taken as soon as the file is queued
+          await fetchGuestInfo()
+          trackQueuedJobs([result.job_id])
+        } else if (!result.is_duplicate) {
           onUploadSuccess?.()
           // ✅ Refresh guest info after successful upload
           await fetchGuestInfo()
@@ -147,12 +238,14 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
             const failed = result.failed?.find((u: any) => u.filename === f.file.name)
             
             if (uploaded) {
+              const queued = isQueued(uploaded)
               return {
                 ...f,
-                status: uploaded.is_duplicate ? 'duplicate' : 'success',
-                message: uploaded.message,
+                status: queued ? 'queued' : uploaded.is_duplicate ? 'duplicate' : 'success',
+                message: queued ? QUEUED_MESSAGE : uploaded.message,
                 formId: uploaded.form_id,
-                isDuplicate: uploaded.is_duplicate
+                isDuplicate: uploaded.is_duplicate ?? undefined,
+                jobId: uploaded.job_id ?? undefined
               }
             } else if (failed) {
               return {
@@ -165,12 +258,18 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
           })
         )
         
-        // Only trigger refresh if there were new (non-duplicate) uploads
-        const newUploads = result.uploaded?.filter((u: any) => !u.is_duplicate) || []
+        // Only trigger refresh if there were new (non-duplicate) uploads already processed
+        const newUploads = result.uploaded?.filter((u: any) => u.is_duplicate === false) || []
         if (newUploads.length > 0) {
           onUploadSuccess?.()
         }
 
+        // ✅ Queued uploads are followed until the workers finish them
+        const queuedJobIds = result.uploaded?.filter(isQueued).map((u: any) => u.job_id) || []
+        if (queuedJobIds.length > 0) {
+          trackQueuedJobs(queuedJobIds, result.batch_id)
+        }
+
         // ✅ Update guest info after bulk upload
         if (!isAuthenticated) {
           if (result.summary?.session_info) {
@@ -213,7 +312,7 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
     } finally {
       setIsUploading(false)
     }
-  }, [onUploadSuccess, isAuthenticated, guestInfo, fetchGuestInfo])
+  }, [onUploadSuccess, isAuthenticated, guestInfo, fetchGuestInfo, trackQueuedJobs])
 
   const { getRootProps, getInputProps, isDragActive } = useDropzone({
     onDrop,
@@ -505,6 +604,8 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
                           ? 'text-red-600 dark:text-red-400' 
                           : item.status === 'duplicate'
                           ? 'text-yellow-600 dark:text-yellow-400'
+                          : item.status === 'queued'
+                          ? 'text-blue-600 dark:text-blue-400'
                           : 'text-green-600 dark:text-green-400'
                       }`}>
                         {item.message}
@@ -517,6 +618,9 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
                   {item.status === 'uploading' && (
                     <Loader className="animate-spin text-blue-600 dark:text-blue-400" size={20} />
                   )}
+                  {item.status === 'queued' && (
+                    <Clock className="text-blue-600 dark:text-blue-400" size={20} />
+                  )}
                   {item.status === 'success' && (
                     <CheckCircle className="text-green-600 dark:text-green-400" size={20} />
                   )}
@@ -538,6 +642,11 @@ export default function UploadSection({ onUploadSuccess }: UploadSectionProps) {
                 <span className="text-green-600 dark:text-green-400">
                   Exitosos: {uploadedFiles.filter(f => f.status === 'success').length}
                 </span>
+                {uploadedFiles.some(f => f.status === 'queued') && (
+                  <span className="text-blue-600 dark:text-blue-400">
+                    En cola: {uploadedFiles.filter(f => f.status === 'queued').length}
+                  </span>
+                )}
                 <span className="text-yellow-600 dark:text-yellow-400">
                   Duplicados: {uploadedFiles.filter(f => f.status === 'duplicate').length}
                 </span>
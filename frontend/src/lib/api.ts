@@ -1,4 +1,5 @@
 import axios from 'axios'
+import type { UploadBatch, UploadJob } from '@/types'
 
 if (!process.env.NEXT_PUBLIC_API_URL) {
   throw new Error('NEXT_PUBLIC_API_URL is not defined')
@@ -79,6 +80,17 @@ export const getUploadStatus = async (documentId: number) => {
   return response.data
 }
 
+// Queued uploads (processed by the ingestion workers)
+export const getUploadJob = async (jobId: number): Promise<UploadJob> => {
+  const response = await api.get(`/api/upload/jobs/${jobId}`)
+  return response.data
+}
+
+export const getUploadBatch = async (batchId: string): Promise<UploadBatch> => {
+  const response = await api.get(`/api/upload/batches/${batchId}`)
+  return response.data
+}
+
 // Documents APIs
 export const getDocuments = async (params?: {
   page?: number
@@ -22,7 +22,10 @@ export interface UploadResponse {
   message: string
   document_id: number
   filename: string
+  form_type: string
   processing_status: string
+  is_duplicate: boolean | null  // null while the upload is queued
+  job_id?: number
 }
 
 export interface BulkUploadResponse {
@@ -30,6 +33,26 @@ export interface BulkUploadResponse {
   total_files: number
   uploaded: UploadResponse[]
   failed: { filename: string; error: string }[]
+  summary?: { new: number; duplicates: number; queued: number; errors: number }
+  batch_id?: string | null
+}
+
+export interface UploadJob {
+  job_id: number
+  batch_id: string
+  document_id: number | null
+  filename: string
+  status: 'pending' | 'processing' | 'completed' | 'failed'
+  attempts: number
+  is_duplicate: boolean | null
+  error: string | null
+}
+
+export interface UploadBatch {
+  batch_id: string
+  total: number
+  done: boolean
+  jobs: UploadJob[]
 }
 
 // Stats Types